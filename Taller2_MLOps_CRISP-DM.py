@@ -47,10 +47,27 @@ from sklearn.svm import SVC  # Support Vector Machine
 from sklearn.neighbors import KNeighborsClassifier  # K-Nearest Neighbors
 from sklearn.neural_network import MLPClassifier  # Red neuronal multicapa
 from sklearn.tree import DecisionTreeClassifier  # Árbol de decisión
-from sklearn.ensemble import VotingClassifier, StackingClassifier  # Métodos de ensamblaje para combinar modelos
 
 # Importar herramientas para manejar el desbalance de clases
-from imblearn.over_sampling import SMOTE  # Técnica de sobremuestreo sintético para balancear clases
+from preprocessing import ChunkedSMOTE  # SMOTE con búsqueda de vecinos en float32 y generación por bloques
+
+# Herramientas para exportar el modelo que sirve la API
+from train import build_pipeline  # Pipeline servido por la API (el mismo que usa train.py)
+from joblib import dump  # Para guardar el pipeline entrenado
+from preprocessing import Winsorizer  # Winsorización vectorizada con percentiles aprendidos en el entrenamiento
+
+# Carga de datos desde un caché columnar del CSV
+from data import load_data
+
+# Búsqueda de hiperparámetros por successive halving y ensamblajes sobre pliegues compartidos
+from tuning import FoldCache, HalvingSearch, SoftVotingEnsemble, StackedEnsemble, grid_search, search_report
+import time  # Para medir el tiempo de la búsqueda
+
+# Entrenamiento y evaluación en paralelo con un presupuesto de CPUs
+from training import cpu_budget, run_models
+
+# Métricas, barrido de umbrales e intervalos bootstrap a partir de las probabilidades guardadas de cada modelo
+from evaluation import Evaluator
 
 # Desactivar warnings para una salida más limpia
 import warnings
@@ -59,8 +76,10 @@ warnings.filterwarnings('ignore')
 """#Entendimiento de los datos"""
 
 # Cargar los datos
+# La primera ejecución convierte el CSV en un caché columnar (.npy en float32) junto al archivo;
+# las siguientes lo leen sin volver a analizar el CSV, y se reconstruye si el CSV cambia
 file_path = '/content/data.csv'
-data = pd.read_csv(file_path)
+data = load_data(file_path)
 
 #Primeras 5 filas del dataset para entender su estructura
 data.head()
@@ -117,14 +136,13 @@ for i, col in enumerate(numerical_cols, 1):
 plt.tight_layout()
 plt.show()
 
-# Tratamiento de outliers mediante winsorización (reemplazar valores extremos por el percentil 1 y 99)
-for col in numerical_cols:
-    lower_percentile = data[col].quantile(0.01)
-    upper_percentile = data[col].quantile(0.99)
-    data[col] = np.where(data[col] < lower_percentile, lower_percentile, data[col])
-    data[col] = np.where(data[col] > upper_percentile, upper_percentile, data[col])
+# Copia de los datos sin winsorizar, usada para exportar el pipeline completo al final
+raw_data = data.copy()
 
-# BALANCEO DE CLASES CON SMOTE
+# Tratamiento de outliers mediante winsorización (reemplazar valores extremos por el percentil 1 y 99)
+# Los percentiles de todas las columnas se calculan en una sola pasada y se recortan con un único np.clip
+winsorizer = Winsorizer(lower_quantile=0.01, upper_quantile=0.99).set_output(transform='pandas')
+data[numerical_cols] = winsorizer.fit_transform(data[numerical_cols])
 
 # Separar caracteristicas (X) y variable objetivo (y)
 X = data.drop('Bankrupt?', axis=1)  # Variables predictoras
@@ -134,48 +152,53 @@ y = data['Bankrupt?']  # Variable objetivo
 print("\nDistribución de clases antes del balanceo:")
 print(y.value_counts())
 
-# Aplicar SMOTE para balancear las clases
-smote = SMOTE(random_state=42)
-X_balanced, y_balanced = smote.fit_resample(X, y)
-
-print("Distribución de clases después de aplicar SMOTE:")
-print(pd.Series(y_balanced).value_counts())
-
-# NORMALIZACIÓN DE VARIABLES
-
-# Aplicar StandardScaler para normalizar las variables
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X_balanced)
-
 # DIVISIÓN EN TRAIN Y TEST
 
-# Dividir los datos en conjuntos de entrenamiento y prueba
+# Dividir los datos en conjuntos de entrenamiento y prueba antes de balancear,
+# de modo que el conjunto de prueba solo contenga empresas reales
 X_train, X_test, y_train, y_test = train_test_split(
-    X_scaled,
-    y_balanced,
+    X.to_numpy(),
+    y.to_numpy(),
     test_size=0.2,  # 20% para test
     random_state=42,  # Para reproducibilidad de resultados
-    stratify=y_balanced  # Mantener proporción de clases
+    stratify=y  # Mantener proporción de clases
 )
 
 print(f"Muestras de entrenamiento: {X_train.shape[0]}")
 print(f"Muestras de prueba: {X_test.shape[0]}")
 
+# NORMALIZACIÓN DE VARIABLES
+
+# Aplicar StandardScaler para normalizar las variables, con media y desviación del entrenamiento
+scaler = StandardScaler()
+X_train = scaler.fit_transform(X_train)
+X_test = scaler.transform(X_test)
+
+# BALANCEO DE CLASES CON SMOTE
+
+# SMOTE solo se aplica a los datos de entrenamiento (y, en la validación cruzada, a cada pliegue de
+# entrenamiento): los vecinos se buscan en float32 y las filas sintéticas se generan por bloques
+smote = ChunkedSMOTE(random_state=42)
+X_train_balanced, y_train_balanced = smote.fit_resample(X_train, y_train)
+
+print("Distribución de clases de entrenamiento después de aplicar SMOTE:")
+print(pd.Series(y_train_balanced).value_counts())
+
 # FUNCIÓN DE EVALUACIÓN
 
-def evaluate_model(model, X_test, y_test):
-    # Realizar predicciones
-    y_pred = model.predict(X_test)
-    # Obtener probabilidades predichas (o decision function para SVM)
-    y_proba = model.predict_proba(X_test)[:,1] if hasattr(model, "predict_proba") else model.decision_function(X_test)
-
-    # Calcular múltiples métricas
-    return {
-        'ROC AUC': roc_auc_score(y_test, y_proba),
-        'F1 Score': f1_score(y_test, y_pred),
-        'Precision': precision_score(y_test, y_pred),
-        'Recall': recall_score(y_test, y_pred)
-    }
+# Guarda las probabilidades de cada modelo en el conjunto de prueba: cada modelo se evalúa una sola vez
+evaluator = Evaluator(y_test)
+
+def evaluate_model(name, model, X_test):
+    # Obtener probabilidades predichas en una sola pasada (o las ya guardadas para este modelo)
+    evaluator.score(name, model, X_test)
+
+    # Calcular múltiples métricas a partir de las probabilidades (predicción = probabilidad > 0.5)
+    return evaluator.metrics(name)
+
+# PRESUPUESTO DE CPUs
+# Número de procesos para la búsqueda y el entrenamiento (variable de entorno TRAIN_CPUS o todos los disponibles)
+CPU_BUDGET = cpu_budget()
 
 """#Modelación"""
 
@@ -201,34 +224,48 @@ param_grids = {
     }
 }
 
-# GridSearchSV PARA MODELOS BASE
+# MODO DE BÚSQUEDA DE HIPERPARÁMETROS
+# 'halving': successive halving (todas las combinaciones con pocos datos, solo las mejores con todos los datos)
+# 'grid': GridSearchCV exhaustivo, como referencia
+SEARCH_MODE = 'halving'
+
+# Pliegues de validación cruzada calculados una sola vez y compartidos por la búsqueda y los ensamblajes;
+# las probabilidades de cada modelo en cada pliegue se guardan para no volver a entrenarlo.
+# SMOTE balancea solo la parte de entrenamiento de cada pliegue; la validación conserva la proporción real
+folds = FoldCache(X_train, y_train, n_splits=5, random_state=42, n_jobs=CPU_BUDGET, sampler=smote)
+
+# Modelos base a optimizar
+base_models = {
+    'lr': ('Regresión Logística', LogisticRegression(random_state=42, max_iter=1000)),
+    'rf': ('Random Forest', RandomForestClassifier(random_state=42)),
+    'gb': ('Gradient Boosting', GradientBoostingClassifier(random_state=42))
+}
+
+# Mejores parámetros de cada modelo e informe de tiempo y puntuación de la búsqueda
+tuned_params = {}
+tuning_report = []
+
 # Función para la optimización de hiperparámetros para cada modelo base
-def get_tuned_models():
+def get_tuned_models(mode=SEARCH_MODE):
     tuned_models = {}
 
-    # Optimización de Regresión Logística
-    print("\nOptimizando Regresión Logística...")
-    lr = LogisticRegression(random_state=42, max_iter=1000)
-    lr_grid = GridSearchCV(lr, param_grids['lr'], cv=5, scoring='roc_auc', n_jobs=-1)
-    lr_grid.fit(X_train, y_train)
-    tuned_models['lr'] = lr_grid.best_estimator_
-    print("Mejores parámetros:", lr_grid.best_params_)
-
-    # Optimización de Random Forest
-    print("\nOptimizando Random Forest...")
-    rf = RandomForestClassifier(random_state=42)
-    rf_grid = GridSearchCV(rf, param_grids['rf'], cv=5, scoring='roc_auc', n_jobs=-1)
-    rf_grid.fit(X_train, y_train)
-    tuned_models['rf'] = rf_grid.best_estimator_
-    print("Mejores parámetros:", rf_grid.best_params_)
-
-    # Optimización de Gradient Boosting
-    print("\nOptimizando Gradient Boosting...")
-    gb = GradientBoostingClassifier(random_state=42)
-    gb_grid = GridSearchCV(gb, param_grids['gb'], cv=5, scoring='roc_auc', n_jobs=-1)
-    gb_grid.fit(X_train, y_train)
-    tuned_models['gb'] = gb_grid.best_estimator_
-    print("Mejores parámetros:", gb_grid.best_params_)
+    for key, (name, estimator) in base_models.items():
+        print(f"\nOptimizando {name}...")
+        start = time.perf_counter()
+        if mode == 'halving':
+            search = HalvingSearch(key, estimator, param_grids[key], folds).fit()
+            n_fits = search.n_fits_ + 1  # Ajustes en los pliegues más el reentrenamiento final
+        else:
+            search = grid_search(estimator, param_grids[key], folds, n_jobs=CPU_BUDGET)
+            n_fits = len(search.cv_results_['params']) * len(folds.splits) + 1
+        tuning_report.append(search_report(name, mode, search, time.perf_counter() - start, n_fits))
+        tuned_models[key] = search.best_estimator_
+        tuned_params[key] = search.best_params_
+        print("Mejores parámetros:", search.best_params_)
+
+    # Informe de la búsqueda: tiempo, número de ajustes y mejor ROC AUC de validación cruzada
+    print("\nInforme de la búsqueda de hiperparámetros:")
+    print(pd.DataFrame(tuning_report).to_string(index=False))
 
     return tuned_models
 
@@ -248,32 +285,35 @@ models = {
     'Decision Tree': DecisionTreeClassifier(random_state=42)
 }
 
-# Entrenar y evaluar cada modelo
+# Entrenar y evaluar todos los modelos en paralelo, repartiendo CPU_BUDGET entre los procesos
+print(f"\nEntrenando {len(models)} modelos con {CPU_BUDGET} CPUs...")
+trained = run_models(
+    models, X_train_balanced, y_train_balanced, X_test, y_test,
+    cpus=CPU_BUDGET,
+    prefit=['Logistic Regression', 'Random Forest', 'Gradient Boosting'],  # Saltar modelos ya entrenados
+    evaluator=evaluator  # Guarda las probabilidades de prueba de cada modelo
+)
 results = {}
-for name, model in models.items():
-    print(f"\nEntrenando {name}...")
-    if name not in ['Logistic Regression', 'Random Forest', 'Gradient Boosting']:  # Saltar modelos ya entrenados
-        model.fit(X_train, y_train)
-    metrics = evaluate_model(model, X_test, y_test)
-    results[name] = metrics
-    print(f"Métricas para {name}:")
-    print(metrics)
+for name, (model, metrics) in trained.items():
+    models[name] = model  # Modelo entrenado (cada proceso entrena su propia copia)
+    results[name] = {metric: metrics[metric] for metric in ['ROC AUC', 'F1 Score', 'Precision', 'Recall']}
+    print(f"Métricas para {name} (entrenamiento: {metrics['fit_s']:.1f} s):")
+    print(results[name])
 
 # IMPLEMENTACIÓN DEL CLASIFICADOR POR VOTACIÓN
 # Combinar las predicciones de múltiples modelos mediante votación
+# Promedia las probabilidades de los modelos ya optimizados, sin volver a entrenarlos
 def train_voting_classifier(tuned_models):
     print("\nEntrenando Clasificador por Votación...")
-    voting_clf = VotingClassifier(
+    voting_clf = SoftVotingEnsemble(
         estimators=[
             ('lr', tuned_models['lr']),
             ('rf', tuned_models['rf']),
             ('gb', tuned_models['gb'])
-        ],
-        voting='soft'  # Usa probabilidades en lugar de predicciones directas
+        ]
     )
 
-    voting_clf.fit(X_train, y_train)
-    voting_metrics = evaluate_model(voting_clf, X_test, y_test)
+    voting_metrics = evaluate_model('Clasificador por Votación', voting_clf, X_test)
     print("Métricas del Clasificador por Votación:")
     print(voting_metrics)
 
@@ -285,19 +325,20 @@ def train_stacking_classifier(tuned_models):
     print("\nEntrenando Clasificador por Apilamiento...")
     meta_classifier = LogisticRegression(random_state=42)
 
-    stacking_clf = StackingClassifier(
+    # El meta-clasificador se entrena con las probabilidades fuera de pliegue ya calculadas
+    # durante la búsqueda, en lugar de reentrenar cada modelo base 5 veces más
+    stacking_clf = StackedEnsemble(
         estimators=[
             ('lr', tuned_models['lr']),
             ('rf', tuned_models['rf']),
             ('gb', tuned_models['gb'])
         ],
         final_estimator=meta_classifier,  # Clasificador final que combina las predicciones
-        cv=5,                            # Validación cruzada para entrenamiento
-        stack_method='predict_proba'      # Usa probabilidades para el apilamiento
+        folds=folds,                      # Pliegues compartidos con la búsqueda
+        params=tuned_params
     )
 
-    stacking_clf.fit(X_train, y_train)
-    stacking_metrics = evaluate_model(stacking_clf, X_test, y_test)
+    stacking_metrics = evaluate_model('Clasificador por Apilamiento', stacking_clf, X_test)
     print("Métricas del Clasificador por Apilamiento:")
     print(stacking_metrics)
 
@@ -311,23 +352,33 @@ stacking_clf = train_stacking_classifier(tuned_models)
 
 # COMPARACIÓN DE MODELOS
 
+# Número de remuestreos bootstrap para los intervalos de confianza al 95%
+N_BOOTSTRAP = 1000
+
 # Función para comparar todos los modelos incluyendo los ensamblajes
 def compare_all_models(base_results, voting_clf, stacking_clf):
     # Añadir resultados de modelos base
     all_results = base_results.copy()
 
-    # Añadir resultados del Clasificador por Votación
-    voting_metrics = evaluate_model(voting_clf, X_test, y_test)
-    all_results['Clasificador por Votación'] = voting_metrics
-
-    # Añadir resultados del Clasificador por Apilamiento
-    stacking_metrics = evaluate_model(stacking_clf, X_test, y_test)
-    all_results['Clasificador por Apilamiento'] = stacking_metrics
+    # Añadir resultados de los ensamblajes (probabilidades ya guardadas al entrenarlos: no se vuelven a evaluar)
+    all_results['Clasificador por Votación'] = evaluate_model('Clasificador por Votación', voting_clf, X_test)
+    all_results['Clasificador por Apilamiento'] = evaluate_model('Clasificador por Apilamiento', stacking_clf, X_test)
 
     # Crear DataFrame de comparación
     comparison_df = pd.DataFrame(all_results).T
     comparison_df = comparison_df[['ROC AUC', 'F1 Score', 'Precision', 'Recall']]
 
+    # Intervalos de confianza bootstrap de ROC AUC y F1 Score, en paralelo y sin volver a predecir
+    intervals = evaluator.intervals(list(comparison_df.index), n_boot=N_BOOTSTRAP, n_jobs=CPU_BUDGET)
+    for metric in ['ROC AUC', 'F1 Score']:
+        comparison_df[f'{metric} IC95%'] = [
+            f"[{intervals[name][metric][0]:.4f}, {intervals[name][metric][1]:.4f}]" for name in comparison_df.index]
+
+    # Umbral de decisión que maximiza el F1 Score de cada modelo (barrido sobre todas sus probabilidades)
+    best = {name: evaluator.best_threshold(name) for name in comparison_df.index}
+    comparison_df['Mejor umbral'] = [best[name]['threshold'] for name in comparison_df.index]
+    comparison_df['F1 en mejor umbral'] = [best[name]['F1 Score'] for name in comparison_df.index]
+
     # Ordenar por puntuación F1 Score
     comparison_df = comparison_df.sort_values(by='F1 Score', ascending=False)
 
@@ -362,4 +413,17 @@ Sí, valdría la pena, pero se debe tener en cuenta ciertas consideraciones:
 - Implementación y Supervisión: Sería necesario monitorear constantemente el modelo en producción para asegurarse de que mantenga su desempeño en el tiempo, ajustándolo cuando cambien las condiciones del mercado.
 - Costo-Beneficio: Para justificar la complejidad del modelo, el beneficio financiero debe superar el costo de implementación y mantenimiento.
 - Alternativas: Si la empresa no dispone de los recursos necesarios, modelos como el Gradient Boosting o incluso el Random Forest, que también tienen un alto desempeño y suelen ser menos exigentes en términos de recursos, podrían ser opciones viables.
-"""
\ No newline at end of file
+"""
+
+"""#Exportación del pipeline
+
+El pipeline que sirve la API (`bankruptcy_pipeline.joblib`) incluye la winsorización como primer paso, de modo que los percentiles aprendidos en el entrenamiento se aplican también a cada solicitud. Fuera del notebook, `python train.py --data data.csv` construye el mismo pipeline y escribe además sus metadatos y un benchmark de inferencia.
+"""
+
+# Pipeline completo: winsorización, escalado, SMOTE (solo durante el entrenamiento) y red neuronal
+export_pipeline = build_pipeline(numerical_cols, random_state=42)
+
+# Entrenar con los datos sin winsorizar: el paso 'winsorizer' aprende sus propios percentiles
+export_pipeline.fit(raw_data.drop('Bankrupt?', axis=1), raw_data['Bankrupt?'])
+dump(export_pipeline, 'bankruptcy_pipeline.joblib')
+print("Pipeline guardado en bankruptcy_pipeline.joblib")
@@ -0,0 +1,274 @@
+"""Append-only audit log of every score returned by the API.
+
+The scoring endpoints (/predict, /predict_batch, /explain_batch,
+/predict_columnar and /predict_stream) record each result they return.
+
+``AuditLog.record`` is the only call on the request path: it appends the
+scored feature matrix and its results to an in-memory queue under a short
+lock and returns. A writer thread flushes the queue to a local SQLite
+database every ``flush_interval`` seconds, or as soon as ``flush_rows`` rows
+are waiting, with one transaction per ``flush_rows`` rows. Rows leave the
+queue's count only once committed, and ``record`` raises
+``AuditQueueFullError`` (503 at the API) while ``max_pending_rows`` are
+waiting, so that no score is returned without being logged.
+
+Each database holds one row per scored company: time, endpoint, model version,
+the float64 feature vector (a little-endian blob in that version's column
+order, stored once per file in ``versions``) and the probability and label
+returned. Triggers reject UPDATE and DELETE. After ``rotate_rows`` rows the
+writer starts a new file; every file is named after its creation time and
+the worker's pid, so several worker processes never share one.
+
+``python audit.py replay`` re-scores an audit file offline with a chosen
+model and reports how far its scores are from the recorded ones::
+
+    python audit.py replay audit/audit-20240101T000000-1234-0.sqlite3 --model bankruptcy_pipeline.joblib
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS versions (
+    model_version TEXT PRIMARY KEY,
+    feature_names TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audit (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    endpoint TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    features BLOB NOT NULL,
+    probability REAL NOT NULL,
+    prediction INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS audit_no_update BEFORE UPDATE ON audit
+BEGIN SELECT RAISE(ABORT, 'the audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS audit_no_delete BEFORE DELETE ON audit
+BEGIN SELECT RAISE(ABORT, 'the audit log is append-only'); END;
+'''
+INSERT = 'INSERT INTO audit (ts, endpoint, model_version, features, probability, prediction) VALUES (?, ?, ?, ?, ?, ?)'
+
+
+class AuditQueueFullError(Exception):
+    pass
+
+
+class AuditLog:
+    def __init__(self, directory, flush_rows=1024, flush_interval=1.0, max_pending_rows=100000, rotate_rows=1000000):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self.rotate_rows = rotate_rows
+
+        self._pending = deque()
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        # Only one flush at a time: the writer thread's, or close()'s final one
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread = None
+
+        self._db = None
+        self._versions = set()
+        self._sequence = 0
+        self.path = None
+        self.file_rows = 0
+
+        # Metrics
+        self.written = 0
+        self.rejected = 0
+        self.failures = 0
+
+    @property
+    def pending_rows(self):
+        return self._pending_rows
+
+    def record(self, endpoint, version, feature_names, features, probabilities, predictions):
+        # Request path: O(1), no I/O. The arrays must not be modified afterwards.
+        n_rows = len(features)
+        with self._lock:
+            if self._pending_rows + n_rows > self.max_pending_rows:
+                self.rejected += n_rows
+                raise AuditQueueFullError("Audit log queue is full")
+            self._pending.append((time.time(), endpoint, version, feature_names, features, probabilities, predictions))
+            self._pending_rows += n_rows
+            if self._pending_rows >= self.flush_rows:
+                self._wake.set()
+
+    def start(self):
+        # In the serving process itself (after serve.py's fork), from the lifespan hook
+        if self._thread is None:
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        # Stops the writer after a final flush of everything queued
+        self._closing = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _run(self):
+        while not self._closing:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # The records stay queued (and count against max_pending_rows) until a flush succeeds
+                self.failures += 1
+                print(f"Audit log flush to {self.path} failed: {e}", flush=True)
+
+    def flush(self):
+        # Writes everything queued, flush_rows per transaction; returns the rows written
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    chunk, n_rows = [], 0
+                    while self._pending and n_rows < self.flush_rows:
+                        chunk.append(self._pending.popleft())
+                        n_rows += len(chunk[-1][4])
+                if not chunk:
+                    return written
+                try:
+                    self._write(chunk)
+                except Exception:
+                    with self._lock:
+                        self._pending.extendleft(reversed(chunk))
+                    raise
+                with self._lock:
+                    self._pending_rows -= n_rows
+                self.written += n_rows
+                written += n_rows
+
+    def _write(self, chunk):
+        db = self._connection()
+        rows, new_versions = [], {}
+        for ts, endpoint, version, feature_names, features, probabilities, predictions in chunk:
+            if version not in self._versions:
+                new_versions[version] = json.dumps(list(feature_names))
+            features = np.ascontiguousarray(features, dtype='<f8')
+            n_rows = len(features)
+            rows.extend(zip([ts] * n_rows, [endpoint] * n_rows, [version] * n_rows, [row.tobytes() for row in features],
+                            np.asarray(probabilities, dtype=np.float64).tolist(), np.asarray(predictions).astype(np.int64).tolist()))
+        # One transaction: a failed flush leaves neither rows nor versions behind
+        with db:
+            db.executemany('INSERT OR IGNORE INTO versions VALUES (?, ?)', new_versions.items())
+            db.executemany(INSERT, rows)
+        self._versions.update(new_versions)
+        self.file_rows += len(rows)
+        if self.file_rows >= self.rotate_rows:
+            self._rotate()
+
+    def _connection(self):
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"audit-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._sequence}.sqlite3"
+            self.path = os.path.join(self.directory, name)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level='DEFERRED')
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+            self._versions = set()
+            self._sequence += 1
+            self.file_rows = 0
+        return self._db
+
+    def _rotate(self):
+        # Later records go to a new file; this one is complete and is never written again
+        self._db.close()
+        self._db = None
+
+    def stats(self):
+        return {'pending_rows': self._pending_rows, 'written_rows': self.written, 'rejected_rows': self.rejected,
+                'failed_flushes': self.failures, 'file': self.path, 'file_rows': self.file_rows}
+
+
+def read_audit(path, chunk_size=4096):
+    # Yields (model_version, feature_names, ids, features, probabilities, predictions) per
+    # chunk of rows scored by the same version, in insertion order
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        names = {version: json.loads(feature_names) for version, feature_names in db.execute('SELECT * FROM versions')}
+        cursor = db.execute('SELECT id, model_version, features, probability, prediction FROM audit ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            start = 0
+            for end in range(1, len(rows) + 1):
+                if end == len(rows) or rows[end][1] != rows[start][1]:
+                    group = rows[start:end]
+                    version = group[0][1]
+                    features = np.frombuffer(b''.join(row[2] for row in group), dtype='<f8').reshape(len(group), -1)
+                    yield (version, names[version], np.array([row[0] for row in group]), features,
+                           np.array([row[3] for row in group]), np.array([row[4] for row in group]))
+                    start = end
+    finally:
+        db.close()
+
+
+def replay(path, model, sink=None, chunk_size=4096):
+    # Re-scores an audit file with `model` (a registry ServedModel); returns a
+    # summary per recorded version and writes one NDJSON line per row to `sink`
+    import config
+    engine = model.engine
+    summary = {}
+    for version, feature_names, ids, features, probabilities, predictions in read_audit(path, chunk_size):
+        index = [feature_names.index(name) for name in engine.feature_names]
+        rescored, labels = model.score(features[:, index])
+        delta = np.abs(rescored - probabilities)
+        changed = labels != predictions
+        stats = summary.setdefault(version, {'rows': 0, 'max_delta': 0.0, 'labels_changed': 0})
+        stats['rows'] += len(ids)
+        stats['max_delta'] = max(stats['max_delta'], float(delta.max()))
+        stats['labels_changed'] += int(changed.sum())
+        if sink is not None:
+            for i in range(len(ids)):
+                sink.write(json.dumps({'id': int(ids[i]), 'recorded_version': version,
+                                       'recorded_probability': float(probabilities[i]), 'recorded_prediction': int(predictions[i]),
+                                       'probability': float(rescored[i]), 'prediction': int(labels[i])}).encode() + b'\n')
+    return {'file': path, 'model_version': model.version, 'decision_threshold': config.DECISION_THRESHOLD, 'recorded': summary}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tools for the audit log of the scoring API.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay_parser = commands.add_parser('replay', help="re-score an audit file offline with a chosen model")
+    replay_parser.add_argument('audit_file')
+    replay_parser.add_argument('--model', default=None, help="artifact to score with (default: MODEL_PATH)")
+    replay_parser.add_argument('--version', default=None, help="version name to report for it (default: its content hash)")
+    replay_parser.add_argument('-o', '--output', default=None, help="NDJSON file with every re-scored row, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    import config
+    import main as service
+    model = service.registry.load(args.model or config.MODEL_PATH, args.version)
+    sink = None if args.output is None else sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        summary = replay(args.audit_file, model, sink)
+    finally:
+        if sink is not None and sink is not sys.stdout.buffer:
+            sink.close()
+    print(json.dumps(summary, indent=2), file=sys.stderr if args.output == '-' else sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Dynamic micro-batching of concurrent single-row predictions.
+
+Requests awaiting ``MicroBatcher.submit`` are collected for up to
+``max_wait_ms`` milliseconds or ``max_batch_size`` rows, scored with one
+vectorized call in a worker thread and their results fanned back out.
+
+``close`` (when a model is reloaded or removed) stops batching without
+dropping anything: rows already queued are still scored and answered, and
+rows submitted from then on are scored on their own.
+
+If scoring a batch raises, its rows are scored again one by one, so only
+the requests whose own row fails get the error.
+"""
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import STAGE_SECONDS
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MicroBatcher:
+    def __init__(self, score, max_wait_ms=2.0, max_batch_size=64, max_queue_depth=1024):
+        # score(features) -> (probabilities, predictions) for a 2-D feature matrix
+        self._score = score
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self._closed = False
+
+        # Metrics
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batch_size_counts = {}
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self._recent_queue_times = deque(maxlen=1024)
+
+    def _ensure_worker(self):
+        # The worker and its queue are bound to the running event loop; a new loop
+        # (e.g. the app started again) gets a fresh, open batcher
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+            self._worker = None
+            self._closed = False
+        if not self._closed and (self._worker is None or self._worker.done()):
+            # Restarted on the same queue, so rows already waiting are not lost
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, row):
+        self._ensure_worker()
+        if self._closed:
+            probabilities, predictions = await self._loop.run_in_executor(None, self._score, row[None, :])
+            return probabilities[0], predictions[0]
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((row, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError("Prediction queue is full")
+        self.requests += 1
+        return await future
+
+    async def close(self):
+        # Stops accepting rows, then waits for the worker to answer everything queued
+        if self._closed or self._queue is None:
+            self._closed = True
+            return
+        self._closed = True
+        if self._worker is not None and not self._worker.done():
+            await self._queue.put(None)
+            await self._worker
+        # Without a worker (it can only have died with the loop) nothing would answer these
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError("Model was closed before the request was scored"))
+
+    async def _collect(self):
+        # (batch, stop): stop once close()'s sentinel is reached
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = await self._collect()
+            if not batch:
+                break
+            started = time.perf_counter()
+            self._record(batch, started)
+            rows = [row for row, _, _ in batch]
+            try:
+                probabilities, predictions = await self._loop.run_in_executor(None, self._score, np.vstack(rows))
+                outcomes = zip(probabilities, predictions)
+            except Exception as e:
+                # One bad row must not fail the requests it happened to be batched with
+                outcomes = [e] if len(batch) == 1 else await self._loop.run_in_executor(None, self._score_each, rows)
+            for (_, future, _), outcome in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def _score_each(self, rows):
+        # (probability, prediction) or the exception raised, per row
+        outcomes = []
+        for row in rows:
+            try:
+                probabilities, predictions = self._score(row[None, :])
+                outcomes.append((probabilities[0], predictions[0]))
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    def _record(self, batch, started):
+        size = len(batch)
+        self.batches += 1
+        self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+        for _, _, enqueued in batch:
+            waited = started - enqueued
+            self.queue_time_total += waited
+            self.queue_time_max = max(self.queue_time_max, waited)
+            self._recent_queue_times.append(waited)
+            STAGE_SECONDS.observe(waited, 'queue')
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        recent = np.fromiter(self._recent_queue_times, dtype=np.float64)
+        p50, p99 = np.percentile(recent, [50, 99]) * 1000 if recent.size else (0.0, 0.0)
+        scored = sum(size * count for size, count in self.batch_size_counts.items())
+        return {
+            'max_wait_ms': self.max_wait * 1000,
+            'max_batch_size': self.max_batch_size,
+            'max_queue_depth': self.max_queue_depth,
+            'queue_depth': self.queue_depth,
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'mean_batch_size': scored / self.batches if self.batches else 0.0,
+            'batch_size_counts': dict(sorted(self.batch_size_counts.items())),
+            'queue_time_ms': {
+                'mean': self.queue_time_total / scored * 1000 if scored else 0.0,
+                'max': self.queue_time_max * 1000,
+                'p50_recent': float(p50),
+                'p99_recent': float(p99),
+            },
+        }
@@ -0,0 +1,149 @@
+"""Cost of the audit log on the request path and throughput of its writer.
+
+Times ``main.score_batch`` (the /predict_batch handler's work) without an
+audit log, with ``audit.AuditLog`` queueing each batch, and with the naive
+alternative of one synchronous SQLite INSERT and commit per request in the
+handler. Then measures the writer on its own (rows/s and bytes per row on
+disk for each flush size) and checks that the file holds exactly the
+feature vectors and scores that were recorded, bit for bit.
+
+Finally sends the same companies to every scoring endpoint through the API
+and checks that each one logged exactly the rows and probabilities it
+returned.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_rows, time_calls
+
+
+ENDPOINTS = ('/predict', '/predict_batch', '/explain_batch', '/predict_columnar', '/predict_stream')
+
+
+def audited_endpoints(service, model, directory, n_rows=3):
+    # {endpoint: (rows logged match the rows sent, probabilities logged match the response)}
+    from fastapi.testclient import TestClient
+    from audit import AuditLog
+
+    features = synthetic_rows(model.engine, n_rows, seed=11)
+    payloads = [dict(zip(model.engine.fields, row.tolist())) for row in features]
+    service.audit_log = AuditLog(directory, max_pending_rows=10 ** 9)
+    returned = {}
+    with TestClient(service.app) as client:
+        returned['/predict'] = [client.post('/predict', json=payload).json()['probability_of_bankruptcy'] for payload in payloads]
+        returned['/predict_batch'] = client.post('/predict_batch', json=payloads).json()['probabilities']
+        returned['/explain_batch'] = client.post('/explain_batch', json=payloads).json()['probabilities']
+        columns = {field: features[:, j].tolist() for j, field in enumerate(model.engine.fields)}
+        returned['/predict_columnar'] = client.post('/predict_columnar', json=columns).json()['probabilities']
+        lines = '\n'.join(json.dumps(payload) for payload in payloads)
+        response = client.post('/predict_stream', content=lines, headers={'content-type': 'application/x-ndjson'})
+        returned['/predict_stream'] = [json.loads(line)['probability_of_bankruptcy'] for line in response.text.splitlines()]
+    # The lifespan's shutdown flushed everything
+    path, service.audit_log = service.audit_log.path, None
+    db = sqlite3.connect(path)
+    logged = {}
+    for endpoint, blob, probability in db.execute('SELECT endpoint, features, probability FROM audit ORDER BY id'):
+        logged.setdefault(endpoint, []).append((np.frombuffer(blob, dtype='<f8'), probability))
+    db.close()
+    return {endpoint: (len(logged.get(endpoint, ())) == n_rows
+                       and all(np.array_equal(row, expected) for (row, _), expected in zip(logged[endpoint], features)),
+                       [p for _, p in logged.get(endpoint, ())] == returned[endpoint])
+            for endpoint in ENDPOINTS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024])
+    parser.add_argument('--flush-rows', type=int, nargs='+', default=[64, 1024, 8192])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    model.cache = None
+    model.drift = None
+    from audit import INSERT, SCHEMA, AuditLog, read_audit
+
+    engine = model.engine
+    with tempfile.TemporaryDirectory() as tmp:
+        naive = sqlite3.connect(os.path.join(tmp, 'naive.sqlite3'), check_same_thread=False)
+        naive.execute('PRAGMA journal_mode=WAL')
+        naive.executescript(SCHEMA)
+
+        def naive_batch(body):
+            features = model.request_decoder.decode_many(body, 'application/json')
+            probabilities, predictions = model.score_cached(features)
+            with naive:
+                naive.executemany(INSERT, [(time.time(), '/predict_batch', model.version, row.tobytes(), float(p), int(label))
+                                           for row, p, label in zip(features, probabilities, predictions)])
+            return service.encode_batch(probabilities, predictions)
+
+        rows = []
+        for batch_size in args.batch_sizes:
+            features = synthetic_rows(engine, batch_size, seed=batch_size)
+            body = json.dumps([dict(zip(engine.fields, row.tolist())) for row in features]).encode()
+            iterations = max(20, args.iterations // max(1, batch_size // 64))
+            service.audit_log = None
+            off = summarize(time_calls(lambda: service.score_batch(model, body, 'application/json'), iterations))
+            service.audit_log = AuditLog(os.path.join(tmp, f'queued-{batch_size}'), max_pending_rows=10 ** 9)
+            service.audit_log.start()
+            queued = summarize(time_calls(lambda: service.score_batch(model, body, 'application/json'), iterations))
+            service.audit_log.close()
+            service.audit_log = None
+            synchronous = summarize(time_calls(lambda: naive_batch(body), max(10, iterations // 4)))
+            rows.append({'batch': batch_size, 'p50 off (us)': off['p50_us'], 'p50 queued (us)': queued['p50_us'],
+                         'p99 queued (us)': queued['p99_us'], 'p50 sync commit (us)': synchronous['p50_us'],
+                         'p99 sync commit (us)': synchronous['p99_us']})
+        naive.close()
+        print_table(rows, ['batch', 'p50 off (us)', 'p50 queued (us)', 'p99 queued (us)', 'p50 sync commit (us)', 'p99 sync commit (us)'])
+
+        # The request path's own share, free of the scoring noise above
+        log = AuditLog(os.path.join(tmp, 'record'), max_pending_rows=10 ** 9)
+        one = synthetic_rows(engine, 1)
+        print(f"record(): {summarize(time_calls(lambda: log.record('/predict', 'v', engine.feature_names, one, (0.5,), (0,)), 100000))['p50_us'] * 1000:.0f} ns per call")
+
+        features = synthetic_rows(engine, args.rows, seed=5)
+        probabilities, predictions = engine.score(features)
+        writer_rows = []
+        for flush_rows in args.flush_rows:
+            log = AuditLog(os.path.join(tmp, f'writer-{flush_rows}'), flush_rows=flush_rows, max_pending_rows=10 ** 9)
+            for start in range(0, args.rows, 64):
+                log.record('/predict_batch', model.version, engine.feature_names, features[start:start + 64],
+                           probabilities[start:start + 64], predictions[start:start + 64])
+            started = time.perf_counter()
+            log.flush()
+            elapsed = time.perf_counter() - started
+            path = log.path
+            log.close()
+            writer_rows.append({'flush rows': flush_rows, 'rows/s': args.rows / elapsed,
+                                'bytes/row': os.path.getsize(path) / args.rows})
+        print_table(writer_rows, ['flush rows', 'rows/s', 'bytes/row'])
+
+        stored = list(read_audit(path))
+        stored_features = np.vstack([chunk[3] for chunk in stored])
+        stored_probabilities = np.concatenate([chunk[4] for chunk in stored])
+        stored_predictions = np.concatenate([chunk[5] for chunk in stored])
+        if not (np.array_equal(stored_features, features) and np.array_equal(stored_probabilities, probabilities)
+                and np.array_equal(stored_predictions, predictions)):
+            raise AssertionError('the audit file does not hold the recorded rows')
+        print(f'audit file round trip: {len(stored_features)} rows identical to the recorded ones')
+
+        coverage = audited_endpoints(service, model, os.path.join(tmp, 'endpoints'))
+        missing = [endpoint for endpoint, checks in coverage.items() if not all(checks)]
+        if missing:
+            raise AssertionError(f'scores returned without a matching audit record: {missing} ({coverage})')
+        print(f"every scoring endpoint logs what it returns: {', '.join(ENDPOINTS)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Forward passes and throughput of /predict_batch: two-pass DataFrame path vs single pass."""
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import legacy_predict, load_service, print_table, synthetic_payloads
+
+
+class ForwardPassCounter:
+    # Counts MLP forward passes by wrapping the classifier's fast forward pass
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.count = 0
+        self._original = classifier._forward_pass_fast
+
+    def __enter__(self):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return self._original(*args, **kwargs)
+        self.classifier._forward_pass_fast = counted
+        return self
+
+    def __exit__(self, *exc):
+        del self.classifier._forward_pass_fast
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+
+    rows = []
+    for size in args.sizes:
+        inputs = [service.BankruptcyInput(**p) for p in synthetic_payloads(model.engine, size, seed=size)]
+        records = [i.dict() for i in inputs]
+
+        # Labels must match the original behaviour exactly at the default threshold
+        _, expected = legacy_predict(model.pipeline, service.feature_name_mapping, records)
+        got = _single_pass(model, inputs)[1]
+        if not np.array_equal(got, expected):
+            print(f'label parity FAILED at size={size}')
+            return 1
+
+        with ForwardPassCounter(model.engine.classifier) as legacy_counter:
+            legacy_s = _best_of(lambda: legacy_predict(model.pipeline, service.feature_name_mapping, records), args.repeat)
+        with ForwardPassCounter(model.engine.classifier) as single_counter:
+            single_s = _best_of(lambda: _single_pass(model, inputs), args.repeat)
+        rows.append({
+            'rows': size,
+            'passes_two_pass': legacy_counter.count // (args.repeat + 1),
+            'passes_single': single_counter.count // (args.repeat + 1),
+            'two_pass_rows_s': size / legacy_s,
+            'single_rows_s': size / single_s,
+        })
+    print_table(rows, ['rows', 'passes_two_pass', 'passes_single', 'two_pass_rows_s', 'single_rows_s'])
+    return 0
+
+
+def _single_pass(model, inputs):
+    # /predict_batch scoring without the result cache
+    return model.score(model.engine.pack_many(inputs))
+
+
+def _best_of(func, repeat):
+    func()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Batch scoring throughput with the prediction cache off and on, at several repeat rates."""
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_rows, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--repeat-rates', type=float, nargs='+', default=[0.0, 0.5, 0.9, 1.0])
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    from cache import PredictionCache
+
+    universe = synthetic_rows(model.engine, args.batch_size * args.batches)
+    rng = np.random.default_rng(0)
+    results = []
+
+    # Single-row /predict path: one cached row vs one model call
+    row = universe[:1]
+    for mode in ('off', 'on'):
+        model.cache = PredictionCache() if mode == 'on' else None
+        model.score_cached(row)
+        samples = summarize(time_calls(lambda: model.score_cached(row), 2000))
+        results.append({'batch_size': 1, 'repeat_rate': 1.0, 'cache': mode, 'rows_s': 1e6 / samples['p50_us'],
+                        'hit_rate': model.cache.stats()['hit_rate'] if model.cache is not None else None})
+
+    for rate in args.repeat_rates:
+        # A `rate` share of each batch re-scores companies already seen in the warm-up batch
+        warm = universe[:args.batch_size]
+        batches = []
+        for b in range(1, args.batches + 1):
+            fresh = universe[(b % args.batches) * args.batch_size:][:args.batch_size].copy()
+            repeated = rng.random(args.batch_size) < rate
+            fresh[repeated] = warm[rng.integers(0, args.batch_size, int(repeated.sum()))]
+            batches.append(fresh)
+
+        for mode in ('off', 'on'):
+            model.cache = PredictionCache(max_entries=10 * args.batch_size) if mode == 'on' else None
+            model.score_cached(warm)
+            start = time.perf_counter()
+            for batch in batches:
+                model.score_cached(batch)
+            elapsed = time.perf_counter() - start
+            stats = model.cache.stats() if model.cache is not None else {}
+            results.append({'batch_size': args.batch_size, 'repeat_rate': rate, 'cache': mode, 'rows_s': args.batches * args.batch_size / elapsed,
+                            'hit_rate': stats.get('hit_rate')})
+    print_table(results, ['batch_size', 'repeat_rate', 'cache', 'rows_s', 'hit_rate'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Rows/second of /predict_batch (list of objects) vs /predict_columnar payload formats."""
+import argparse
+import io
+import json
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, synthetic_rows
+
+
+def _encode(rows, fields, fmt):
+    if fmt == 'json':
+        return json.dumps({field: rows[:, i].tolist() for i, field in enumerate(fields)}), 'application/json'
+    if fmt == 'raw':
+        return rows.astype('<f8').tobytes(), 'application/octet-stream'
+    if fmt == 'npy':
+        buffer = io.BytesIO()
+        np.save(buffer, rows)
+        return buffer.getvalue(), 'application/x-npy'
+    if fmt == 'arrow':
+        import pyarrow as pa
+        table = pa.table({field: rows[:, i] for i, field in enumerate(fields)})
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), 'application/vnd.apache.arrow.stream'
+    raise ValueError(fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--formats', nargs='+', default=['batch', 'json', 'raw', 'npy', 'arrow'])
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    from fastapi.testclient import TestClient
+    service, model = load_service()
+
+    fields = list(service.feature_name_mapping)
+    results = []
+    with TestClient(service.app) as client:
+        for size in args.sizes:
+            rows = synthetic_rows(model.engine, size, seed=size)
+            reference = None
+            for fmt in args.formats:
+                if fmt == 'batch':
+                    body = json.dumps([dict(zip(fields, row)) for row in rows.tolist()])
+                    path, headers = '/predict_batch', {'content-type': 'application/json'}
+                else:
+                    try:
+                        body, content_type = _encode(rows, fields, fmt)
+                    except ImportError:
+                        continue
+                    path, headers = '/predict_columnar', {'content-type': content_type}
+                start = time.perf_counter()
+                response = client.post(path, content=body, headers=headers)
+                elapsed = time.perf_counter() - start
+                response.raise_for_status()
+                probabilities = np.array(response.json()['probabilities'])
+                if reference is None:
+                    reference = probabilities
+                elif not np.allclose(probabilities, reference, rtol=0, atol=1e-12):
+                    print(f'parity FAILED for {fmt} at size={size}')
+                    return 1
+                results.append({'rows': size, 'format': fmt, 'MB': len(body) / 1e6, 'rows_s': size / elapsed})
+    print_table(results, ['rows', 'format', 'MB', 'rows_s'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Latency, load time and memory of the sklearn pipeline vs the compiled .npz artifact."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_rows, time_calls
+
+PROBE = r'''
+import json, sys, time, warnings
+from benchmarks.common import peak_rss_mb
+warnings.filterwarnings('ignore')
+import numpy as np
+t0 = time.perf_counter()
+path = sys.argv[1]
+if path.endswith('.npz'):
+    from compiled import load_compiled
+    model = load_compiled(path)
+    n = len(model.feature_names)
+    score = model.predict_proba
+else:
+    from joblib import load
+    from inference import InferenceEngine
+    pipeline = load(path)
+    names = list(pipeline.feature_names_in_)
+    engine = InferenceEngine(pipeline, {name: name for name in names})
+    n = engine.n_features
+    score = engine.predict_proba
+score(np.zeros((1, n)))
+t1 = time.perf_counter()
+print(json.dumps({'load_ms': (t1 - t0) * 1000, 'rss_MB': peak_rss_mb(),
+                  'sklearn_imported': 'sklearn' in sys.modules}))
+'''
+
+
+def _fresh_process(path):
+    output = subprocess.run([sys.executable, '-c', PROBE, path], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    from compiled import TOLERANCE, export_pipeline, load_compiled
+
+    row = synthetic_rows(model.engine, 1)
+    batch = synthetic_rows(model.engine, args.batch_size, seed=1)
+    reference = model.engine.predict_proba(batch)[:, 1]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        candidates = [('sklearn', service.config.MODEL_PATH, model.engine.predict_proba)]
+        for dtype in ('float64', 'float32', 'int8'):
+            path = os.path.join(tmp, f'model_{dtype}.npz')
+            export_pipeline(model.pipeline, path, dtype)
+            candidates.append((f'npz-{dtype}', path, load_compiled(path).predict_proba))
+
+        for name, path, score in candidates:
+            delta = float(np.max(np.abs(score(batch)[:, 1] - reference)))
+            single = summarize(time_calls(lambda: score(row), args.iterations))
+            batched = summarize(time_calls(lambda: score(batch), max(10, args.iterations // 20), warmup=5))
+            results.append({
+                'model': name,
+                'max_dp': f'{delta:.1e}',
+                'row_p50_us': single['p50_us'],
+                'row_p99_us': single['p99_us'],
+                'batch_rows_s': args.batch_size / (batched['p50_us'] / 1e6),
+                **_fresh_process(path),
+            })
+    print_table(results, ['model', 'max_dp', 'row_p50_us', 'row_p99_us', 'batch_rows_s', 'load_ms', 'rss_MB', 'sklearn_imported'])
+    print(f"tolerances: {TOLERANCE}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Throughput of /predict under concurrent callers, with and without micro-batching.
+
+Also checks that a row the model rejects fails only its own request, not the
+others that share its micro-batch.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, synthetic_payloads, synthetic_rows
+
+
+async def _drive(app, payloads, concurrency, requests_per_caller):
+    import httpx
+
+    latencies = []
+
+    async def caller(client, index):
+        for j in range(requests_per_caller):
+            payload = payloads[(index + j) % len(payloads)]
+            start = time.perf_counter()
+            response = await client.post('/predict', json=payload)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(caller(client, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, np.array(latencies)
+
+
+async def _one_bad_row(model, n_rows=10):
+    # (answered, failed, batches, results match unbatched scoring) for n_rows concurrent
+    # submits sharing one batch, the middle one with a NaN the model rejects
+    from batching import MicroBatcher
+
+    def score(features):
+        # The input check sklearn applies, whatever the artifact
+        if not np.isfinite(features).all():
+            raise ValueError('Input X contains NaN.')
+        return model.score(features)
+
+    batcher = MicroBatcher(score, max_wait_ms=50, max_batch_size=n_rows)
+    features = synthetic_rows(model.engine, n_rows, seed=7)
+    features[n_rows // 2, 0] = np.nan
+    results = await asyncio.gather(*(batcher.submit(row) for row in features), return_exceptions=True)
+    await batcher.close()
+    # The batch's rows are then scored one at a time, so compare with single-row calls
+    answered = [i for i, result in enumerate(results) if not isinstance(result, Exception)]
+    matches = n_rows // 2 not in answered and all(
+        results[i] == tuple(values[0] for values in model.score(features[i][None, :])) for i in answered)
+    return len(answered), n_rows - len(answered), batcher.batches, matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 50, 200])
+    parser.add_argument('--requests-per-caller', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+
+    payloads = synthetic_payloads(model.engine, 256)
+    batcher = model.batcher
+    rows = []
+    for mode in ('unbatched', 'batched'):
+        if mode == 'batched' and batcher is None:
+            continue
+        model.batcher = batcher if mode == 'batched' else None
+        for concurrency in args.concurrency:
+            elapsed, latencies = asyncio.run(_drive(service.app, payloads, concurrency, args.requests_per_caller))
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            rows.append({'mode': mode, 'concurrency': concurrency,
+                         'req_s': len(latencies) / elapsed, 'p50_ms': p50, 'p99_ms': p99})
+    model.batcher = batcher
+    print_table(rows, ['mode', 'concurrency', 'req_s', 'p50_ms', 'p99_ms'])
+    if batcher is not None:
+        stats = batcher.stats()
+        print(f"batcher: batches={stats['batches']} mean_batch_size={stats['mean_batch_size']:.1f} "
+              f"queue_p99_ms={stats['queue_time_ms']['p99_recent']:.2f}")
+
+    answered, failed, batches, matches = asyncio.run(_one_bad_row(model))
+    if (answered, failed, batches) != (9, 1, 1) or not matches:
+        raise AssertionError(f'one bad row in a batch of 10: {answered} answered, {failed} failed in {batches} batches')
+    print('one bad row in a batch of 10: 9 answered (same scores as unbatched), only the bad request failed')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Training data loading: ``pd.read_csv`` on every run vs the ``data.DataCache`` column store.
+
+Writes a CSV shaped like the training data (the target plus 95 features;
+``--rows`` rows and 10x that) to a temporary directory, or uses ``--data``
+when given, and times parsing the CSV, building the cache once, and the
+warm loads later runs pay: all columns, a 10-column subset, the float
+matrix, and a chunked pass. Cached values must equal the parsed CSV cast
+to the cached dtypes.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import peak_rss_mb, print_table
+
+TARGET = 'Bankrupt?'
+
+
+def write_csv(path, n_rows, seed=0):
+    from benchmarks.bench_winsorizer import synthetic_frame
+    frame = synthetic_frame(n_rows, seed)
+    frame.insert(0, TARGET, (np.random.default_rng(seed).random(n_rows) < 0.03).astype(int))
+    frame.to_csv(path, index=False)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def bench_source(name, source, cache_dir, chunk_rows):
+    import pandas as pd
+    from data import DataCache
+
+    rows = []
+    parse_s, frame = timed(lambda: pd.read_csv(source))
+    rows.append({'data': name, 'step': 'pd.read_csv (every run)', 'ms': parse_s * 1000, 'MB': frame.memory_usage().sum() / 2**20})
+
+    build_s, _ = timed(lambda: DataCache(source, cache_dir=cache_dir).refresh())
+    rows.append({'data': name, 'step': 'build cache (once)', 'ms': build_s * 1000})
+
+    features = [c for c in frame.columns if c != TARGET]
+    subset = [TARGET] + features[:9]
+    for step, func in (('warm load, all columns', lambda c: c.load()),
+                       ('warm load, 10 columns', lambda c: c.load(subset)),
+                       ('warm float32 matrix', lambda c: c.matrix(features)),
+                       (f'chunked pass ({chunk_rows} rows)', lambda c: sum(len(chunk) for chunk in c.iter_chunks(chunk_rows=chunk_rows)))):
+        # A new DataCache per step: the manifest check and memory maps are part of every run
+        seconds, result = timed(lambda: func(DataCache(source, cache_dir=cache_dir)))
+        row = {'data': name, 'step': step, 'ms': seconds * 1000, 'speedup': parse_s / seconds}
+        if hasattr(result, 'memory_usage'):
+            row['MB'] = result.memory_usage().sum() / 2**20
+        elif hasattr(result, 'nbytes'):
+            row['MB'] = result.nbytes / 2**20
+        rows.append(row)
+
+    cached = DataCache(source, cache_dir=cache_dir).load()
+    for column in frame.columns:
+        expected = frame[column].to_numpy().astype(cached[column].dtype)
+        if not np.array_equal(cached[column].to_numpy(), expected, equal_nan=True):
+            raise AssertionError(f'cached column {column!r} differs from the CSV')
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', help='training CSV to benchmark instead of synthetic data')
+    parser.add_argument('--rows', type=int, default=6819)
+    parser.add_argument('--chunk-rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    workdir = tempfile.mkdtemp(prefix='bench_data-')
+    try:
+        if args.data:
+            sources = [('data', args.data)]
+        else:
+            sources = []
+            for name, n_rows in (('full', args.rows), ('10x', 10 * args.rows)):
+                path = os.path.join(workdir, f'{name}.csv')
+                write_csv(path, n_rows)
+                sources.append((f'{name} ({n_rows} rows)', path))
+
+        results = []
+        for name, source in sources:
+            results += bench_source(name, source, os.path.join(workdir, 'cache'), args.chunk_rows)
+        print_table(results, ['data', 'step', 'ms', 'speedup', 'MB'])
+        print(f'peak RSS: {peak_rss_mb():.0f} MB')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
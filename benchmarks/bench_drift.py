@@ -0,0 +1,91 @@
+"""Cost of the drift monitor on the request path and in the background drain.
+
+Scores synthetic rows through ``ServedModel.score_cached`` (cache disabled)
+with and without a ``drift.DriftMonitor`` and reports the per-call latency
+for several batch sizes; the difference is what the request path pays,
+and ``observe`` is also timed on its own.
+Then times ``drain`` (the background task's work) per row, and checks the
+streaming mean, standard deviation and PSI against numpy on all the rows
+observed, and that rows with NaN or infinite values are counted but leave
+the statistics untouched.
+"""
+import argparse
+import json
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_rows, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024])
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    from drift import DriftMonitor, _psi, _bin_counts, reference_profile
+
+    _, model = load_service()
+    model.cache = None
+    reference_rows = synthetic_rows(model.engine, 20000, seed=1)
+    reference = reference_profile(reference_rows, model.engine.feature_names)
+
+    rows, observed = [], []
+    for batch_size in args.batch_sizes:
+        features = synthetic_rows(model.engine, batch_size, seed=batch_size)
+        iterations = max(50, args.iterations // max(1, batch_size // 64))
+        model.drift = None
+        baseline = summarize(time_calls(lambda: model.score_cached(features), iterations))
+        monitor = model.drift = DriftMonitor(model.engine.feature_names, reference, max_pending=10 ** 6)
+        monitored = summarize(time_calls(lambda: model.score_cached(features), iterations))
+        pending = monitor.pending
+
+        start = time.perf_counter()
+        drained = monitor.drain()
+        drain_s = time.perf_counter() - start
+        observed.append((monitor, features, pending))
+        rows.append({'batch': batch_size, 'p50 off (us)': baseline['p50_us'], 'p50 on (us)': monitored['p50_us'],
+                     'overhead (us)': monitored['p50_us'] - baseline['p50_us'],
+                     'drain (us/row)': drain_s / max(drained, 1) * 1e6, 'rows drained': drained})
+    print_table(rows, ['batch', 'p50 off (us)', 'p50 on (us)', 'overhead (us)', 'drain (us/row)', 'rows drained'])
+    # The request path's own share, free of the scoring noise above
+    monitor = DriftMonitor(model.engine.feature_names, reference, max_pending=1024)
+    print(f"observe(): {summarize(time_calls(lambda: monitor.observe(features), 100000))['p50_us'] * 1000:.0f} ns per call")
+
+    # Every observed batch was the same matrix, so the statistics must match numpy on it
+    for monitor, features, pending in observed:
+        stats = monitor.stats()
+        mean = np.array([stats['features'][name]['mean'] for name in monitor.feature_names])
+        std = np.array([stats['features'][name]['std'] for name in monitor.feature_names])
+        psi = np.array([stats['features'][name]['psi'] for name in monitor.feature_names])
+        expected_psi = _psi(_bin_counts(features, monitor.edges), monitor.reference_counts)
+        if stats['rows'] != pending * len(features):
+            raise AssertionError(f"monitor saw {stats['rows']} rows, expected {pending * len(features)}")
+        # Some features reach ~1e10, so the absolute tolerance scales with each feature
+        atol = 1e-12 * np.maximum(np.abs(features).max(axis=0), 1.0)
+        if not (np.allclose(mean, features.mean(axis=0), rtol=1e-9, atol=atol)
+                and np.allclose(std, features.std(axis=0), rtol=1e-6, atol=atol)
+                and np.allclose(psi, expected_psi, rtol=1e-9, atol=1e-12)):
+            raise AssertionError(f'streaming statistics differ from numpy for batch size {len(features)}')
+    # A non-finite row is counted and skipped; the statistics (and their JSON) stay as they were
+    monitor, features, _ = observed[-1]
+    before = monitor.stats()
+    bad = features[:2].copy()
+    bad[0, 0], bad[1, -1] = np.nan, np.inf
+    monitor.observe(bad)
+    monitor.drain()
+    after = monitor.stats()
+    if monitor.non_finite_rows != 2 or after['features'] != before['features'] or after['rows'] != before['rows']:
+        raise AssertionError('non-finite rows reached the drift statistics')
+    json.dumps(after, allow_nan=False)
+    state = sum(getattr(observed[0][0], name).nbytes for name in ('mean', 'm2', 'min', 'max', 'counts', 'edges', 'reference_counts'))
+    print(f'monitor state: {state / 1024:.0f} KiB for {len(model.engine.feature_names)} features, independent of traffic')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Cost of model evaluation: threshold sweeps and bootstrap intervals.
+
+Builds synthetic test sets (imbalanced labels, tied probabilities as tree
+models produce) and compares ``evaluation.Evaluator`` with the sklearn
+loops it replaces:
+
+- sweep: precision, recall and F1 at every distinct probability, against one
+  ``training.metrics_from_proba`` call per threshold (timed on a sample of
+  thresholds and extrapolated);
+- bootstrap: ``--replicates`` resamples of the test rows, against one
+  ``metrics_from_proba`` call per resample on the same draws.
+
+Checks that the metrics, the sampled points of the curve and the first 50
+bootstrap replicates match sklearn's.
+"""
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import print_table
+
+
+def synthetic_scores(n_rows, seed, decimals=None):
+    # ~3% positives whose probabilities are shifted up; `decimals` rounds them into ties
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n_rows) < 0.03).astype(np.int64)
+    proba = 1 / (1 + np.exp(-(rng.normal(size=n_rows) + 2.5 * y - 2)))
+    return y, proba if decimals is None else np.round(proba, decimals)
+
+
+def naive_sweep(y, proba, thresholds):
+    from training import metrics_from_proba
+    return [metrics_from_proba(y, proba, threshold) for threshold in thresholds]
+
+
+def naive_bootstrap(y, proba, seed, n_replicates):
+    # Same draws as SortedScores.bootstrap (indices into the rows sorted by probability),
+    # one sklearn evaluation per resample
+    from training import metrics_from_proba
+    order = np.argsort(proba, kind='stable')
+    y, proba = y[order], proba[order]
+    draws = np.random.default_rng(seed).integers(0, len(y), size=(n_replicates, len(y)))
+    return [metrics_from_proba(y[rows], proba[rows]) for rows in draws]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1364, 20000])
+    parser.add_argument('--replicates', type=int, default=1000)
+    parser.add_argument('--sample-thresholds', type=int, default=50)
+    parser.add_argument('--n-jobs', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    from evaluation import METRICS, Evaluator, SortedScores
+
+    rows = []
+    for n_rows in args.rows:
+        for ties in (None, 2):
+            y, proba = synthetic_scores(n_rows, seed=n_rows, decimals=ties)
+            evaluator = Evaluator(y)
+            evaluator.add('model', proba)
+
+            start = time.perf_counter()
+            curve = evaluator.curve('model')
+            best = evaluator.best_threshold('model')
+            sweep_s = time.perf_counter() - start
+            thresholds = curve['threshold']
+            sample = np.linspace(0, len(thresholds) - 1, min(args.sample_thresholds, len(thresholds))).astype(int)
+            start = time.perf_counter()
+            expected = naive_sweep(y, proba, thresholds[sample])
+            naive_sweep_s = (time.perf_counter() - start) / len(sample) * len(thresholds)
+
+            start = time.perf_counter()
+            evaluator.intervals(n_boot=args.replicates, n_jobs=args.n_jobs)
+            bootstrap_s = time.perf_counter() - start
+            start = time.perf_counter()
+            naive_bootstrap(y, proba, 0, args.replicates)
+            naive_bootstrap_s = time.perf_counter() - start
+
+            # Parity: metrics at 0.5, the sampled points of the curve and a chunk of replicates
+            for name, value in evaluator.metrics('model').items():
+                if not np.isclose(value, naive_sweep(y, proba, [0.5])[0][name], rtol=1e-12, atol=1e-12):
+                    raise AssertionError(f'{name} differs from sklearn')
+            for metric in ('Precision', 'Recall', 'F1 Score'):
+                if not np.allclose(curve[metric][sample], [m[metric] for m in expected], rtol=1e-12, atol=1e-12):
+                    raise AssertionError(f'{metric} curve differs from sklearn')
+            replicates = SortedScores(y, proba).bootstrap(0.5, 0, 50)
+            for i, reference in enumerate(naive_bootstrap(y, proba, 0, 50)):
+                for metric in METRICS:
+                    if not np.isclose(replicates[metric][i], reference[metric], rtol=1e-12, atol=1e-12, equal_nan=True):
+                        raise AssertionError(f'bootstrap replicate {i} {metric} differs from sklearn')
+
+            rows.append({'rows': n_rows, 'thresholds': len(thresholds), 'sweep (ms)': sweep_s * 1e3,
+                         'sklearn sweep (ms)': naive_sweep_s * 1e3, 'bootstrap (ms)': bootstrap_s * 1e3,
+                         'sklearn bootstrap (ms)': naive_bootstrap_s * 1e3,
+                         'speedup': naive_bootstrap_s / bootstrap_s, 'best threshold': best['threshold']})
+    print_table(rows, ['rows', 'thresholds', 'sweep (ms)', 'sklearn sweep (ms)', 'bootstrap (ms)',
+                       'sklearn bootstrap (ms)', 'speedup', 'best threshold'])
+    print(f'{args.replicates} bootstrap replicates; sweep and replicates match sklearn to 1e-12')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
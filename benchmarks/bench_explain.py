@@ -0,0 +1,147 @@
+"""Cost of /explain_batch against /predict_batch and a model-agnostic baseline.
+
+Times the handlers' work (``main.score_batch`` and
+``main.explain_batch_rows``, decoding and encoding included) on the same
+JSON bodies for several batch sizes and both attribution methods. For
+reference, also times occlusion on the engine: one extra ``predict_proba``
+per feature, each feature in turn replaced by its training mean, which is
+the cheapest of the perturbation-based explainers.
+
+Checks that the explained probabilities equal the served ones, that the
+backpropagated gradient matches central finite differences of the served
+log-odds, and that integrated gradients add up to logit(x) - logit(mean).
+Integrated gradients are computed a few rows at a time; they must equal the
+single pass over every path point, and the peak memory of a large batch at
+the maximum ``steps`` is reported.
+"""
+import argparse
+import json
+import sys
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_rows, time_calls
+
+
+def occlusion(engine, features, baseline):
+    # |change in probability| when each feature is set to the baseline, per row
+    probabilities = engine.predict_proba(features)[:, 1]
+    out = np.empty_like(features)
+    for j in range(features.shape[1]):
+        occluded = features.copy()
+        occluded[:, j] = baseline[j]
+        out[:, j] = probabilities - engine.predict_proba(occluded)[:, 1]
+    return out
+
+
+def logits(engine, features):
+    probabilities = np.clip(engine.predict_proba(features)[:, 1], 1e-300, 1 - 1e-16)
+    return np.log(probabilities / (1 - probabilities))
+
+
+def single_pass_integrated_gradients(explainer, features, steps):
+    # Every path point of the batch in one (steps * rows) pass
+    inputs = np.clip(features, *explainer.clip) if explainer.clip is not None else features
+    difference = inputs - explainer.baseline
+    alphas = (np.arange(steps) + 0.5) / steps
+    path = explainer.baseline + alphas[:, None, None] * difference
+    _, path_gradient = explainer.logit_and_gradient(path.reshape(-1, inputs.shape[1]))
+    return difference * path_gradient.reshape(steps, *inputs.shape).mean(axis=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024])
+    parser.add_argument('--steps', type=int, default=16)
+    parser.add_argument('--large-rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    model.cache = None
+    engine, explainer = model.engine, model.explainer
+    if explainer is None:
+        print(f'explanations unavailable for this artifact: {model.explainer_error}')
+        return 1
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        features = synthetic_rows(engine, batch_size, seed=batch_size)
+        body = json.dumps([dict(zip(engine.fields, row.tolist())) for row in features]).encode()
+        iterations = max(20, args.iterations // max(1, batch_size // 64))
+        predict = summarize(time_calls(lambda: service.score_batch(model, body, 'application/json'), iterations))
+        gradient = summarize(time_calls(
+            lambda: service.explain_batch_rows(model, body, 'application/json', 5, 'gradient_input', args.steps), iterations))
+        integrated = summarize(time_calls(
+            lambda: service.explain_batch_rows(model, body, 'application/json', 5, 'integrated_gradients', args.steps),
+            max(10, iterations // 4)))
+        occluded = summarize(time_calls(lambda: occlusion(engine, features, explainer.baseline), max(5, iterations // 20), warmup=2))
+        rows.append({'batch': batch_size, 'predict (us)': predict['p50_us'], 'gradient (us)': gradient['p50_us'],
+                     'x predict': gradient['p50_us'] / predict['p50_us'], 'IG (us)': integrated['p50_us'],
+                     'occlusion (us)': occluded['p50_us']})
+    print_table(rows, ['batch', 'predict (us)', 'gradient (us)', 'x predict', 'IG (us)', 'occlusion (us)'])
+
+    features = synthetic_rows(engine, 256, seed=7)
+    inputs = np.clip(features, *explainer.clip) if explainer.clip is not None else features
+    explained, _ = explainer.explain(features)
+    probabilities, predictions = explainer.decide(explained)
+    served_probabilities, served_predictions = model.score_cached(features)
+    if not (np.allclose(probabilities, served_probabilities, rtol=1e-9, atol=1e-12)
+            and np.array_equal(predictions, served_predictions)):
+        raise AssertionError('explained probabilities differ from the served ones')
+
+    # Central differences of the served log-odds, one feature at a time, with steps of 1e-4 standard deviations;
+    # entries within a step of a winsorizer bound are skipped (the served model clips the step away), and a step
+    # across a ReLU kink is legitimately off, so only the share that agrees is checked
+    _, gradient = explainer.logit_and_gradient(inputs)
+    scale = engine._scaler[1] if engine._scaler is not None else np.ones(engine.n_features)
+    errors = np.full_like(gradient, np.nan)
+    for j in range(engine.n_features):
+        h = 1e-4 * scale[j]
+        up, down = inputs.copy(), inputs.copy()
+        up[:, j] += h
+        down[:, j] -= h
+        numeric = (logits(engine, up) - logits(engine, down)) / (2 * h)
+        inside = np.ones(len(inputs), dtype=bool) if explainer.clip is None else \
+            (down[:, j] > explainer.clip[0][j]) & (up[:, j] < explainer.clip[1][j])
+        errors[inside, j] = np.abs(numeric - gradient[:, j])[inside] * scale[j]
+    errors = errors[~np.isnan(errors)]
+    agree = np.mean(errors < 1e-4)
+    print(f'gradient vs finite differences: {agree:.2%} of {len(errors)} entries within 1e-4 log-odds per standard deviation '
+          f'(median error {np.median(errors):.1e})')
+    if agree < 0.99:
+        raise AssertionError('backpropagated gradient differs from finite differences')
+
+    # Completeness: the integrated gradients of a row add up to logit(x) - logit(mean)
+    for steps in (args.steps, 4 * args.steps):
+        explained, attributions = explainer.explain(features, 'integrated_gradients', steps)
+        gap = np.abs(attributions.sum(axis=1) - (explained - explainer.baseline_logit))
+        spread = np.abs(explained - explainer.baseline_logit)
+        print(f'integrated gradients, {steps} steps: median completeness gap {np.median(gap):.3f} '
+              f'(p95 {np.percentile(gap, 95):.3f}) for a median |logit - baseline| of {np.median(spread):.2f}')
+
+    # Chunked path (3 rows per pass here) against the single pass
+    import explain
+    per_pass, explain.PATH_POINTS_PER_PASS = explain.PATH_POINTS_PER_PASS, 3 * args.steps
+    try:
+        _, chunked = explainer.explain(features[:100], 'integrated_gradients', args.steps)
+    finally:
+        explain.PATH_POINTS_PER_PASS = per_pass
+    if not np.allclose(chunked, single_pass_integrated_gradients(explainer, features[:100], args.steps), rtol=1e-12, atol=1e-12):
+        raise AssertionError('chunked integrated gradients differ from the single pass')
+    import tracemalloc
+    large = synthetic_rows(model.engine, args.large_rows, seed=4)
+    tracemalloc.start()
+    explainer.explain(large, 'integrated_gradients', 256)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'integrated gradients, {args.large_rows} rows x 256 steps: peak {peak / 2 ** 20:.0f} MiB '
+          f'(single pass: {args.large_rows * 256 * large.shape[1] * 8 / 2 ** 30:.1f} GiB of path inputs alone); '
+          f'chunked result equals the single pass')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Cost of the request instrumentation: metric updates, stage timers and the ASGI middleware."""
+import argparse
+import asyncio
+import sys
+import time
+
+from benchmarks.common import print_table, summarize, time_calls
+
+
+def _asgi_overhead(n_requests):
+    # Same trivial ASGI app driven directly, with and without MetricsMiddleware
+    from metrics import MetricsMiddleware
+
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'{}'})
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    async def drive(asgi):
+        started = time.perf_counter()
+        for _ in range(n_requests):
+            await asgi({'type': 'http', 'path': '/predict', 'method': 'POST'}, receive, send)
+        return (time.perf_counter() - started) / n_requests
+
+    bare = asyncio.run(drive(app))
+    instrumented = asyncio.run(drive(MetricsMiddleware(app)))
+    return bare, instrumented
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    from metrics import ERRORS, REGISTRY, STAGE_SECONDS, Timer
+
+    def timed_stage():
+        with Timer(STAGE_SECONDS, 'decode'):
+            pass
+
+    results = []
+    for name, func in (('Histogram.observe', lambda: STAGE_SECONDS.observe(1.2e-4, 'decode')),
+                       ('Counter.inc', lambda: ERRORS.inc('/predict', '422')),
+                       ('Timer (enter+exit)', timed_stage)):
+        results.append({'operation': name, **summarize(time_calls(func, args.iterations, warmup=1000))})
+
+    bare, instrumented = _asgi_overhead(args.iterations)
+    results.append({'operation': 'MetricsMiddleware (mean)', 'mean_us': (instrumented - bare) * 1e6})
+    results.append({'operation': 'render /metrics', **summarize(time_calls(REGISTRY.render, 200, warmup=5))})
+
+    print_table(results, ['operation', 'p50_us', 'p99_us', 'mean_us'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
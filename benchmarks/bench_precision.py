@@ -0,0 +1,87 @@
+"""Throughput, memory and accuracy of the served model per inference precision.
+
+Builds the engine ``registry.select_precision`` would serve for each
+``INFERENCE_PRECISION`` (float64 through sklearn, then the compiled network in
+float64, float32 and int8) from the configured artifact and reports, per
+mode: the weights' size, the peak working memory of scoring a large batch,
+the p50 latency and rows/s for several batch sizes, and the agreement with
+float64 (max |dp| and share of labels changed) on the artifact's reference
+batch and on synthetic rows, with the load-time check's verdict under the
+configured PRECISION_MAX_DELTA / PRECISION_MAX_FLIP_RATE.
+"""
+import argparse
+import sys
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_rows, time_calls
+
+
+def peak_memory_kb(func):
+    # Peak of the NumPy allocations made by one call
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024])
+    parser.add_argument('--check-rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    from compiled import agreement, reduce_precision
+    from inference import InferenceEngine
+    from registry import reference_batch
+
+    config = service.config
+    reference_engine = InferenceEngine(model.pipeline, service.feature_name_mapping)
+    classifier = reference_engine.classifier
+    reference = reference_batch(model.metadata, reference_engine)
+    synthetic = synthetic_rows(reference_engine, args.check_rows, seed=3)
+
+    modes = [('float64 (sklearn)', reference_engine,
+              sum(a.nbytes for a in getattr(classifier, 'coefs_', []) + getattr(classifier, 'intercepts_', [])) or None)]
+    for precision in ('float64', 'float32', 'int8'):
+        compiled = reduce_precision(model.pipeline, precision)
+        modes.append((precision, InferenceEngine(compiled, service.feature_name_mapping), compiled.nbytes))
+
+    rows = []
+    large = synthetic[:max(args.batch_sizes)]
+    for name, engine, nbytes in modes:
+        row = {'mode': name, 'weights (KiB)': None if nbytes is None else nbytes / 1024,
+               'peak (KiB)': peak_memory_kb(lambda: engine.score(large, config.DECISION_THRESHOLD))}
+        for batch_size in args.batch_sizes:
+            batch = synthetic[:batch_size]
+            iterations = max(20, args.iterations // max(1, batch_size // 64))
+            latency = summarize(time_calls(lambda: engine.score(batch, config.DECISION_THRESHOLD), iterations))
+            row[f'b={batch_size} p50 (us)'] = latency['p50_us']
+            row[f'b={batch_size} rows/s'] = batch_size / (latency['p50_us'] / 1e6)
+        check = agreement(reference_engine, engine, reference, config.DECISION_THRESHOLD)
+        wide = agreement(reference_engine, engine, synthetic, config.DECISION_THRESHOLD)
+        row.update({'max dp': f"{check['max_delta']:.1e}", 'flips': f"{check['flip_rate']:.2%}",
+                    'max dp (synthetic)': f"{wide['max_delta']:.1e}", 'flips (synthetic)': f"{wide['flip_rate']:.2%}",
+                    'check': 'pass' if check['max_delta'] <= config.PRECISION_MAX_DELTA
+                    and check['flip_rate'] <= config.PRECISION_MAX_FLIP_RATE else 'fallback'})
+        rows.append(row)
+
+    columns = ['mode', 'weights (KiB)', 'peak (KiB)']
+    columns += [f'b={b} {unit}' for b in args.batch_sizes for unit in ('p50 (us)', 'rows/s')]
+    print_table(rows, columns)
+    print()
+    print_table(rows, ['mode', 'max dp', 'flips', 'max dp (synthetic)', 'flips (synthetic)', 'check'])
+    print(f'reference batch: {len(reference)} rows; limits: max |dp| {config.PRECISION_MAX_DELTA:g}, '
+          f'labels changed {config.PRECISION_MAX_FLIP_RATE:.2%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Parity check and p50/p99 latency of /predict: DataFrame path vs array engine."""
+import argparse
+import sys
+import warnings
+
+import numpy as np
+
+from benchmarks.common import legacy_predict, load_service, print_table, summarize, synthetic_payloads, time_calls
+
+
+def _score_one(model, input_data):
+    # /predict scoring without the micro-batcher and the result cache
+    probabilities, predictions = model.score(model.engine.pack(input_data))
+    return probabilities[0], predictions[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--parity-rows', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+
+    payloads = synthetic_payloads(model.engine, args.parity_rows)
+    inputs = [service.BankruptcyInput(**p) for p in payloads]
+
+    # Parity: every row must score identically through both paths
+    expected_proba, expected_pred = legacy_predict(model.pipeline, service.feature_name_mapping, [i.dict() for i in inputs])
+    got = [_score_one(model, i) for i in inputs]
+    got_proba = np.array([p for p, _ in got])
+    got_pred = np.array([label for _, label in got])
+    max_delta = float(np.max(np.abs(got_proba - expected_proba)))
+    mismatches = int(np.sum(got_pred != expected_pred))
+    print(f'parity: rows={len(inputs)} max|dp|={max_delta:.3e} label_mismatches={mismatches}')
+    if max_delta > 1e-12 or mismatches:
+        print('parity FAILED')
+        return 1
+
+    sample = inputs[0]
+    rows = [
+        {'path': 'dataframe', **summarize(time_calls(
+            lambda: legacy_predict(model.pipeline, service.feature_name_mapping, [sample.dict()]), args.iterations))},
+        {'path': 'engine', **summarize(time_calls(lambda: _score_one(model, sample), args.iterations))},
+    ]
+    print_table(rows, ['path', 'p50_us', 'p95_us', 'p99_us', 'mean_us'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Per-request decode and encode time: pydantic + FastAPI's encoder vs the schema-aware serialization layer.
+
+The "pydantic" rows reproduce what FastAPI did for ``BankruptcyInput`` bodies
+(stdlib JSON parse, model validation, field packing) and for dict responses
+(``jsonable_encoder`` + ``json.dumps``); the "fast" rows use ``serialization``.
+Both must produce the same feature matrices and the same decoded responses.
+"""
+import argparse
+import json
+import sys
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_payloads, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from serialization import encode_batch, encode_prediction, orjson
+
+    engine, decoder = model.engine, model.request_decoder
+    content_type = 'application/json'
+    adapter = TypeAdapter(list[service.BankruptcyInput])
+
+    def fastapi_render(content):
+        # JSONResponse.render after FastAPI's serialize_response
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode()
+
+    results = []
+    for n in args.batch_sizes:
+        payloads = synthetic_payloads(engine, n)
+        probabilities, predictions = model.score(engine.pack_many([service.BankruptcyInput(**p) for p in payloads]))
+        iterations = max(args.iterations // n, 20)
+
+        if n == 1:
+            body = json.dumps(payloads[0]).encode()
+            legacy_decode = lambda: engine.pack_row(service.BankruptcyInput.model_validate(json.loads(body)))
+            fast_decode = lambda: decoder.decode_one(body, content_type)
+            legacy_encode = lambda: fastapi_render({
+                'probability_of_bankruptcy': float(probabilities[0]),
+                'prediction': int(predictions[0]),
+                'prediction_label': 'Bankrupt' if predictions[0] == 1 else 'Not Bankrupt'
+            })
+            fast_encode = lambda: encode_prediction(probabilities[0], predictions[0])
+        else:
+            body = json.dumps(payloads).encode()
+            legacy_decode = lambda: engine.pack_many(adapter.validate_python(json.loads(body)))
+            fast_decode = lambda: decoder.decode_many(body, content_type)
+            legacy_encode = lambda: fastapi_render({
+                'probabilities': probabilities.tolist(),
+                'predictions': predictions.tolist(),
+                'prediction_labels': ['Bankrupt' if pred == 1 else 'Not Bankrupt' for pred in predictions]
+            })
+            fast_encode = lambda: encode_batch(probabilities, predictions)
+
+        # Parity: identical feature matrices and identical decoded responses
+        if not np.array_equal(np.atleast_2d(legacy_decode()), np.atleast_2d(fast_decode())):
+            print(f"Decoded features differ at batch size {n}", file=sys.stderr)
+            return 1
+        if json.loads(legacy_encode()) != json.loads(fast_encode()):
+            print(f"Encoded responses differ at batch size {n}", file=sys.stderr)
+            return 1
+
+        for stage, legacy, fast in (('decode', legacy_decode, fast_decode), ('encode', legacy_encode, fast_encode)):
+            base = summarize(time_calls(legacy, iterations, warmup=5))
+            new = summarize(time_calls(fast, iterations, warmup=5))
+            for path, stats in (('pydantic', base), ('fast', new)):
+                results.append({'batch_size': n, 'stage': stage, 'path': path, **stats,
+                                'speedup': base['p50_us'] / stats['p50_us']})
+
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib json fallback)'}")
+    print_table(results, ['batch_size', 'stage', 'path', 'p50_us', 'p99_us', 'speedup'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
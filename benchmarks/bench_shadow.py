@@ -0,0 +1,125 @@
+"""Cost of shadow scoring on the request path, and what happens when the candidate falls behind.
+
+Times ``main.score_batch`` (the /predict_batch handler's work) for several
+batch sizes in three setups:
+
+- without a shadow;
+- with a ``shadow.ShadowScorer`` whose candidate keeps up;
+- with a candidate slowed by ``--slow-ms`` per call, so that the queue
+  fills and requests are dropped instead of delaying production.
+
+``submit`` is also timed on its own. The candidate defaults to the served
+artifact loaded again as a separate version; ``--candidate`` compares another
+one. Finally checks the aggregated agreement statistics against the same
+comparison computed directly with numpy on every submitted batch.
+"""
+import argparse
+import json
+import sys
+import time
+import types
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, summarize, synthetic_rows, time_calls
+
+
+class SlowEngine:
+    # The candidate's engine with a fixed extra delay per call
+    def __init__(self, engine, delay):
+        self.engine = engine
+        self.delay = delay
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def score(self, features, threshold=0.5):
+        time.sleep(self.delay)
+        return self.engine.score(features, threshold)
+
+
+def wait_idle(scorer, timeout=60.0):
+    # Until every submitted request has been compared (or has failed)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        stats = scorer.stats()
+        done = sum(c['requests'] for c in stats['production'].values()) + stats['failures']
+        if done >= stats['submitted']:
+            return stats
+        time.sleep(0.005)
+    raise TimeoutError('shadow workers did not catch up')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024])
+    parser.add_argument('--candidate', default=None, help='artifact to shadow with (default: MODEL_PATH)')
+    parser.add_argument('--slow-ms', type=float, default=5.0)
+    parser.add_argument('--max-pending', type=int, default=64)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    model.cache = None
+    model.drift = None
+    import config
+    from shadow import ShadowScorer
+
+    candidate = service.registry.load(args.candidate or config.MODEL_PATH, 'shadow-candidate')
+    slow = types.SimpleNamespace(version='slow-candidate', engine=SlowEngine(candidate.engine, args.slow_ms / 1000))
+
+    rows, checked = [], []
+    for batch_size in args.batch_sizes:
+        features = synthetic_rows(model.engine, batch_size, seed=batch_size)
+        body = json.dumps([dict(zip(model.engine.fields, row.tolist())) for row in features]).encode()
+        iterations = max(50, args.iterations // max(1, batch_size // 64))
+        handler = lambda: service.score_batch(model, body, 'application/json')
+
+        service.shadow = None
+        off = summarize(time_calls(handler, iterations))
+        results = {}
+        for name, shadowed in (('on', candidate), ('slow', slow)):
+            scorer = service.shadow = ShadowScorer(shadowed, config.DECISION_THRESHOLD, max_pending=args.max_pending)
+            scorer.start()
+            timing = summarize(time_calls(handler, iterations))
+            service.shadow = None
+            results[name] = (timing, wait_idle(scorer) if shadowed is candidate else scorer.stats())
+            scorer.close()
+            if shadowed is candidate:
+                checked.append((features, results[name][1]))
+        on, on_stats = results['on']
+        slow_timing, slow_stats = results['slow']
+        rows.append({'batch': batch_size, 'p50 off (us)': off['p50_us'], 'p99 off (us)': off['p99_us'],
+                     'p50 on (us)': on['p50_us'], 'p99 on (us)': on['p99_us'],
+                     'p99 slow (us)': slow_timing['p99_us'],
+                     'dropped slow': slow_stats['dropped'] / (slow_stats['dropped'] + slow_stats['submitted'])})
+    print_table(rows, ['batch', 'p50 off (us)', 'p99 off (us)', 'p50 on (us)', 'p99 on (us)', 'p99 slow (us)', 'dropped slow'])
+
+    # The request path's own share, with a queue that is always full
+    scorer = ShadowScorer(candidate, config.DECISION_THRESHOLD, max_pending=1)
+    features = synthetic_rows(model.engine, 64, seed=3)
+    probabilities, predictions = model.score(features)
+    print(f"submit(): {summarize(time_calls(lambda: scorer.submit(model, features, probabilities, predictions, 1e-4), 100000))['p50_us'] * 1000:.0f} ns per call")
+
+    # Every submitted batch was the same matrix, so the statistics must equal one direct comparison scaled up
+    for features, stats in checked:
+        comparison = stats['production'][model.version]
+        probabilities, predictions = model.score(features)
+        shadow_probabilities, shadow_predictions = candidate.engine.score(features, config.DECISION_THRESHOLD)
+        delta = np.abs(shadow_probabilities - probabilities)
+        n = comparison['requests']
+        if stats['failures'] or n != stats['submitted'] or comparison['rows'] != n * len(features):
+            raise AssertionError(f"compared {comparison['rows']} rows of {stats['submitted']} requests, {stats['failures']} failures")
+        if comparison['label_disagreements'] != n * int((shadow_predictions != predictions).sum()):
+            raise AssertionError('label disagreements differ from numpy')
+        if not (np.isclose(comparison['probability_delta']['mean_abs'], delta.mean(), rtol=1e-9, atol=1e-15)
+                and comparison['probability_delta']['max_abs'] == delta.max()):
+            raise AssertionError('probability deltas differ from numpy')
+    print(f'shadow statistics match numpy; {len(checked)} batch sizes, constant memory per production version')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Startup budget of the inference service: import time, time-to-first-prediction and RSS.
+
+Every measurement runs in a fresh interpreter. ``--save`` writes the medians
+as JSON so they can be tracked across commits; ``--budget-ms`` fails the run
+when time-to-first-prediction exceeds the budget.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks.common import print_table
+
+PROBE = r'''
+import json, sys, time, warnings
+warnings.filterwarnings('ignore')
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+main.load_model()
+t2 = time.perf_counter()
+sample = main.BankruptcyInput(**{field: 0.1 for field in main.feature_name_mapping})
+main.registry.active.score_one(sample)
+t3 = time.perf_counter()
+from benchmarks.common import peak_rss_mb
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'load_ms': (t2 - t1) * 1000,
+    'first_prediction_ms': (t3 - t0) * 1000,
+    'rss_MB': peak_rss_mb(),
+    'modules': len(sys.modules),
+    'pandas_imported': 'pandas' in sys.modules,
+}))
+'''
+
+
+def measure(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    result = {key: float(np.median([s[key] for s in samples])) for key in ('import_ms', 'load_ms', 'first_prediction_ms', 'rss_MB', 'modules')}
+    result['pandas_imported'] = any(s['pandas_imported'] for s in samples)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save', help='write the medians to this JSON file')
+    parser.add_argument('--budget-ms', type=float, help='maximum time-to-first-prediction')
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs)
+    print_table([result], ['import_ms', 'load_ms', 'first_prediction_ms', 'rss_MB', 'modules', 'pandas_imported'])
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.budget_ms is not None and result['first_prediction_ms'] > args.budget_ms:
+        print(f"time-to-first-prediction {result['first_prediction_ms']:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
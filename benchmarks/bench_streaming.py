@@ -0,0 +1,68 @@
+"""Throughput and peak RSS of the streaming NDJSON scorer as the input grows.
+
+Each size is scored by the ``streaming.py`` CLI in a fresh process; flat peak
+RSS across sizes shows memory does not depend on input length.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.common import load_service, print_table, synthetic_rows
+
+PROBE = r'''
+import os, sys
+import streaming
+from benchmarks.common import peak_rss_mb
+streaming.main([sys.argv[1], '-o', os.devnull, '--chunk-size', sys.argv[2]])
+print(peak_rss_mb())
+'''
+
+
+def _write_input(path, engine, n_rows, block=10000):
+    with open(path, 'w') as f:
+        for start in range(0, n_rows, block):
+            rows = synthetic_rows(engine, min(block, n_rows - start), seed=start)
+            for row in rows.tolist():
+                f.write(json.dumps(dict(zip(engine.fields, row))) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--chunk-size', type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            source = os.path.join(tmp, f'input_{size}.jsonl')
+            _write_input(source, model.engine, size)
+            start = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-W', 'ignore', '-c', PROBE, source, str(args.chunk_size)],
+                capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            if completed.returncode:
+                print(f'streaming.py failed for size={size}: {completed.stderr}')
+                return 1
+            results.append({
+                'rows': size,
+                'input_MB': os.path.getsize(source) / 1e6,
+                'rows_s': size / elapsed,
+                'peak_rss_MB': float(completed.stdout.strip().splitlines()[-1]),
+            })
+            os.remove(source)
+    print_table(results, ['rows', 'input_MB', 'rows_s', 'peak_rss_MB'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
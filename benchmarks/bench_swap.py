@@ -0,0 +1,197 @@
+"""Hot model swaps under concurrent /predict load.
+
+Concurrent callers score through the API while a background task keeps
+loading and activating alternating model versions through /admin/models.
+The run fails if any request errors or is answered by an unknown version,
+and it reports p50/p99 latency with and without swaps in progress.
+
+The /admin endpoints must refuse a missing or wrong token, and everything
+is refused while ADMIN_TOKEN is unset.
+
+Then checks that closing a model never strands a request:
+
+- deterministic: rows are queued in a model's micro-batcher behind a slow
+  scoring call while that version is reloaded from an unchanged file or
+  deleted, and every one must be answered;
+- under load: callers keep scoring one version by name while it is
+  reloaded and deleted over and over; every request must finish within the
+  timeout, with 200, or 404 while the version is gone.
+"""
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, synthetic_payloads, synthetic_rows
+
+
+# Sent by the benchmark's clients; main.check_admin reads config.ADMIN_TOKEN per request
+ADMIN_TOKEN = 'bench-admin-token'
+
+
+async def _admin_statuses(app, path):
+    # Status of POST /admin/models without ADMIN_TOKEN, then with a missing and a wrong token
+    import config
+    import httpx
+
+    statuses = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        body = {'path': path, 'version': 'refused'}
+        for configured, headers in ((None, {'X-Admin-Token': ADMIN_TOKEN}), (ADMIN_TOKEN, {}), (ADMIN_TOKEN, {'X-Admin-Token': 'wrong'})):
+            config.ADMIN_TOKEN = configured
+            statuses.append((await client.post('/admin/models', json=body, headers=headers)).status_code)
+    return statuses
+
+
+async def _load(app, payloads, concurrency, duration, swap_paths):
+    import httpx
+
+    latencies, versions, errors = [], set(), []
+    swaps = 0
+    stop = time.perf_counter() + duration
+
+    async def caller(client, index):
+        i = index
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            response = await client.post('/predict', json=payloads[i % len(payloads)])
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+            versions.add(response.headers.get('x-model-version'))
+            i += concurrency
+
+    async def swapper(client):
+        nonlocal swaps
+        while time.perf_counter() < stop:
+            for version, path in swap_paths:
+                response = await client.post('/admin/models', json={'path': path, 'version': version, 'activate': True})
+                response.raise_for_status()
+                swaps += 1
+                await asyncio.sleep(0.05)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60,
+                                 headers={'X-Admin-Token': ADMIN_TOKEN}) as client:
+        tasks = [caller(client, i) for i in range(concurrency)]
+        if swap_paths:
+            tasks.append(swapper(client))
+        await asyncio.gather(*tasks)
+    return np.array(latencies), versions, errors, swaps
+
+
+async def _queued_through_close(service, path, action, n_rows=10):
+    # Rows waiting behind a slow batch when `action` closes the model's batcher
+    model = await asyncio.to_thread(service.registry.load, path, 'closing')
+    score = model.batcher._score
+    model.batcher._score = lambda features: (time.sleep(0.05), score(features))[1]
+    row = synthetic_rows(model.engine, 1)[0]
+    tasks = [asyncio.ensure_future(model.batcher.submit(row)) for _ in range(n_rows)]
+    await asyncio.sleep(0.01)
+    if action == 'reload':
+        await asyncio.to_thread(service.registry.load, path, 'closing')
+        await service.registry.close_retired()
+    else:
+        service.registry.remove('closing')
+        await model.close()
+    done, pending = await asyncio.wait(tasks, timeout=30)
+    for task in pending:
+        task.cancel()
+    if action == 'reload':
+        service.registry.remove('closing')
+    return sum(task.exception() is None for task in done), len(pending)
+
+
+async def _score_while_closing(app, payloads, concurrency, duration, path, timeout=30.0):
+    # Callers pinned to one version while it is reloaded in place and deleted
+    import httpx
+
+    started = finished = 0
+    errors = []
+    stop = time.perf_counter() + duration
+
+    async def caller(client, index):
+        nonlocal started, finished
+        i = index
+        while time.perf_counter() < stop:
+            started += 1
+            response = await client.post('/models/closing/predict', json=payloads[i % len(payloads)])
+            finished += 1
+            if response.status_code not in (200, 404):
+                errors.append(response.status_code)
+            i += concurrency
+
+    async def closer(client):
+        while time.perf_counter() < stop:
+            for body in ({'path': path, 'version': 'closing'}, {'path': path, 'version': 'closing'}):
+                (await client.post('/admin/models', json=body)).raise_for_status()
+                await asyncio.sleep(0.02)
+            (await client.delete('/admin/models/closing')).raise_for_status()
+            await asyncio.sleep(0.02)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=timeout,
+                                 headers={'X-Admin-Token': ADMIN_TOKEN}) as client:
+        tasks = [asyncio.ensure_future(caller(client, i)) for i in range(concurrency)]
+        tasks.append(asyncio.ensure_future(closer(client)))
+        _, pending = await asyncio.wait(tasks, timeout=duration + timeout)
+        for task in pending:
+            task.cancel()
+    return started, finished, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+    payloads = synthetic_payloads(model.engine, 256)
+
+    statuses = asyncio.run(_admin_statuses(service.app, model.path))
+    print(f'admin without ADMIN_TOKEN, without a token, with a wrong token: {statuses}')
+    if statuses != [403, 403, 403] or 'refused' in service.registry.models:
+        return 1
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        swap_paths = []
+        for version in ('swap-a', 'swap-b'):
+            path = f'{tmp}/{version}.joblib'
+            shutil.copy(model.path, path)
+            swap_paths.append((version, path))
+
+        for mode, paths in (('steady', []), ('swapping', swap_paths)):
+            latencies, versions, errors, swaps = asyncio.run(_load(service.app, payloads, args.concurrency, args.duration, paths))
+            expected = {model.version} | {version for version, _ in paths}
+            if errors or not versions <= expected:
+                print(f'{mode}: errors={errors[:10]} unexpected versions={versions - expected}')
+                return 1
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            results.append({'mode': mode, 'requests': latencies.size, 'swaps': swaps, 'errors': len(errors),
+                            'p50_ms': p50, 'p99_ms': p99})
+    print_table(results, ['mode', 'requests', 'swaps', 'errors', 'p50_ms', 'p99_ms'])
+
+    if model.batcher is not None:
+        for action in ('reload', 'delete'):
+            answered, stranded = asyncio.run(_queued_through_close(service, model.path, action))
+            print(f'{action} with 10 queued rows: {answered} answered, {stranded} stranded')
+            if answered != 10:
+                return 1
+    started, finished, errors = asyncio.run(_score_while_closing(service.app, payloads, args.concurrency, args.duration, model.path))
+    print(f'scoring a version while it is reloaded and deleted: {finished}/{started} requests finished, errors={errors[:10]}')
+    if finished != started or errors:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Winsorization cost: the per-column quantile/np.where loop of the training script vs ``preprocessing.Winsorizer``.
+
+Runs on ``--data`` (the training CSV) when it is available, and on synthetic
+heavy-tailed data of the same shape as the full dataset (6,819 x 95) and 10x
+its rows otherwise. Both implementations must produce identical matrices.
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import print_table
+
+FULL_ROWS = 6819
+N_FEATURES = 95
+
+
+def synthetic_frame(n_rows, seed=0):
+    # Ratios around 0-1 plus a few columns with rare values up to ~1e10, like the real data
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    data = rng.lognormal(mean=-1.0, sigma=1.0, size=(n_rows, N_FEATURES))
+    spikes = rng.random((n_rows, N_FEATURES)) < 0.005
+    data[spikes] = rng.uniform(1e6, 1e10, int(spikes.sum()))
+    return pd.DataFrame(data, columns=[f' Feature {i}' for i in range(N_FEATURES)])
+
+
+def loop_winsorize(data, numerical_cols):
+    # Previous implementation in Taller2_MLOps_CRISP-DM.py
+    for col in numerical_cols:
+        lower_percentile = data[col].quantile(0.01)
+        upper_percentile = data[col].quantile(0.99)
+        data[col] = np.where(data[col] < lower_percentile, lower_percentile, data[col])
+        data[col] = np.where(data[col] > upper_percentile, upper_percentile, data[col])
+    return data
+
+
+def best_of(func, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', default='data.csv', help="training CSV with a 'Bankrupt?' column, if available")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    import pandas as pd
+    from preprocessing import Winsorizer
+
+    if os.path.exists(args.data):
+        full = pd.read_csv(args.data).drop(columns='Bankrupt?').astype(np.float64)
+        datasets = [('full dataset', full), ('10x dataset', pd.concat([full] * 10, ignore_index=True))]
+    else:
+        print(f'{args.data} not found; using synthetic data of the same shape')
+        datasets = [('full (synthetic)', synthetic_frame(FULL_ROWS)), ('10x (synthetic)', synthetic_frame(10 * FULL_ROWS))]
+
+    rows = []
+    for name, frame in datasets:
+        columns = frame.columns
+        loop_s, expected = best_of(lambda: loop_winsorize(frame.copy(), columns), args.repeats)
+        fit_s, winsorizer = best_of(lambda: Winsorizer().fit(frame), args.repeats)
+        transform_s, clipped = best_of(lambda: winsorizer.transform(frame), args.repeats)
+        pandas_s, clipped_frame = best_of(lambda: Winsorizer().set_output(transform='pandas').fit_transform(frame), args.repeats)
+
+        if not (np.array_equal(expected.to_numpy(), clipped) and np.array_equal(expected.to_numpy(), clipped_frame.to_numpy())):
+            print(f'Winsorizer output differs from the loop on {name}', file=sys.stderr)
+            return 1
+        for method, seconds in (('loop', loop_s), ('Winsorizer fit', fit_s), ('Winsorizer transform', transform_s),
+                                ('Winsorizer fit_transform (pandas out)', pandas_s)):
+            rows.append({'data': name, 'rows': len(frame), 'method': method, 'ms': seconds * 1000, 'speedup': loop_s / seconds})
+
+    print_table(rows, ['data', 'rows', 'method', 'ms', 'speedup'])
+
+    # Serving cost of the fitted step on one request, as a single np.clip
+    row = datasets[0][1].to_numpy()[:1]
+    lower, upper = winsorizer.lower_, winsorizer.upper_
+    start = time.perf_counter()
+    for _ in range(10000):
+        np.clip(row, lower, upper)
+    print(f'np.clip of one row with fitted bounds: {(time.perf_counter() - start) / 10000 * 1e6:.2f} us')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
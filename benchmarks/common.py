@@ -0,0 +1,84 @@
+"""Shared helpers for the serving benchmarks.
+
+Run the benchmarks from the repository root, e.g. ``python -m benchmarks.bench_predict``,
+so that ``main`` and ``bankruptcy_pipeline.joblib`` resolve.
+"""
+import resource
+import time
+
+import numpy as np
+
+
+def load_service():
+    # Imports the API module and loads the model, as its lifespan hook would;
+    # returns the module and its active ServedModel
+    import main
+    main.load_model()
+    return main, main.registry.active
+
+
+def synthetic_rows(engine, n_rows, seed=42):
+    # Draw rows around the training distribution captured by the fitted scaler
+    rng = np.random.default_rng(seed)
+    mean, scale = engine._scaler if engine._scaler is not None else (np.zeros(engine.n_features), np.ones(engine.n_features))
+    return rng.normal(mean, scale, size=(n_rows, engine.n_features))
+
+
+def synthetic_payloads(engine, n_rows, seed=42):
+    rows = synthetic_rows(engine, n_rows, seed)
+    return [dict(zip(engine.fields, row.tolist())) for row in rows]
+
+
+def legacy_predict(pipeline, feature_name_mapping, records):
+    # Reference DataFrame path as originally implemented in main.py
+    import pandas as pd
+    input_df = pd.DataFrame(records)
+    input_df = input_df.rename(columns=feature_name_mapping)
+    expected_features = pipeline.feature_names_in_
+    input_df = input_df[expected_features]
+    probabilities = pipeline.predict_proba(input_df)[:, 1]
+    predictions = pipeline.predict(input_df)
+    return probabilities, predictions
+
+
+def peak_rss_mb(pid='self'):
+    # VmHWM resets on exec, unlike ru_maxrss which a child inherits from its parent
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid != 'self':
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_calls(func, n_iter, warmup=50):
+    for _ in range(warmup):
+        func()
+    samples = np.empty(n_iter)
+    for i in range(n_iter):
+        start = time.perf_counter()
+        func()
+        samples[i] = time.perf_counter() - start
+    return samples
+
+
+def summarize(samples):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1e6
+    return {'p50_us': p50, 'p95_us': p95, 'p99_us': p99, 'mean_us': samples.mean() * 1e6}
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(c)), *(len(_fmt(r.get(c))) for r in rows)) for c in columns]
+    print('  '.join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print('  '.join(_fmt(r.get(c)).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f'{value:,.1f}'
+    return '' if value is None else str(value)
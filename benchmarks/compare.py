@@ -0,0 +1,97 @@
+"""Compare two ``benchmarks.suite`` reports and fail on regressions.
+
+A scenario regresses when its throughput drops by more than ``--tolerance``,
+its p99 latency grows by more than ``--latency-tolerance`` (tail latency is
+the noisiest figure), or its peak RSS grows by more than ``--rss-tolerance``,
+all relative to the baseline. Scenarios missing from either report are listed
+but do not fail the comparison::
+
+    python -m benchmarks.compare benchmarks/baselines/reference.json current.json
+
+Baselines are per machine: reports recorded on different hardware (CPU
+count, CPU model, architecture) or with a different load (request counts,
+payloads, cache) are not compared, and the exit code is 2, unless
+``--allow-different-environment`` is given.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import print_table
+
+# metric -> +1 when higher is better, -1 when lower is better
+CHECKS = {'req_s': 1, 'p99_ms': -1, 'peak_rss_MB': -1}
+# Environment fields identifying the machine, and suite arguments that change the load measured
+MACHINE_KEYS = ('cpus', 'cpu_model', 'machine')
+LOAD_ARGS = ('requests', 'repeats', 'warmup', 'payloads', 'pool', 'seed', 'with_cache')
+
+
+def environment_mismatches(baseline, current):
+    # {field: (baseline value, current value)} for everything that makes the reports incomparable
+    base, new = baseline['environment'], current['environment']
+    mismatches = {key: (base.get(key), new.get(key)) for key in MACHINE_KEYS if base.get(key) != new.get(key)}
+    base_args, new_args = base.get('args', {}), new.get('args', {})
+    mismatches.update({f'args.{key}': (base_args.get(key), new_args.get(key))
+                       for key in LOAD_ARGS if base_args.get(key) != new_args.get(key)})
+    return mismatches
+
+
+def compare_reports(baseline, current, tolerance=0.25, latency_tolerance=0.5, rss_tolerance=0.10,
+                    allow_different_environment=False):
+    mismatches = environment_mismatches(baseline, current)
+    if mismatches:
+        for key, (before, after) in mismatches.items():
+            print(f'environment differs: {key} {before!r} (baseline) vs {after!r} (current)')
+        if not allow_different_environment:
+            print('not comparable: record a baseline on this machine with the same arguments '
+                  '(or pass --allow-different-environment)')
+            return 2
+    base = {r['scenario']: r for r in baseline['results']}
+    new = {r['scenario']: r for r in current['results']}
+    rows = []
+    regressions = 0
+    for scenario in base.keys() & new.keys():
+        for metric, direction in CHECKS.items():
+            before, after = base[scenario].get(metric), new[scenario].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            limit = {'req_s': tolerance, 'p99_ms': latency_tolerance, 'peak_rss_MB': rss_tolerance}[metric]
+            regressed = -direction * change > limit
+            regressions += regressed
+            rows.append({'scenario': scenario, 'metric': metric, 'baseline': before, 'current': after,
+                         'change_%': change * 100, 'status': 'REGRESSION' if regressed else 'ok'})
+    rows.sort(key=lambda r: (r['scenario'], r['metric']))
+    print_table(rows, ['scenario', 'metric', 'baseline', 'current', 'change_%', 'status'])
+    for scenario in sorted(base.keys() - new.keys()):
+        print(f'only in baseline: {scenario}')
+    for scenario in sorted(new.keys() - base.keys()):
+        print(f'only in current: {scenario}')
+
+    commits = baseline['environment'].get('commit'), current['environment'].get('commit')
+    print(f'{regressions} regressions ({commits[0]} -> {commits[1]}, tolerances: throughput {tolerance:.0%}, '
+          f'p99 {latency_tolerance:.0%}, rss {rss_tolerance:.0%})')
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--latency-tolerance', type=float, default=0.5)
+    parser.add_argument('--rss-tolerance', type=float, default=0.10)
+    parser.add_argument('--allow-different-environment', action='store_true',
+                        help='compare even if the reports come from different machines or loads')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return compare_reports(baseline, current, args.tolerance, args.latency_tolerance, args.rss_tolerance,
+                           args.allow_different_environment)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Throughput and memory of serve.py as the worker count grows.
+
+For each worker count a fresh ``serve.py`` is started, driven by several
+client processes over keep-alive HTTP connections, and measured for
+requests/second plus the summed RSS and PSS of the server process tree. PSS
+splits shared pages between the processes that map them, so it is the figure
+that shows copy-on-write sharing of the model.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import load_service, print_table, synthetic_payloads
+
+
+def _client(port, path, bodies, threads, duration, results):
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    def run(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        i = offset
+        while time.perf_counter() < deadline:
+            body = bodies[i % len(bodies)]
+            start = time.perf_counter()
+            conn.request('POST', path, body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            i += threads
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put(latencies)
+
+
+def _wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _tree_memory(root_pid):
+    # Summed RSS and PSS (MB) of a process and its direct children
+    pids = [root_pid]
+    try:
+        with open(f'/proc/{root_pid}/task/{root_pid}/children') as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    rss = pss = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Rss:'):
+                        rss += int(line.split()[1])
+                    elif line.startswith('Pss:'):
+                        pss += int(line.split()[1])
+        except OSError:
+            pass
+    return rss / 1024, pss / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=None)
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--threads', type=int, default=8, help='connections per client process')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--batch-size', type=int, default=1, help='1 drives /predict, >1 drives /predict_batch')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    service, model = load_service()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({1, 2, max(1, cpus // 2), cpus})
+    payloads = synthetic_payloads(model.engine, 512)
+    if args.batch_size == 1:
+        path, bodies = '/predict', [json.dumps(p) for p in payloads]
+    else:
+        path = '/predict_batch'
+        bodies = [json.dumps(payloads[i:i + args.batch_size]) for i in range(0, len(payloads), args.batch_size)]
+
+    rows = []
+    for workers in worker_counts:
+        server = subprocess.Popen(
+            [sys.executable, '-W', 'ignore', 'serve.py', '--host', '127.0.0.1', '--port', str(args.port),
+             '--workers', str(workers)], stdout=subprocess.DEVNULL)
+        try:
+            if not _wait_ready(args.port):
+                print(f'serve.py did not start with {workers} workers')
+                return 1
+            time.sleep(1.0)
+            results = multiprocessing.Queue()
+            clients = [multiprocessing.Process(target=_client, args=(args.port, path, bodies, args.threads, args.duration, results))
+                       for _ in range(args.clients)]
+            for c in clients:
+                c.start()
+            latencies = np.concatenate([results.get() for _ in clients])
+            for c in clients:
+                c.join()
+            rss, pss = _tree_memory(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        rows.append({'workers': workers, 'req_s': latencies.size / args.duration,
+                     'rows_s': latencies.size * args.batch_size / args.duration,
+                     'p50_ms': p50, 'p99_ms': p99, 'rss_MB': rss, 'pss_MB': pss})
+    print_table(rows, ['workers', 'req_s', 'rows_s', 'p50_ms', 'p99_ms', 'rss_MB', 'pss_MB'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
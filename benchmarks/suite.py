@@ -0,0 +1,292 @@
+"""Reproducible load benchmark of the serving layer, in-process and over a local uvicorn.
+
+Replays synthetic (seeded) or recorded payloads against ``/predict``,
+``/predict_batch`` and ``/`` at each requested concurrency and batch size,
+and reports the median throughput and p50/p95/p99 latency over several runs
+plus the server's peak RSS::
+
+    python -m benchmarks.suite --save benchmarks/baselines/current.json
+    python -m benchmarks.suite --compare benchmarks/baselines/reference.json
+
+Recorded payloads are an NDJSON file with one company per line (the
+``/predict_stream`` input format). ``--save`` writes the results and the
+environment they were measured in as JSON; ``--compare`` checks them against
+a saved baseline with ``benchmarks.compare`` and fails on regressions. The
+prediction cache is off unless ``--with-cache`` is given, since replayed
+payloads would otherwise measure cache lookups instead of the model.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import peak_rss_mb, print_table, synthetic_payloads
+
+ENDPOINTS = ('/predict', '/predict_batch', '/')
+
+
+def load_payloads(path):
+    with open(path, 'rb') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_bodies(payloads, endpoint, batch_size, n_requests):
+    # Pre-encoded request bodies, so the client does no JSON work while timing
+    if endpoint == '/':
+        return [None]
+    if endpoint == '/predict':
+        return [json.dumps(p).encode() for p in payloads[:n_requests]]
+    if batch_size > len(payloads):
+        raise ValueError(f'Batch size {batch_size} exceeds the {len(payloads)} available payloads')
+    batches = (payloads[i:i + batch_size] for i in range(0, len(payloads) - batch_size + 1, batch_size))
+    return [json.dumps(batch).encode() for batch in itertools.islice(batches, n_requests)]
+
+
+class ASGIClient:
+    # Calls the ASGI app directly, so no socket or HTTP client cost is measured
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, body):
+        body = body or b''
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                # No disconnect while the response is being produced
+                await asyncio.Event().wait()
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        status = None
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+            'client': ('127.0.0.1', 0), 'server': ('bench', 80),
+        }
+        await self.app(scope, receive, send)
+        return status
+
+    async def close(self):
+        pass
+
+
+class HTTPConnection:
+    # Minimal keep-alive HTTP/1.1 client; the API always answers with a Content-Length
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = body or b''
+        head = (f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n').encode()
+        self.writer.write(head + body)
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                length = int(value)
+        await self.reader.readexactly(length)
+        return status
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+async def drive(connect, endpoint, bodies, concurrency, n_requests):
+    # `connect()` returns the client each concurrent caller sends through
+    latencies = np.empty(n_requests)
+    errors = 0
+    counter = itertools.count()
+    method = 'GET' if endpoint == '/' else 'POST'
+
+    async def caller():
+        nonlocal errors
+        client = connect()
+        try:
+            while (i := next(counter)) < n_requests:
+                start = time.perf_counter()
+                status = await client.request(method, endpoint, bodies[i % len(bodies)])
+                latencies[i] = time.perf_counter() - start
+                errors += status != 200
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def scenarios(args):
+    for endpoint in args.endpoints:
+        for concurrency in args.concurrency:
+            for batch_size in (args.batch_sizes if endpoint == '/predict_batch' else [1]):
+                yield endpoint, concurrency, batch_size
+
+
+async def run_scenarios(mode, connect, server_pid, payloads, args):
+    results = []
+    for endpoint, concurrency, batch_size in scenarios(args):
+        bodies = build_bodies(payloads, endpoint, batch_size, args.requests)
+        await drive(connect, endpoint, bodies, concurrency, min(args.warmup, args.requests))
+        # Median over repeats, which is far steadier than a single run under concurrency
+        runs = []
+        for _ in range(args.repeats):
+            elapsed, latencies, errors = await drive(connect, endpoint, bodies, concurrency, args.requests)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            runs.append({'req_s': args.requests / elapsed, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'errors': errors})
+        median = {key: float(np.median([run[key] for run in runs])) for key in ('req_s', 'p50_ms', 'p95_ms', 'p99_ms')}
+        results.append({
+            'scenario': f'{mode} {endpoint} c={concurrency} b={batch_size}',
+            'mode': mode, 'endpoint': endpoint, 'concurrency': concurrency, 'batch_size': batch_size,
+            'requests': args.requests, 'repeats': args.repeats, 'errors': sum(run['errors'] for run in runs),
+            **median, 'rows_s': median['req_s'] * batch_size,
+            'peak_rss_MB': peak_rss_mb(server_pid),
+        })
+    return results
+
+
+async def run_inprocess(payloads, args):
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        client = ASGIClient(main.app)
+        # Client and server share this process, so the RSS includes both
+        return await run_scenarios('inprocess', lambda: client, 'self', payloads, args)
+
+
+async def run_uvicorn(payloads, args):
+    server = subprocess.Popen(
+        [sys.executable, '-W', 'ignore', '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+         '--port', str(args.port), '--log-level', 'warning', '--no-access-log'], env=os.environ.copy())
+    try:
+        deadline = time.time() + 60
+        while True:
+            probe = HTTPConnection('127.0.0.1', args.port)
+            try:
+                if await probe.request('GET', '/', None) == 200:
+                    break
+            except OSError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError('uvicorn did not start')
+                await asyncio.sleep(0.2)
+            finally:
+                await probe.close()
+        return await run_scenarios('uvicorn', lambda: HTTPConnection('127.0.0.1', args.port), server.pid, payloads, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def cpu_model():
+    # Model name of the first CPU (Linux), so baselines from different hardware are never compared
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'cpu_model': cpu_model(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'args': {key: value for key, value in vars(args).items() if key not in ('save', 'compare', 'allow_different_environment')},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=['inprocess', 'uvicorn'], default=['inprocess', 'uvicorn'])
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per scenario')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per scenario; the median is reported')
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--payloads', help='NDJSON file of recorded companies (default: synthetic)')
+    parser.add_argument('--pool', type=int, default=4096, help='synthetic companies to generate and cycle through')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--with-cache', action='store_true', help='keep the prediction cache enabled')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--save', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON to compare against; exits 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative throughput drop')
+    parser.add_argument('--latency-tolerance', type=float, default=0.5, help='allowed relative p99 growth')
+    parser.add_argument('--rss-tolerance', type=float, default=0.10, help='allowed relative peak RSS growth')
+    parser.add_argument('--allow-different-environment', action='store_true',
+                        help='compare against a baseline from another machine or load anyway')
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    if not args.with_cache:
+        # Read by config at import, by this process and by the uvicorn child
+        os.environ['CACHE_MAX_ENTRIES'] = '0'
+
+    if args.payloads:
+        payloads = load_payloads(args.payloads)
+    else:
+        from benchmarks.common import load_service
+        service, model = load_service()
+        payloads = synthetic_payloads(model.engine, args.pool, args.seed)
+
+    results = []
+    for mode in args.modes:
+        runner = run_inprocess if mode == 'inprocess' else run_uvicorn
+        results += asyncio.run(runner(payloads, args))
+    print_table(results, ['scenario', 'req_s', 'rows_s', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_MB', 'errors'])
+
+    report = {'environment': environment(args), 'results': results}
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if any(r['errors'] for r in results):
+        print('some requests failed')
+        return 1
+    if args.compare:
+        from benchmarks.compare import compare_reports
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return compare_reports(baseline, report, args.tolerance, args.latency_tolerance, args.rss_tolerance,
+                               args.allow_different_environment)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
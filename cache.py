@@ -0,0 +1,101 @@
+"""In-process LRU/TTL cache of prediction results.
+
+Entries are keyed by the canonical little-endian float64 bytes of the feature
+vector in pipeline column order; the dict hashes them and compares them
+exactly, so distinct vectors can never share a result. The cache belongs to
+one model version at a time and empties itself when a different version is
+looked up. Batches are looked up row by row and only the rows that miss need
+to be scored. Each entry costs roughly 0.9 KB.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    def __init__(self, max_entries=20000, ttl_seconds=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def keys(self, features):
+        # -0.0 and 0.0 are equal features but differ bitwise; adding 0.0 canonicalises them
+        canonical = np.ascontiguousarray(features, dtype='<f8') + 0.0
+        return [row.tobytes() for row in canonical]
+
+    def get_many(self, keys, model_version, prediction_dtype):
+        # Returns probabilities, predictions and a boolean mask of the rows that missed
+        n = len(keys)
+        probabilities = np.empty(n, dtype=np.float64)
+        predictions = np.empty(n, dtype=prediction_dtype)
+        missing = np.ones(n, dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            if model_version != self.model_version:
+                self._reset(model_version)
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, probability, prediction = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(key)
+                probabilities[i] = probability
+                predictions[i] = prediction
+                missing[i] = False
+            hits = n - int(missing.sum())
+            self.hits += hits
+            self.misses += n - hits
+        return probabilities, predictions, missing
+
+    def put_many(self, keys, model_version, probabilities, predictions):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if model_version != self.model_version:
+                # The model changed while these rows were being scored
+                return
+            for key, probability, prediction in zip(keys, probabilities.tolist(), predictions.tolist()):
+                self._entries[key] = (expires_at, probability, prediction)
+                self._entries.move_to_end(key)
+            overflow = len(self._entries) - self.max_entries
+            for _ in range(max(overflow, 0)):
+                self._entries.popitem(last=False)
+            self.evictions += max(overflow, 0)
+
+    def _reset(self, model_version):
+        if self.model_version is not None:
+            self.invalidations += 1
+        self._entries.clear()
+        self.model_version = model_version
+
+    def clear(self):
+        with self._lock:
+            self._reset(self.model_version)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'model_version': self.model_version,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
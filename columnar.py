@@ -0,0 +1,126 @@
+"""Bulk decoding of columnar and binary scoring payloads.
+
+Payloads are validated as whole arrays (shape, dtype, finiteness) instead of
+row by row, and decoded straight into the feature matrix expected by the
+inference engine.
+"""
+import io
+import json
+
+import numpy as np
+
+JSON_TYPES = ('application/json',)
+RAW_TYPES = ('application/octet-stream',)
+NPY_TYPES = ('application/x-npy', 'application/npy')
+ARROW_TYPES = ('application/vnd.apache.arrow.stream', 'application/vnd.apache.arrow.file')
+
+
+class PayloadError(ValueError):
+    status_code = 400
+
+
+class UnsupportedPayloadError(PayloadError):
+    status_code = 415
+
+
+class ColumnarDecoder:
+    def __init__(self, fields, engine_fields):
+        # `fields` is the public (feature_name_mapping) order used by binary
+        # payloads, `engine_fields` the column order the pipeline expects
+        self.fields = list(fields)
+        self.n_features = len(self.fields)
+        order = [self.fields.index(field) for field in engine_fields]
+        self._order = None if order == list(range(self.n_features)) else np.array(order)
+
+    def decode(self, body, content_type):
+        media_type = (content_type or 'application/json').split(';')[0].strip().lower()
+        if media_type in JSON_TYPES:
+            features = self._from_columns(_load_json(body))
+        elif media_type in RAW_TYPES:
+            features = self._from_raw(body)
+        elif media_type in NPY_TYPES:
+            features = self._from_npy(body)
+        elif media_type in ARROW_TYPES:
+            features = self._from_arrow(body, media_type)
+        else:
+            raise UnsupportedPayloadError(f"Unsupported content type: {media_type}")
+        return self._finish(features)
+
+    def _from_columns(self, columns):
+        if not isinstance(columns, dict):
+            raise PayloadError("Expected a JSON object mapping each feature to an array of values")
+        missing_cols = set(self.fields) - set(columns)
+        if missing_cols:
+            raise PayloadError(f"Missing columns: {missing_cols}")
+        lengths = {len(columns[field]) if isinstance(columns[field], list) else -1 for field in self.fields}
+        if -1 in lengths:
+            raise PayloadError("Every feature must be an array of numbers")
+        if len(lengths) != 1:
+            raise PayloadError(f"Feature arrays have different lengths: {sorted(lengths)}")
+        features = np.empty((lengths.pop(), self.n_features), dtype=np.float64)
+        for i, field in enumerate(self.fields):
+            try:
+                features[:, i] = columns[field]
+            except (TypeError, ValueError):
+                raise PayloadError(f"Non-numeric values in column: {field}")
+        return features
+
+    def _from_raw(self, body):
+        row_bytes = 8 * self.n_features
+        if len(body) % row_bytes:
+            raise PayloadError(
+                f"Body length {len(body)} is not a multiple of {row_bytes} bytes "
+                f"({self.n_features} little-endian float64 values per row)")
+        return np.frombuffer(body, dtype='<f8').reshape(-1, self.n_features)
+
+    def _from_npy(self, body):
+        try:
+            array = np.load(io.BytesIO(body), allow_pickle=False)
+        except (ValueError, OSError) as e:
+            raise PayloadError(f"Invalid .npy payload: {e}")
+        if array.ndim != 2 or array.shape[1] != self.n_features:
+            raise PayloadError(f"Expected an array of shape (n, {self.n_features}), got {array.shape}")
+        if array.dtype.kind not in 'fiu':
+            raise PayloadError(f"Expected a numeric array, got dtype {array.dtype}")
+        return array.astype(np.float64, copy=False)
+
+    def _from_arrow(self, body, media_type):
+        try:
+            import pyarrow.ipc as ipc
+            import pyarrow.types as pa_types
+        except ImportError:
+            raise UnsupportedPayloadError("Arrow payloads require the optional pyarrow package")
+        try:
+            reader = ipc.open_stream(body) if media_type.endswith('stream') else ipc.open_file(body)
+            table = reader.read_all()
+        except Exception as e:
+            raise PayloadError(f"Invalid Arrow payload: {e}")
+        missing_cols = set(self.fields) - set(table.column_names)
+        if missing_cols:
+            raise PayloadError(f"Missing columns: {missing_cols}")
+        features = np.empty((table.num_rows, self.n_features), dtype=np.float64)
+        for i, field in enumerate(self.fields):
+            column = table.column(field)
+            if not (pa_types.is_floating(column.type) or pa_types.is_integer(column.type)):
+                raise PayloadError(f"Non-numeric values in column: {field}")
+            features[:, i] = column.to_numpy()
+        return features
+
+    def _finish(self, features):
+        if features.shape[0] == 0:
+            raise PayloadError("Payload contains no rows")
+        finite = np.isfinite(features)
+        if not finite.all():
+            bad_rows = np.flatnonzero(~finite.all(axis=1))
+            raise PayloadError(f"Non-finite values in {bad_rows.size} rows, first at row {int(bad_rows[0])}")
+        if self._order is not None:
+            features = features[:, self._order]
+        return np.ascontiguousarray(features, dtype=np.float64)
+
+
+def _load_json(body):
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise PayloadError(f"Invalid JSON body: {e}")
+
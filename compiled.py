@@ -0,0 +1,270 @@
+"""Standalone NumPy scoring artifact compiled from the fitted pipeline.
+
+``export_pipeline`` flattens the StandardScaler + MLPClassifier pipeline into
+a single ``.npz``: the scaler's means and scales are folded into the first
+layer's weights and biases, and every layer is stored as a contiguous array.
+A leading ``Winsorizer`` is kept as float64 clip bounds applied to the input,
+and the scaler's mean as the ``baseline`` that ``explain.py`` attributes to.
+Reduced-precision exports keep the mean as a float64 input offset instead of
+folding it into the bias, since several features reach magnitudes around 1e9
+and the folded bias would cancel catastrophically in float32. ``int8``
+exports store each weight matrix as int8 with a float32 scale per output
+column and accumulate in float32; the first layer's per-feature magnitudes
+are moved into a float64 input scale before quantizing. Exports also carry
+the check batch (``reference_features``) the server re-scores at load time
+before serving a reduced precision (see ``registry.py``).
+``CompiledModel`` scores that file with plain NumPy, so serving needs neither
+the sklearn runtime nor its per-call input validation::
+
+    python compiled.py bankruptcy_pipeline.joblib bankruptcy_model.npz
+
+Probabilities match the sklearn pipeline to within 1e-9 for float64 exports,
+1e-4 for float32 exports and 5e-2 for int8 exports.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+TOLERANCE = {'float64': 1e-9, 'float32': 1e-4, 'int8': 5e-2}
+# Rows of the check batch stored in the artifact, for the server's load-time precision check
+REFERENCE_ROWS = 1024
+
+
+def _identity(x):
+    return x
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _logistic(x):
+    # 1 / (1 + exp(-x)) in place. Not the split stable form: for very negative x
+    # exp overflows to inf and the result is 0, its limit (forward() ignores the
+    # overflow warning), which matches sklearn's expit to rounding
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    return np.reciprocal(x, out=x)
+
+
+def _softmax(x):
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+ACTIVATIONS = {'identity': _identity, 'relu': _relu, 'logistic': _logistic, 'tanh': np.tanh, 'softmax': _softmax}
+
+
+def compile_arrays(pipeline, dtype='float64', reference=None):
+    # Arrays of the .npz artifact for the fitted pipeline, in memory
+    from inference import _scaler_params, _split_steps, _winsorizer_bounds
+
+    leading, preprocessor, intermediate = _split_steps(pipeline)
+    feature_names = list(pipeline.feature_names_in_)
+    clip = _winsorizer_bounds(leading, feature_names)
+    if leading and clip is None:
+        raise ValueError(f"Cannot compile steps before the preprocessor: {leading}")
+    scaler = _scaler_params(preprocessor, feature_names)
+    if scaler is None:
+        raise ValueError("Only a single StandardScaler preprocessor can be folded into the network")
+    steps = [step for step in intermediate if not hasattr(step, 'fit_resample')]
+    if steps:
+        raise ValueError(f"Cannot compile intermediate steps: {steps}")
+    classifier = pipeline.steps[-1][1]
+    if type(classifier).__name__ != 'MLPClassifier':
+        raise ValueError(f"Cannot compile classifier {type(classifier).__name__}")
+
+    # (x - mean) / scale @ W  ==  (x - mean) @ (W / scale[:, None])
+    mean, scale = scaler
+    coefs = [np.asarray(c, dtype=np.float64) for c in classifier.coefs_]
+    intercepts = [np.asarray(b, dtype=np.float64) for b in classifier.intercepts_]
+    coefs[0] = coefs[0] / scale[:, None]
+    arrays = {
+        'baseline': mean,
+        'feature_names': np.array(feature_names),
+        'classes': np.asarray(classifier.classes_),
+        'activation': np.array(classifier.activation),
+        'out_activation': np.array(classifier.out_activation_),
+    }
+    if clip is not None:
+        # Winsorizer bounds stay in float64 and are applied to the raw input
+        arrays['clip_lower'], arrays['clip_upper'] = clip
+    if reference is not None:
+        arrays['reference_features'] = np.asarray(reference, dtype=np.float64)
+    return _layer_arrays(arrays, coefs, intercepts, mean, dtype)
+
+
+def _layer_arrays(arrays, coefs, intercepts, offset, dtype):
+    # Adds the layers to `arrays` in the requested precision; coefs[0] applies to (x - offset)
+    if dtype not in TOLERANCE:
+        raise ValueError(f"Unknown precision {dtype!r}; expected one of {sorted(TOLERANCE)}")
+    if dtype == 'float64':
+        # x @ W + (b - offset @ W): the offset is folded into the first bias
+        intercepts = [intercepts[0] - offset @ coefs[0]] + intercepts[1:]
+    else:
+        arrays['offset'] = np.asarray(offset, dtype=np.float64)
+    if dtype == 'int8':
+        # The rows of the first layer span the features' magnitudes (1/scale ranges over
+        # ~12 orders); each row's range moves into a float64 input scale, so that the
+        # per-column quantization below does not round the small rows to zero
+        row_scale = np.abs(coefs[0]).max(axis=1)
+        row_scale[row_scale == 0] = 1
+        arrays['input_scale'] = row_scale
+        coefs = [coefs[0] / row_scale[:, None]] + coefs[1:]
+    for i, (coef, intercept) in enumerate(zip(coefs, intercepts)):
+        if dtype == 'int8':
+            # Symmetric per-output-column scales: x @ W ~= (x @ q) * scale
+            scale = np.abs(coef).max(axis=0) / 127
+            scale[scale == 0] = 1
+            arrays[f'coef_{i}'] = np.ascontiguousarray(np.round(coef / scale), dtype=np.int8)
+            arrays[f'coef_scale_{i}'] = scale.astype(np.float32)
+            arrays[f'intercept_{i}'] = np.ascontiguousarray(intercept, dtype=np.float32)
+        else:
+            arrays[f'coef_{i}'] = np.ascontiguousarray(coef, dtype=dtype)
+            arrays[f'intercept_{i}'] = np.ascontiguousarray(intercept, dtype=dtype)
+    return arrays
+
+
+def export_pipeline(pipeline, path, dtype='float64', reference=None):
+    np.savez(path, **compile_arrays(pipeline, dtype, reference))
+
+
+def reduce_precision(artifact, dtype):
+    # CompiledModel of a fitted pipeline or of another CompiledModel, in `dtype`
+    if isinstance(artifact, CompiledModel):
+        return artifact.with_precision(dtype)
+    return CompiledModel(compile_arrays(artifact, dtype))
+
+
+def agreement(reference, candidate, features, threshold=0.5):
+    # How far `candidate` strays from `reference` (anything with predict_proba) on `features`
+    expected = reference.predict_proba(features)[:, 1]
+    probabilities = candidate.predict_proba(features)[:, 1]
+    return {
+        'rows': len(features),
+        'max_delta': float(np.max(np.abs(probabilities - expected))),
+        'flip_rate': float(np.mean((probabilities > threshold) != (expected > threshold))),
+    }
+
+
+class CompiledModel:
+    def __init__(self, arrays):
+        self.feature_names = [str(name) for name in arrays['feature_names']]
+        self.classes_ = arrays['classes']
+        self.activation = str(arrays['activation'])
+        self.out_activation = str(arrays['out_activation'])
+        n_layers = sum(1 for key in arrays if key.startswith('intercept_'))
+        self.coefs = [np.ascontiguousarray(arrays[f'coef_{i}']) for i in range(n_layers)]
+        self.intercepts = [np.ascontiguousarray(arrays[f'intercept_{i}']) for i in range(n_layers)]
+        # Per-column dequantization scales of int8 weights
+        self.coef_scales = [arrays.get(f'coef_scale_{i}') for i in range(n_layers)]
+        self.offset = arrays.get('offset')
+        self.input_scale = arrays.get('input_scale')
+        self.clip = (arrays['clip_lower'], arrays['clip_upper']) if 'clip_lower' in arrays else None
+        # Exports predating explain.py have no baseline
+        self.baseline = arrays.get('baseline')
+        self.reference = arrays.get('reference_features')
+        # Computation dtype; int8 weights accumulate in float32
+        self.dtype = self.intercepts[0].dtype
+        self.precision = 'int8' if self.coefs[0].dtype == np.int8 else str(self.dtype)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.coefs + self.intercepts + self.coef_scales + [self.input_scale] if a is not None)
+
+    def weights(self):
+        # float64 layers, dequantized
+        coefs = [c.astype(np.float64) * (1 if s is None else s) for c, s in zip(self.coefs, self.coef_scales)]
+        if self.input_scale is not None:
+            coefs[0] = coefs[0] * self.input_scale[:, None]
+        return coefs, [b.astype(np.float64) for b in self.intercepts]
+
+    def with_precision(self, dtype):
+        # The same network in another precision, e.g. a float64 export served in float32
+        coefs, intercepts = self.weights()
+        offset = self.offset
+        if offset is None:
+            if self.baseline is None:
+                raise ValueError("Compiled artifact has no baseline; re-export it with compiled.py to change its precision")
+            # Unfold the offset from the first bias, so reduced precisions keep it in float64
+            offset = self.baseline
+            intercepts[0] = intercepts[0] + offset @ coefs[0]
+        arrays = {'feature_names': np.array(self.feature_names), 'classes': self.classes_,
+                  'activation': np.array(self.activation), 'out_activation': np.array(self.out_activation)}
+        for key, value in (('baseline', self.baseline), ('reference_features', self.reference)):
+            if value is not None:
+                arrays[key] = value
+        if self.clip is not None:
+            arrays['clip_lower'], arrays['clip_upper'] = self.clip
+        return CompiledModel(_layer_arrays(arrays, coefs, intercepts, offset, dtype))
+
+    def forward(self, features):
+        hidden = ACTIVATIONS[self.activation]
+        if self.clip is not None:
+            features = np.clip(features, *self.clip)
+        if self.offset is None:
+            activation = features.astype(self.dtype, copy=False)
+        else:
+            # Centred in float64 and written straight into the computation dtype, without a float64 copy
+            activation = np.subtract(features, self.offset, out=np.empty(features.shape, dtype=self.dtype))
+            if self.input_scale is not None:
+                activation *= self.input_scale
+        last = len(self.coefs) - 1
+        with np.errstate(over='ignore'):
+            for i, (coef, intercept, scale) in enumerate(zip(self.coefs, self.intercepts, self.coef_scales)):
+                activation = activation @ coef
+                if scale is not None:
+                    activation *= scale
+                activation += intercept
+                if i != last:
+                    hidden(activation)
+            return ACTIVATIONS[self.out_activation](activation)
+
+    def predict_proba(self, features):
+        output = self.forward(features).astype(np.float64, copy=False)
+        if output.shape[1] == 1:
+            positive = output[:, 0]
+            return np.column_stack([1 - positive, positive])
+        return output
+
+    def predict(self, features):
+        return self.classes_[np.argmax(self.predict_proba(features), axis=1)]
+
+
+def load_compiled(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        return CompiledModel({key: arrays[key] for key in arrays.files})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the fitted pipeline into a NumPy .npz scoring artifact.")
+    parser.add_argument('pipeline', nargs='?', default='bankruptcy_pipeline.joblib')
+    parser.add_argument('output', nargs='?', default='bankruptcy_model.npz')
+    parser.add_argument('--dtype', choices=sorted(TOLERANCE), default='float64')
+    parser.add_argument('--check-rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    from joblib import load
+    from inference import InferenceEngine
+
+    pipeline = load(args.pipeline)
+    # Check agreement with the sklearn pipeline around the training distribution
+    engine = InferenceEngine(pipeline, {name: name for name in pipeline.feature_names_in_})
+    mean, scale = engine._scaler
+    features = np.random.default_rng(0).normal(mean, scale, size=(args.check_rows, engine.n_features))
+    export_pipeline(pipeline, args.output, args.dtype, reference=features[:REFERENCE_ROWS])
+    model = load_compiled(args.output)
+
+    check = agreement(engine, model, features)
+    print(f"Wrote {args.output} ({model.nbytes / 1024:.0f} KiB of weights, {args.dtype}); "
+          f"max |dp| vs pipeline over {args.check_rows} rows = {check['max_delta']:.2e} "
+          f"(tolerance {TOLERANCE[args.dtype]:.0e}), labels changed {check['flip_rate']:.2%}")
+    return 0 if check['max_delta'] <= TOLERANCE[args.dtype] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
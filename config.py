@@ -0,0 +1,81 @@
+"""Service settings, read once from environment variables at import."""
+import os
+
+# Probability of bankruptcy above which a company is labelled as Bankrupt.
+# 0.5 reproduces the classifier's own predict() decision rule.
+DECISION_THRESHOLD = float(os.environ.get('DECISION_THRESHOLD', '0.5'))
+
+# Micro-batching of concurrent /predict calls: wait up to BATCH_MAX_WAIT_MS or
+# BATCH_MAX_SIZE rows before scoring, reject with 503 beyond BATCH_MAX_QUEUE
+# waiting requests. BATCHING_ENABLED=0 scores every request on its own.
+BATCHING_ENABLED = os.environ.get('BATCHING_ENABLED', '1') == '1'
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', '2'))
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '64'))
+BATCH_MAX_QUEUE = int(os.environ.get('BATCH_MAX_QUEUE', '1024'))
+
+# Rows scored per chunk by /predict_stream and the streaming.py CLI
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', '1024'))
+
+# Fitted pipeline served by the API. MODEL_MMAP=1 memory-maps its arrays
+# read-only so that every worker process shares the same physical pages.
+MODEL_PATH = os.environ.get('MODEL_PATH', 'bankruptcy_pipeline.joblib')
+MODEL_MMAP = os.environ.get('MODEL_MMAP', '0') == '1'
+
+# LRU/TTL cache of prediction results keyed by feature vector and model
+# version, about 0.9 KB per entry. CACHE_MAX_ENTRIES=0 disables it.
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '20000'))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '3600'))
+
+# Version name of the model loaded at startup (defaults to a content hash of
+# MODEL_PATH). The /admin endpoints require ADMIN_TOKEN in the X-Admin-Token
+# header, and answer 403 to everything while it is unset.
+MODEL_VERSION = os.environ.get('MODEL_VERSION') or None
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+
+# Opt-in sampling profiler: when PROFILE_SLOW_MS > 0, requests slower than that
+# get the stacks sampled every PROFILE_INTERVAL_MS while they ran written to
+# PROFILE_DIR as collapsed stacks for flame graphs.
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# Feature-drift monitoring of /predict and /predict_batch traffic. Scored rows
+# are buffered (at most DRIFT_MAX_PENDING batches; older ones are dropped) and
+# folded into the statistics every DRIFT_INTERVAL_SECONDS. DRIFT_ENABLED=0 turns it off.
+DRIFT_ENABLED = os.environ.get('DRIFT_ENABLED', '1') == '1'
+DRIFT_MAX_PENDING = int(os.environ.get('DRIFT_MAX_PENDING', '1024'))
+DRIFT_INTERVAL_SECONDS = float(os.environ.get('DRIFT_INTERVAL_SECONDS', '1'))
+
+# Numeric precision the MLP is served in: float64, float32, or int8 (int8 weights
+# with float32 accumulation); unset serves the artifact as is. At load time the
+# converted model re-scores a reference batch and is only kept if no
+# probability moves by more than PRECISION_MAX_DELTA and at most
+# PRECISION_MAX_FLIP_RATE of the labels change; otherwise the model is served
+# at the artifact's own precision.
+INFERENCE_PRECISION = os.environ.get('INFERENCE_PRECISION') or None
+PRECISION_MAX_DELTA = float(os.environ.get('PRECISION_MAX_DELTA', '1e-3'))
+PRECISION_MAX_FLIP_RATE = float(os.environ.get('PRECISION_MAX_FLIP_RATE', '0'))
+
+# Audit log of every score the API returns (see audit.py), off by
+# default. Records are queued in memory and written to SQLite files in
+# AUDIT_DIR by a background thread, in transactions of AUDIT_FLUSH_ROWS rows or
+# every AUDIT_FLUSH_INTERVAL_SECONDS. While AUDIT_MAX_PENDING_ROWS rows await
+# writing, requests get a 503 instead of an unlogged score. A new file is
+# started every AUDIT_ROTATE_ROWS rows.
+AUDIT_ENABLED = os.environ.get('AUDIT_ENABLED', '0') == '1'
+AUDIT_DIR = os.environ.get('AUDIT_DIR', 'audit')
+AUDIT_FLUSH_ROWS = int(os.environ.get('AUDIT_FLUSH_ROWS', '1024'))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.environ.get('AUDIT_FLUSH_INTERVAL_SECONDS', '1'))
+AUDIT_MAX_PENDING_ROWS = int(os.environ.get('AUDIT_MAX_PENDING_ROWS', '100000'))
+AUDIT_ROTATE_ROWS = int(os.environ.get('AUDIT_ROTATE_ROWS', '1000000'))
+
+# Shadow scoring: a candidate model (SHADOW_MODEL_PATH, loaded next to the
+# production model but not activated; version name SHADOW_MODEL_VERSION or its
+# content hash) re-scores /predict and /predict_batch traffic in
+# SHADOW_WORKERS background threads, and /stats/shadow compares its outputs
+# with production. At most SHADOW_MAX_PENDING requests wait for a worker;
+# beyond that they are not shadowed. /admin/shadow switches the candidate at runtime.
+SHADOW_MODEL_PATH = os.environ.get('SHADOW_MODEL_PATH') or None
+SHADOW_MODEL_VERSION = os.environ.get('SHADOW_MODEL_VERSION') or None
+SHADOW_WORKERS = int(os.environ.get('SHADOW_WORKERS', '1'))
+SHADOW_MAX_PENDING = int(os.environ.get('SHADOW_MAX_PENDING', '64'))
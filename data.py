@@ -0,0 +1,200 @@
+"""Columnar on-disk cache of the training CSV.
+
+The first load parses the CSV in chunks and writes every column to its own
+memory-mapped ``.npy`` file: floats downcast to ``float32`` (configurable)
+and integral columns such as the target to the narrowest integer type that
+holds them. Later loads open only the requested columns, without parsing,
+and ``iter_chunks`` / ``matrix(rows=...)`` read row ranges from the memory
+maps, so datasets larger than RAM can be processed chunk by chunk.
+
+The cache lives next to the source (``.data_cache/<name>.<float dtype>/``,
+so float32 and float64 caches of one file coexist) with a
+manifest recording the source's size, modification time and SHA-256. A
+changed size or time triggers a re-hash, and a changed hash a rebuild.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+FORMAT_VERSION = 1
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _ColumnWriter:
+    # Appends a column's chunks as float64 to a temporary file, tracking what
+    # the final dtype can be
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.integral = True
+        self.low, self.high = np.inf, -np.inf
+
+    def write(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            if self.integral:
+                self.integral = bool(np.isfinite(values).all() and (values == np.round(values)).all())
+            self.low, self.high = min(self.low, values.min()), max(self.high, values.max())
+        self.file.write(values.tobytes())
+
+    def finish(self, out_path, n_rows, float_dtype, chunk_rows):
+        self.file.close()
+        dtype = np.dtype(float_dtype)
+        if self.integral:
+            dtype = next((np.dtype(t) for t in INT_TYPES
+                          if n_rows == 0 or np.iinfo(t).min <= self.low and self.high <= np.iinfo(t).max), np.dtype(np.float64))
+        raw = np.memmap(self.path, dtype=np.float64, mode='r', shape=(n_rows,)) if n_rows else np.empty(0)
+        out = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=(n_rows,))
+        for start in range(0, n_rows, chunk_rows):
+            out[start:start + chunk_rows] = raw[start:start + chunk_rows]
+        out.flush()
+        del out, raw
+        os.remove(self.path)
+        return dtype.str
+
+
+class DataCache:
+    # Memory-mapped column store built from `source` (a CSV), rebuilt when the
+    # source changes. float_dtype applies to non-integral columns.
+    def __init__(self, source, cache_dir=None, float_dtype=np.float32, chunk_rows=100_000):
+        self.source = os.path.abspath(source)
+        self.float_dtype = np.dtype(float_dtype)
+        name = f'{os.path.splitext(os.path.basename(self.source))[0]}.{self.float_dtype.name}'
+        self.path = os.path.join(cache_dir or os.path.join(os.path.dirname(self.source), '.data_cache'), name)
+        self.chunk_rows = chunk_rows
+        self._manifest = None
+        self._arrays = {}
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self.refresh()
+        return self._manifest
+
+    @property
+    def columns(self):
+        return [c['name'] for c in self.manifest['columns']]
+
+    def __len__(self):
+        return self.manifest['n_rows']
+
+    def refresh(self):
+        # Validates the cache against the source, rebuilding it if stale; returns True on a rebuild
+        stat = os.stat(self.source)
+        manifest = self._read_manifest()
+        if manifest is not None:
+            if (manifest['size'], manifest['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                self._manifest = manifest
+                return False
+            if manifest['sha256'] == file_sha256(self.source):
+                # Touched but unchanged: keep the columns and remember the new stat
+                manifest.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                self._write_manifest(self.path, manifest)
+                self._manifest = manifest
+                return False
+        self._build(stat)
+        return True
+
+    def array(self, column):
+        # Read-only memory map of one column
+        if column not in self._arrays:
+            index = self.columns.index(column)
+            self._arrays[column] = np.load(os.path.join(self.path, self.manifest['columns'][index]['file']), mmap_mode='r')
+        return self._arrays[column]
+
+    def matrix(self, columns=None, rows=slice(None), dtype=None):
+        # Columns stacked into one C-ordered 2-D array, for a row range (or index array)
+        columns = self.columns if columns is None else list(columns)
+        dtype = np.dtype(dtype or self.float_dtype)
+        first = self.array(columns[0])[rows] if columns else np.empty(0)
+        out = np.empty((len(first), len(columns)), dtype=dtype)
+        for j, column in enumerate(columns):
+            out[:, j] = self.array(column)[rows]
+        return out
+
+    def load(self, columns=None, rows=slice(None)):
+        # DataFrame with the cached dtypes; only the requested columns are read
+        import pandas as pd
+        columns = self.columns if columns is None else list(columns)
+        return pd.DataFrame({column: np.array(self.array(column)[rows]) for column in columns}, columns=columns)
+
+    def iter_chunks(self, columns=None, chunk_rows=None):
+        # DataFrames of at most chunk_rows rows, in order; memory is bounded by one chunk
+        chunk_rows = chunk_rows or self.chunk_rows
+        for start in range(0, len(self), chunk_rows):
+            yield self.load(columns, slice(start, start + chunk_rows))
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.path, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get('format_version') == FORMAT_VERSION else None
+
+    @staticmethod
+    def _write_manifest(path, manifest):
+        tmp = os.path.join(path, 'manifest.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(path, 'manifest.json'))
+
+    def _build(self, stat):
+        import pandas as pd
+
+        parent = os.path.dirname(self.path)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=parent, prefix='.building-')
+        writers, n_rows = None, 0
+        try:
+            # Hashing is I/O bound and far cheaper than parsing the CSV
+            sha256 = file_sha256(self.source)
+            for chunk in pd.read_csv(self.source, chunksize=self.chunk_rows):
+                if writers is None:
+                    names = list(chunk.columns)
+                    writers = [_ColumnWriter(os.path.join(staging, f'{i}.raw')) for i in range(len(names))]
+                for writer, name in zip(writers, names):
+                    values = chunk[name]
+                    if not pd.api.types.is_numeric_dtype(values):
+                        raise ValueError(f"Column {name!r} is not numeric")
+                    writer.write(values.to_numpy())
+                n_rows += len(chunk)
+            if writers is None:
+                raise ValueError(f"{self.source} has no columns")
+
+            columns = []
+            for i, (writer, name) in enumerate(zip(writers, names)):
+                dtype = writer.finish(os.path.join(staging, f'{i}.npy'), n_rows, self.float_dtype, self.chunk_rows)
+                columns.append({'name': name, 'file': f'{i}.npy', 'dtype': dtype})
+            manifest = {
+                'format_version': FORMAT_VERSION, 'source': self.source, 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns, 'sha256': sha256, 'float_dtype': self.float_dtype.str,
+                'n_rows': n_rows, 'columns': columns,
+            }
+            self._write_manifest(staging, manifest)
+            self._arrays.clear()
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(staging, self.path)
+        except BaseException:
+            for writer in writers or ():
+                writer.file.close()
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._manifest = manifest
+
+
+def load_data(source, columns=None, **kwargs):
+    # DataFrame of `columns` (all by default) from the source's cache, building it if needed
+    return DataCache(source, **kwargs).load(columns)
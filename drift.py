@@ -0,0 +1,215 @@
+"""Online feature-drift monitoring of the scored traffic.
+
+``DriftMonitor.observe`` is the only call on the request path: it appends
+the scored feature matrix to a bounded deque (an atomic operation in
+CPython, so no lock is taken) and returns. A background task calls
+``drain``, which stacks everything buffered and folds it into the running
+statistics in one vectorized pass per few thousand rows:
+
+- per-feature count, mean and variance (Welford's algorithm, merged batch
+  by batch with Chan's formula), minimum and maximum;
+- a fixed-boundary histogram sketch per feature, with the training data's
+  quantiles as bin edges, from which live quantiles are interpolated;
+- the Population Stability Index of every feature against the training
+  distribution, over the training deciles.
+
+Rows with a NaN or infinite value are left out of the statistics (and
+counted), so one bad row cannot turn every mean into NaN for good.
+
+Memory is O(features x bins) regardless of the traffic. The training
+reference (``reference_profile``) is written by ``train.py`` to the
+artifact's metadata sidecar; an artifact without one gets means and
+variances compared with its fitted scaler, and no PSI or quantiles.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+# Histogram sketch resolution: the reference's 2.5% quantiles are the bin edges
+SKETCH_BINS = 40
+# PSI is computed on deciles, i.e. groups of SKETCH_BINS // PSI_BINS sketch bins
+PSI_BINS = 10
+# Floor for empty bins, so that the log ratio stays finite
+PSI_EPSILON = 1e-4
+# Usual reading: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant shift
+PSI_THRESHOLD = 0.25
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+def _bin_counts(X, edges):
+    # Counts per (feature, bin); bin j holds edges[j - 1] <= x < edges[j]
+    counts = np.empty((edges.shape[0], edges.shape[1] + 1), dtype=np.int64)
+    for j, column in enumerate(X.T):
+        counts[j] = np.bincount(np.searchsorted(edges[j], column, side='right'), minlength=counts.shape[1])
+    return counts
+
+
+def reference_profile(X, feature_names):
+    # Training distribution of each feature, as stored in the metadata sidecar
+    X = np.asarray(X, dtype=np.float64)
+    edges = np.quantile(X, np.arange(1, SKETCH_BINS) / SKETCH_BINS, axis=0).T
+    counts = _bin_counts(X, edges)
+    return {
+        'feature_names': list(feature_names),
+        'rows': len(X),
+        'mean': X.mean(axis=0).tolist(),
+        'std': X.std(axis=0).tolist(),
+        'edges': edges.tolist(),
+        'counts': counts.tolist(),
+    }
+
+
+def _psi(counts, reference_counts):
+    # PSI per feature over PSI_BINS groups of sketch bins
+    group = counts.shape[1] // PSI_BINS
+    live = counts.reshape(len(counts), PSI_BINS, group).sum(axis=2)
+    expected = reference_counts.reshape(len(counts), PSI_BINS, group).sum(axis=2)
+    live = np.maximum(live / max(live[0].sum(), 1), PSI_EPSILON)
+    expected = np.maximum(expected / expected[0].sum(), PSI_EPSILON)
+    return ((live - expected) * np.log(live / expected)).sum(axis=1)
+
+
+def _float(value):
+    # JSON has no NaN or infinity; such values are reported as null
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+class DriftMonitor:
+    def __init__(self, feature_names, reference=None, scaler=None, max_pending=1024):
+        # reference: reference_profile() output; scaler: (mean, scale) fallback
+        self.feature_names = list(feature_names)
+        n_features = len(self.feature_names)
+        self._pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.non_finite_rows = 0
+        self._lock = threading.Lock()
+
+        self.n = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+
+        self.reference = None
+        self.edges = self.reference_counts = self.counts = None
+        if reference is not None:
+            # Reorder the stored profile to this model's column order
+            index = [reference['feature_names'].index(name) for name in self.feature_names]
+            self.reference = 'training'
+            self.reference_mean = np.asarray(reference['mean'])[index]
+            self.reference_std = np.asarray(reference['std'])[index]
+            self.edges = np.ascontiguousarray(np.asarray(reference['edges'], dtype=np.float64)[index])
+            self.reference_counts = np.asarray(reference['counts'], dtype=np.int64)[index]
+            self.counts = np.zeros_like(self.reference_counts)
+        elif scaler is not None:
+            self.reference = 'scaler'
+            self.reference_mean, self.reference_std = (np.asarray(a, dtype=np.float64) for a in scaler)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def observe(self, features):
+        # Request path: O(1), no lock, no copy. `features` must not be modified afterwards.
+        # When the drain falls behind, the oldest batch is discarded (and counted)
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(features)
+
+    def drain(self, max_rows=4096):
+        # Folds the buffered batches into the statistics, stacked into updates of
+        # about max_rows rows (per-update overhead dominates for single rows);
+        # returns the rows processed
+        rows = 0
+        with self._lock:
+            while self._pending:
+                stack, stacked = [], 0
+                while stacked < max_rows:
+                    try:
+                        features = self._pending.popleft()
+                    except IndexError:
+                        break
+                    stack.append(features)
+                    stacked += len(features)
+                if stack:
+                    X = np.vstack(stack).astype(np.float64, copy=False)
+                    finite = np.isfinite(X).all(axis=1)
+                    if not finite.all():
+                        self.non_finite_rows += int(len(X) - finite.sum())
+                        X = X[finite]
+                    self._update(X)
+                    rows += stacked
+        return rows
+
+    def _update(self, X):
+        n_batch = len(X)
+        if n_batch == 0:
+            return
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        n = self.n + n_batch
+        delta = batch_mean - self.mean
+        self.mean += delta * (n_batch / n)
+        self.m2 += batch_m2 + delta ** 2 * (self.n * n_batch / n)
+        self.n = n
+        np.minimum(self.min, X.min(axis=0), out=self.min)
+        np.maximum(self.max, X.max(axis=0), out=self.max)
+        if self.counts is not None:
+            self.counts += _bin_counts(X, self.edges)
+
+    def _quantiles(self, counts, minimum, maximum):
+        # Interpolated from the sketch: the live CDF at each edge, pinned to the observed min and max
+        cdf = np.cumsum(counts[:, :-1], axis=1) / counts[0].sum()
+        out = np.empty((len(counts), len(QUANTILES)))
+        for j in range(len(counts)):
+            xp = np.concatenate(([0.0], cdf[j], [1.0]))
+            fp = np.concatenate(([minimum[j]], self.edges[j], [maximum[j]]))
+            out[j] = np.interp(QUANTILES, xp, fp)
+        return out
+
+    def stats(self):
+        with self._lock:
+            n, mean, m2 = self.n, self.mean.copy(), self.m2.copy()
+            minimum, maximum = self.min.copy(), self.max.copy()
+            counts = None if self.counts is None else self.counts.copy()
+        result = {'reference': self.reference, 'rows': n, 'pending_batches': self.pending, 'dropped_batches': self.dropped,
+                  'non_finite_rows': self.non_finite_rows}
+        if n == 0:
+            return result
+
+        std = np.sqrt(m2 / n)
+        features = {name: {'mean': _float(mean[j]), 'std': _float(std[j]), 'min': _float(minimum[j]), 'max': _float(maximum[j])}
+                    for j, name in enumerate(self.feature_names)}
+        if self.reference is not None:
+            # Shift of the live mean in training standard deviations
+            shift = (mean - self.reference_mean) / np.where(self.reference_std > 0, self.reference_std, 1.0)
+            for j, name in enumerate(self.feature_names):
+                features[name].update(reference_mean=_float(self.reference_mean[j]), reference_std=_float(self.reference_std[j]),
+                                      mean_shift=_float(shift[j]))
+        if counts is not None:
+            psi = _psi(counts, self.reference_counts)
+            quantiles = self._quantiles(counts, minimum, maximum)
+            reference_quantiles = self.edges[:, [round(q * SKETCH_BINS) - 1 for q in QUANTILES]]
+            for j, name in enumerate(self.feature_names):
+                features[name]['psi'] = _float(psi[j])
+                for q, live, expected in zip(QUANTILES, quantiles[j], reference_quantiles[j]):
+                    features[name][f'p{round(q * 100)}'] = _float(live)
+                    features[name][f'reference_p{round(q * 100)}'] = _float(expected)
+            order = np.argsort(-psi, kind='stable')
+            result['psi'] = {
+                'threshold': PSI_THRESHOLD,
+                'max': _float(psi[order[0]]),
+                'mean': _float(psi.mean()),
+                'drifted': [self.feature_names[j] for j in order if psi[j] > PSI_THRESHOLD],
+            }
+        result['features'] = features
+        return result
+
+    @property
+    def max_psi(self):
+        with self._lock:
+            if self.counts is None or self.n == 0:
+                return None
+            return float(_psi(self.counts, self.reference_counts).max())
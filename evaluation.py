@@ -0,0 +1,146 @@
+"""Evaluation of fitted models from one cached probability vector each.
+
+``Evaluator`` keeps each model's test-set probabilities, scored once, and
+derives every metric from them. It sorts them once per model and counts the
+positives above each distinct probability cumulatively. From those counts,
+precision, recall and F1 of ``proba > t`` (the rule ``predict`` and the API
+apply) come out for every threshold at once, and ROC AUC from the
+Mann-Whitney statistic.
+
+Bootstrap confidence intervals reuse that sorted order: a resample of the
+test rows is a vector of per-row counts, so a replicate's metrics are
+weighted sums over the same groups, with no re-sorting and no inference.
+The replicates are split into fixed chunks with their own seeds and
+computed on a joblib pool, so the intervals do not depend on the number of
+workers.
+"""
+import numpy as np
+from joblib import Parallel, delayed
+
+METRICS = ('ROC AUC', 'F1 Score', 'Precision', 'Recall')
+# Bootstrap replicates per parallel task
+BOOTSTRAP_CHUNK = 250
+
+
+def _divide(numerator, denominator):
+    # 0 where the denominator is 0, as sklearn's zero_division=0
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=np.float64), denominator)
+    return np.divide(numerator, denominator, out=np.zeros(numerator.shape), where=denominator > 0)
+
+
+def _auc(positives, negatives):
+    # Mann-Whitney ROC AUC from weighted class counts per distinct probability
+    # (ascending, along the last axis), ties counting one half
+    below = np.cumsum(negatives, axis=-1) - negatives
+    pairs = positives.sum(axis=-1) * negatives.sum(axis=-1)
+    wins = (positives * (below + 0.5 * negatives)).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(pairs > 0, wins / np.where(pairs > 0, pairs, 1), np.nan)
+
+
+def _at(positives, negatives, k):
+    # Metrics of `proba > t` where the groups from k on are above t
+    total = positives.sum(axis=-1)
+    tp = positives[..., k:].sum(axis=-1)
+    predicted = tp + negatives[..., k:].sum(axis=-1)
+    return {
+        'ROC AUC': _auc(positives, negatives),
+        'F1 Score': _divide(2 * tp, predicted + total),
+        'Precision': _divide(tp, predicted),
+        'Recall': _divide(tp, total),
+    }
+
+
+class SortedScores:
+    # One model's probabilities sorted once, grouped by distinct value
+    def __init__(self, y_true, proba):
+        order = np.argsort(proba, kind='stable')
+        self.y = np.asarray(y_true)[order].astype(np.float64)
+        values, self.starts = np.unique(np.asarray(proba)[order], return_index=True)
+        self.values = values
+        self.positives = np.add.reduceat(self.y, self.starts)
+        self.negatives = np.diff(np.append(self.starts, len(self.y))) - self.positives
+
+    def _groups_above(self, threshold):
+        return np.searchsorted(self.values, threshold, side='right')
+
+    def metrics(self, threshold=0.5):
+        return {name: float(value) for name, value in _at(self.positives, self.negatives, self._groups_above(threshold)).items()}
+
+    def curve(self):
+        # Precision, recall and F1 of `proba > t` for t at every distinct probability
+        total = self.positives.sum()
+        tp = np.append(np.cumsum(self.positives[::-1])[::-1][1:], 0)
+        predicted = tp + np.append(np.cumsum(self.negatives[::-1])[::-1][1:], 0)
+        return {
+            'threshold': self.values,
+            'Precision': _divide(tp, predicted),
+            'Recall': _divide(tp, total),
+            'F1 Score': _divide(2 * tp, predicted + total),
+        }
+
+    def bootstrap(self, threshold, seed, n_replicates):
+        # Metrics of n_replicates resamples of the rows, from their per-row counts
+        n_rows = len(self.y)
+        rng = np.random.default_rng(seed)
+        draws = rng.integers(0, n_rows, size=(n_replicates, n_rows))
+        counts = np.bincount((draws + n_rows * np.arange(n_replicates)[:, None]).ravel(),
+                             minlength=n_replicates * n_rows).reshape(n_replicates, n_rows).astype(np.float64)
+        positives = np.add.reduceat(counts * self.y, self.starts, axis=1)
+        negatives = np.add.reduceat(counts, self.starts, axis=1) - positives
+        return _at(positives, negatives, self._groups_above(threshold))
+
+
+def _bootstrap_task(key, scores, threshold, seed, n_replicates):
+    return key, scores.bootstrap(threshold, seed, n_replicates)
+
+
+class Evaluator:
+    def __init__(self, y_true):
+        self.y_true = np.asarray(y_true)
+        self.proba = {}
+        self._sorted = {}
+
+    def add(self, name, proba):
+        self.proba[name] = np.asarray(proba, dtype=np.float64)
+        self._sorted.pop(name, None)
+
+    def score(self, name, model, X):
+        # The model's probabilities, from a single predict_proba the first time it is asked for
+        if name not in self.proba:
+            self.add(name, model.predict_proba(X)[:, 1])
+        return self.proba[name]
+
+    def sorted(self, name):
+        if name not in self._sorted:
+            self._sorted[name] = SortedScores(self.y_true, self.proba[name])
+        return self._sorted[name]
+
+    def metrics(self, name, threshold=0.5):
+        return self.sorted(name).metrics(threshold)
+
+    def curve(self, name):
+        return self.sorted(name).curve()
+
+    def best_threshold(self, name, metric='F1 Score'):
+        # Operating point maximizing `metric`, with the metrics there (the lowest such threshold on ties)
+        curve = self.curve(name)
+        best = int(np.argmax(curve[metric]))
+        return {'threshold': float(curve['threshold'][best]),
+                **{key: float(curve[key][best]) for key in ('F1 Score', 'Precision', 'Recall')}}
+
+    def intervals(self, names=None, threshold=0.5, n_boot=1000, confidence=0.95, n_jobs=None, random_state=42):
+        # Percentile bootstrap intervals {name: {metric: (low, high)}} of the metrics at `threshold`
+        names = list(self.proba) if names is None else list(names)
+        chunks = [min(BOOTSTRAP_CHUNK, n_boot - start) for start in range(0, n_boot, BOOTSTRAP_CHUNK)]
+        seeds = np.random.SeedSequence(random_state).spawn(len(chunks))
+        tasks = [delayed(_bootstrap_task)(name, self.sorted(name), threshold, seed, size)
+                 for name in names for seed, size in zip(seeds, chunks)]
+        replicates = {name: {metric: [] for metric in METRICS} for name in names}
+        for name, values in Parallel(n_jobs=n_jobs)(tasks):
+            for metric in METRICS:
+                replicates[name][metric].append(values[metric])
+        tail = 50 * (1 - confidence)
+        return {name: {metric: tuple(float(v) for v in np.nanpercentile(np.concatenate(values), [tail, 100 - tail]))
+                       for metric, values in metrics.items()}
+                for name, metrics in replicates.items()}
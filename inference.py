@@ -0,0 +1,135 @@
+"""Array-based inference engine for the bankruptcy pipeline.
+
+The engine resolves the column order expected by the fitted pipeline once at
+startup, packs validated request models straight into contiguous float64
+arrays and runs the pipeline steps (winsorizer clip, scaler, classifier) on
+them directly, skipping the per-request DataFrame build, rename and reindex.
+It also wraps a ``compiled.CompiledModel``, whose scaler is already folded
+into the network.
+"""
+import threading
+from operator import attrgetter
+
+import numpy as np
+
+
+def _scaler_params(preprocessor, feature_names):
+    # Fast path only when the preprocessor is a single StandardScaler over
+    # every expected column, in order, with the remainder dropped
+    transformers = getattr(preprocessor, 'transformers_', None)
+    if not transformers or len(transformers) != 1:
+        return None
+    _, scaler, columns = transformers[0]
+    if type(scaler).__name__ != 'StandardScaler' or list(columns) != list(feature_names):
+        return None
+    mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(len(feature_names))
+    scale = scaler.scale_ if scaler.scale_ is not None else np.ones(len(feature_names))
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+
+def _winsorizer_bounds(steps, feature_names):
+    # Fast path only for a single preprocessing.Winsorizer fitted on every
+    # expected column, in order
+    if len(steps) != 1 or type(steps[0]).__name__ != 'Winsorizer':
+        return None
+    winsorizer = steps[0]
+    if list(getattr(winsorizer, 'feature_names_in_', feature_names)) != list(feature_names):
+        return None
+    return np.asarray(winsorizer.lower_, dtype=np.float64), np.asarray(winsorizer.upper_, dtype=np.float64)
+
+
+def _split_steps(pipeline):
+    # Steps before the preprocessor (e.g. the Winsorizer), the preprocessor,
+    # and the steps between it and the classifier
+    steps = [(name, step) for name, step in pipeline.steps[:-1] if step not in (None, 'passthrough')]
+    position = [name for name, _ in steps].index('preprocessor')
+    return [step for _, step in steps[:position]], steps[position][1], [step for _, step in steps[position + 1:]]
+
+
+class InferenceEngine:
+    def __init__(self, pipeline, feature_name_mapping):
+        self.pipeline = pipeline
+        compiled = not hasattr(pipeline, 'named_steps')
+        leading, preprocessor, intermediate = ([], None, []) if compiled else _split_steps(pipeline)
+
+        # Column order expected by the pipeline and the request field feeding each column
+        # (the input columns of the pipeline's first step)
+        feature_names = pipeline.feature_names if compiled else getattr(pipeline, 'feature_names_in_', None)
+        if feature_names is None:
+            raise ValueError("The pipeline must be fitted on a DataFrame with named feature columns")
+        self.feature_names = list(feature_names)
+        field_for_column = {column: field for field, column in feature_name_mapping.items()}
+        missing_cols = set(self.feature_names) - set(field_for_column)
+        if missing_cols:
+            raise ValueError(f"Missing columns: {missing_cols}")
+        self.fields = [field_for_column[column] for column in self.feature_names]
+        self.n_features = len(self.fields)
+        self._getter = attrgetter(*self.fields)
+
+        # A leading Winsorizer becomes a single np.clip on the packed rows
+        self.preprocessor = preprocessor
+        self._clip = _winsorizer_bounds(leading, self.feature_names)
+        self._leading = leading if self._clip is None else []
+        self._scaler = None if compiled or self._leading else _scaler_params(preprocessor, self.feature_names)
+
+        # Samplers (SMOTE) only act during fit, so they are skipped at inference
+        self._intermediate = [step for step in intermediate if not hasattr(step, 'fit_resample')]
+        self.classifier = pipeline if compiled else pipeline.steps[-1][1]
+
+        # One preallocated row buffer per worker thread
+        self._local = threading.local()
+
+    def pack(self, input_data):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = np.empty((1, self.n_features), dtype=np.float64)
+        buffer[0] = self._getter(input_data)
+        return buffer
+
+    def pack_row(self, input_data):
+        # Fresh 1-D row, for callers that hold on to it (e.g. the micro-batcher)
+        return np.array(self._getter(input_data), dtype=np.float64)
+
+    def pack_many(self, inputs):
+        features = np.empty((len(inputs), self.n_features), dtype=np.float64)
+        for i, input_data in enumerate(inputs):
+            features[i] = self._getter(input_data)
+        return features
+
+    def transform(self, features):
+        if self._clip is not None:
+            features = np.clip(features, *self._clip)
+        if self._scaler is not None:
+            mean, scale = self._scaler
+            transformed = features - mean
+            transformed /= scale
+        elif self.preprocessor is None:
+            transformed = features
+        else:
+            import pandas as pd
+            transformed = pd.DataFrame(features, columns=self.feature_names)
+            for step in self._leading:
+                transformed = step.transform(transformed)
+            transformed = self.preprocessor.transform(transformed)
+        for step in self._intermediate:
+            transformed = step.transform(transformed)
+        return transformed
+
+    def predict_proba(self, features):
+        return self.classifier.predict_proba(self.transform(features))
+
+    def predict(self, features):
+        return self.classifier.predict(self.transform(features))
+
+    def decide(self, proba, threshold=0.5):
+        # Same rule as the classifier's predict(): argmax over classes, which for
+        # a binary problem is a strict `p > 0.5` on the positive class
+        classes = self.classifier.classes_
+        if proba.shape[1] != 2:
+            return classes[np.argmax(proba, axis=1)]
+        return classes[(proba[:, 1] > threshold).astype(np.intp)]
+
+    def score(self, features, threshold=0.5):
+        # Single forward pass: the label is derived from the probabilities
+        proba = self.predict_proba(features)
+        return proba[:, 1], self.decide(proba, threshold)
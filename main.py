@@ -1,16 +1,26 @@
-from pandas import DataFrame
-from joblib import load
-from pydantic import BaseModel, ValidationError
-from fastapi import FastAPI, HTTPException
-import pandas as pd
+import asyncio
+import hmac
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Literal
 
-import uvicorn
+from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 
-if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
-
-# Load the pipeline
-pipeline = load('bankruptcy_pipeline.joblib')
+import config
+from audit import AuditLog, AuditQueueFullError
+from batching import QueueFullError
+from columnar import PayloadError
+from explain import top_features
+from metrics import REGISTRY, STAGE_SECONDS, Counter, Gauge, MetricsMiddleware, SlowRequestProfiler, Timer
+from registry import ModelRegistry
+from serialization import encode_batch, encode_explanations, encode_prediction
+from shadow import ShadowScorer
+from streaming import NDJSONScorer, aiter_lines, ascore_lines
 
 # Define the input data model
 class BankruptcyInput(BaseModel):
@@ -209,73 +219,419 @@ feature_name_mapping = {
     'equity_to_liability': ' Equity to Liability',
 }
 
-# Initialize FastAPI app
-app = FastAPI()
+# Loaded models, populated by load_model() from the lifespan hook (or earlier,
+# e.g. in serve.py's parent) and hot-swapped through the /admin endpoints
+registry = ModelRegistry(feature_name_mapping, BankruptcyInput)
 
-@app.post("/predict")
-def predict(input_data: BankruptcyInput):
+def load_model():
+    if registry.active is None:
+        registry.load(config.MODEL_PATH, config.MODEL_VERSION)
+    if config.SHADOW_MODEL_PATH is not None and shadow is None:
+        # Loaded here (before serve.py's fork, shared copy-on-write); its threads start in each process's lifespan
+        set_shadow(registry.load(config.SHADOW_MODEL_PATH, config.SHADOW_MODEL_VERSION), start=False)
+
+def select_model(version=None):
+    # Each request resolves its model once, so a concurrent swap cannot split it
     try:
-        input_df = pd.DataFrame([input_data.dict()])
+        return registry.get(version)
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=ke.args[0])
 
-        # Rename the columns to match the feature names expected by the pipeline
-        input_df = input_df.rename(columns=feature_name_mapping)
+async def reload_from_disk():
+    # SIGHUP: re-read MODEL_PATH in a worker thread and activate it
+    try:
+        await run_in_threadpool(registry.load, config.MODEL_PATH, None, True)
+        await registry.close_retired()
+    except Exception as e:
+        print(f"Model reload from {config.MODEL_PATH} failed: {e}", flush=True)
 
-        # Ensure all expected columns are present
-        expected_features = pipeline.named_steps['preprocessor'].feature_names_in_
-        missing_cols = set(expected_features) - set(input_df.columns)
-        if missing_cols:
-            raise HTTPException(status_code=400, detail=f"Missing columns: {missing_cols}")
+# Per-model values already tracked by the batchers and caches, read at scrape time
+REGISTRY.register(Gauge(
+    'bankruptcy_api_batch_queue_depth', 'Rows waiting in the micro-batch queue, by model version.', ('model_version',),
+    collect=lambda: {(v,): m.batcher.queue_depth for v, m in list(registry.models.items()) if m.batcher is not None}))
+REGISTRY.register(Counter(
+    'bankruptcy_api_cache_hits', 'Prediction cache hits, by model version.', ('model_version',),
+    collect=lambda: {(v,): m.cache.hits for v, m in list(registry.models.items()) if m.cache is not None}))
+REGISTRY.register(Counter(
+    'bankruptcy_api_cache_misses', 'Prediction cache misses, by model version.', ('model_version',),
+    collect=lambda: {(v,): m.cache.misses for v, m in list(registry.models.items()) if m.cache is not None}))
 
-        # Reorder columns to match the order expected by the pipeline
-        input_df = input_df[expected_features]
+REGISTRY.register(Gauge(
+    'bankruptcy_api_drift_max_psi', 'Largest per-feature PSI of the scored traffic against the training data, by model version.',
+    ('model_version',),
+    collect=lambda: {(v,): psi for v, m in list(registry.models.items())
+                     if m.drift is not None and (psi := m.drift.max_psi) is not None}))
 
-        probability = pipeline.predict_proba(input_df)[:, 1][0]
-        prediction = pipeline.predict(input_df)[0]
+async def drain_drift():
+    # Folds the rows buffered by the request path into each model's drift statistics
+    while True:
+        await asyncio.sleep(config.DRIFT_INTERVAL_SECONDS)
+        for model in list(registry.models.values()):
+            if model.drift is not None and model.drift.pending:
+                try:
+                    await run_in_threadpool(model.drift.drain)
+                except Exception as e:
+                    print(f"Drift update for model {model.version} failed: {e}", flush=True)
 
-        return {
-            'probability_of_bankruptcy': float(probability),
-            'prediction': int(prediction),  # 0 = Not Bankrupt, 1 = Bankrupt
-            'prediction_label': 'Bankrupt' if prediction == 1 else 'Not Bankrupt'
-        }
-    except ValidationError as ve:
-        raise HTTPException(status_code=400, detail=ve.errors())
+# Opt-in audit trail of every returned score, written by a background thread
+audit_log = AuditLog(
+    config.AUDIT_DIR,
+    flush_rows=config.AUDIT_FLUSH_ROWS,
+    flush_interval=config.AUDIT_FLUSH_INTERVAL_SECONDS,
+    max_pending_rows=config.AUDIT_MAX_PENDING_ROWS,
+    rotate_rows=config.AUDIT_ROTATE_ROWS,
+) if config.AUDIT_ENABLED else None
+
+REGISTRY.register(Gauge(
+    'bankruptcy_api_audit_pending_rows', 'Scored rows waiting to be written to the audit log.',
+    collect=lambda: {(): audit_log.pending_rows} if audit_log is not None else {}))
+REGISTRY.register(Counter(
+    'bankruptcy_api_audit_written_rows', 'Scored rows written to the audit log.',
+    collect=lambda: {(): audit_log.written} if audit_log is not None else {}))
+REGISTRY.register(Counter(
+    'bankruptcy_api_audit_rejected_rows', 'Scored rows refused with a 503 because the audit queue was full.',
+    collect=lambda: {(): audit_log.rejected} if audit_log is not None else {}))
+
+# Candidate model re-scoring production traffic in background threads, set by
+# load_model() (SHADOW_MODEL_PATH) or /admin/shadow
+shadow = None
+
+def set_shadow(candidate, start=True):
+    # Shadows with `candidate` (None: stop); returns the previous scorer, to close off the event loop
+    global shadow
+    previous = shadow
+    shadow = None
+    if candidate is not None:
+        scorer = ShadowScorer(candidate, config.DECISION_THRESHOLD, config.SHADOW_WORKERS, config.SHADOW_MAX_PENDING)
+        if start:
+            scorer.start()
+        shadow = scorer
+    return previous
+
+REGISTRY.register(Gauge(
+    'bankruptcy_api_shadow_pending', 'Requests waiting to be re-scored by the shadow candidate.',
+    collect=lambda: {(): s.pending} if (s := shadow) is not None else {}))
+REGISTRY.register(Counter(
+    'bankruptcy_api_shadow_dropped', 'Requests not shadowed because the shadow queue was full.',
+    collect=lambda: {(): s.dropped} if (s := shadow) is not None else {}))
+
+# Opt-in stack sampling, dumped for requests slower than PROFILE_SLOW_MS
+profiler = SlowRequestProfiler(config.PROFILE_SLOW_MS, config.PROFILE_INTERVAL_MS, config.PROFILE_DIR) if config.PROFILE_SLOW_MS > 0 else None
+
+@asynccontextmanager
+async def lifespan(app):
+    load_model()
+    if profiler is not None:
+        profiler.start()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGHUP, lambda: loop.create_task(reload_from_disk()))
+    except (NotImplementedError, RuntimeError, ValueError, AttributeError):
+        # No signals off the main thread (e.g. TestClient) or on Windows
+        pass
+    drift_task = loop.create_task(drain_drift()) if config.DRIFT_ENABLED else None
+    if audit_log is not None:
+        audit_log.start()
+    if shadow is not None:
+        # Threads do not survive serve.py's fork, so every process starts its own workers
+        shadow.start()
+    yield
+    if drift_task is not None:
+        drift_task.cancel()
+    for model in list(registry.models.values()):
+        await model.close()
+    if (previous := set_shadow(None)) is not None:
+        await run_in_threadpool(previous.close)
+    if audit_log is not None:
+        # Everything scored before shutdown is written before the process exits
+        await run_in_threadpool(audit_log.close)
+    if profiler is not None:
+        profiler.stop()
+
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
+def json_body(schema):
+    # Endpoints that read the raw body still document the schema they accept
+    return {'requestBody': {'required': True, 'content': {'application/json': {'schema': schema}}}}
+
+@app.post("/predict", openapi_extra=json_body(BankruptcyInput.model_json_schema()))
+@app.post("/models/{version}/predict", openapi_extra=json_body(BankruptcyInput.model_json_schema()))
+async def predict(request: Request, version: str | None = None, x_model_version: str | None = Header(None)):
+    try:
+        model = select_model(version or x_model_version)
+        # The body is parsed straight into the pipeline's column order
+        body = await request.body()
+        with Timer(STAGE_SECONDS, 'decode'):
+            row = model.request_decoder.decode_one(body, request.headers.get('content-type'))
+        started = time.perf_counter()
+        if model.batcher is not None:
+            probability, prediction = await model.batcher.submit(row)
+        else:
+            probabilities, predictions = await run_in_threadpool(model.score_cached, row[None, :])
+            probability, prediction = probabilities[0], predictions[0]
+        if audit_log is not None:
+            audit_log.record('/predict', model.version, model.engine.feature_names, row[None, :], (probability,), (prediction,))
+        if shadow is not None:
+            shadow.submit(model, row[None, :], (probability,), (prediction,), time.perf_counter() - started)
+
+        with Timer(STAGE_SECONDS, 'encode'):
+            content = encode_prediction(probability, prediction)
+        return Response(content, media_type='application/json', headers={'X-Model-Version': model.version})
+    except (QueueFullError, AuditQueueFullError) as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
+    except RequestValidationError as rve:
+        raise rve
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/predict_batch")
-def predict_batch(input_data: list[BankruptcyInput]):
-    try:
-        input_df = pd.DataFrame([data.dict() for data in input_data])
+def score_batch(model, body, content_type):
+    with Timer(STAGE_SECONDS, 'decode'):
+        features = model.request_decoder.decode_many(body, content_type)
+    started = time.perf_counter()
+    probabilities, predictions = model.score_cached(features)
+    if audit_log is not None:
+        audit_log.record('/predict_batch', model.version, model.engine.feature_names, features, probabilities, predictions)
+    if shadow is not None:
+        shadow.submit(model, features, probabilities, predictions, time.perf_counter() - started)
+    with Timer(STAGE_SECONDS, 'encode'):
+        return encode_batch(probabilities, predictions)
 
-        # Rename the columns to match the feature names expected by the pipeline
-        input_df = input_df.rename(columns=feature_name_mapping)
+@app.post("/predict_batch", openapi_extra=json_body({'type': 'array', 'items': BankruptcyInput.model_json_schema()}))
+@app.post("/models/{version}/predict_batch", openapi_extra=json_body({'type': 'array', 'items': BankruptcyInput.model_json_schema()}))
+async def predict_batch(request: Request, version: str | None = None, x_model_version: str | None = Header(None)):
+    try:
+        model = select_model(version or x_model_version)
+        body = await request.body()
+        content = await run_in_threadpool(score_batch, model, body, request.headers.get('content-type'))
+        return Response(content, media_type='application/json', headers={'X-Model-Version': model.version})
+    except AuditQueueFullError as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
+    except RequestValidationError as rve:
+        raise rve
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Ensure all expected columns are present
-        expected_features = pipeline.named_steps['preprocessor'].feature_names_in_
-        missing_cols = set(expected_features) - set(input_df.columns)
-        if missing_cols:
-            raise HTTPException(status_code=400, detail=f"Missing columns: {missing_cols}")
+def explain_batch_rows(model, body, content_type, top_k, method, steps):
+    with Timer(STAGE_SECONDS, 'decode'):
+        features = model.request_decoder.decode_many(body, content_type)
+    explainer = model.explainer
+    with Timer(STAGE_SECONDS, 'compute'):
+        logits, attributions = explainer.explain(features, method, steps)
+        probabilities, predictions = explainer.decide(logits, config.DECISION_THRESHOLD)
+        index = top_features(attributions, top_k)
+    if audit_log is not None:
+        audit_log.record('/explain_batch', model.version, model.engine.feature_names, features, probabilities, predictions)
+    with Timer(STAGE_SECONDS, 'encode'):
+        return encode_explanations(probabilities, predictions, model.engine.fields, features, attributions, index,
+                                   method, explainer.baseline_probability)
 
-        # Reorder columns to match the order expected by the pipeline
-        input_df = input_df[expected_features]
+@app.post("/explain_batch", openapi_extra=json_body({'type': 'array', 'items': BankruptcyInput.model_json_schema()}))
+@app.post("/models/{version}/explain_batch", openapi_extra=json_body({'type': 'array', 'items': BankruptcyInput.model_json_schema()}))
+async def explain_batch(request: Request, version: str | None = None, x_model_version: str | None = Header(None),
+                        top_k: int = Query(5, ge=1), method: Literal['gradient_input', 'integrated_gradients'] = 'gradient_input',
+                        steps: int = Query(16, ge=1, le=256)):
+    # Scores like /predict_batch and adds each company's top_k features by
+    # attribution (log-odds relative to the average training company)
+    try:
+        model = select_model(version or x_model_version)
+        if model.explainer is None:
+            raise HTTPException(status_code=501, detail=model.explainer_error)
+        body = await request.body()
+        content = await run_in_threadpool(explain_batch_rows, model, body, request.headers.get('content-type'),
+                                          top_k, method, steps)
+        return Response(content, media_type='application/json', headers={'X-Model-Version': model.version})
+    except AuditQueueFullError as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
+    except RequestValidationError as rve:
+        raise rve
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        probabilities = pipeline.predict_proba(input_df)[:, 1]
-        predictions = pipeline.predict(input_df)
+def score_columnar(model, body, content_type):
+    with Timer(STAGE_SECONDS, 'decode'):
+        features = model.columnar_decoder.decode(body, content_type)
+    probabilities, predictions = model.score(features)
+    if audit_log is not None:
+        audit_log.record('/predict_columnar', model.version, model.engine.feature_names, features, probabilities, predictions)
+    with Timer(STAGE_SECONDS, 'encode'):
+        return encode_batch(probabilities, predictions)
 
-        return {
-            'probabilities': probabilities.tolist(),
-            'predictions': predictions.tolist(),
-            'prediction_labels': ['Bankrupt' if pred == 1 else 'Not Bankrupt' for pred in predictions]
-        }
-    except ValidationError as ve:
-        raise HTTPException(status_code=400, detail=ve.errors())
+@app.post("/predict_columnar")
+@app.post("/models/{version}/predict_columnar")
+async def predict_columnar(request: Request, version: str | None = None, x_model_version: str | None = Header(None)):
+    # Accepts a JSON object of arrays keyed by feature, a raw little-endian
+    # float64 matrix, a .npy array or an Arrow IPC table
+    try:
+        model = select_model(version or x_model_version)
+        body = await request.body()
+        content = await run_in_threadpool(score_columnar, model, body, request.headers.get('content-type'))
+        return Response(content, media_type='application/json', headers={'X-Model-Version': model.version})
+    except PayloadError as pe:
+        raise HTTPException(status_code=pe.status_code, detail=str(pe))
+    except AuditQueueFullError as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class NDJSONStreamingResponse(StreamingResponse):
+    # Results are sent while the request body is still being read, so the
+    # response must not compete with the body reader for receive() messages
+    # the way StreamingResponse's disconnect listener does
+    media_type = 'application/x-ndjson'
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def audited_score(model, endpoint):
+    # model.score that also queues what it returns for the audit log
+    def score(features):
+        probabilities, predictions = model.score(features)
+        audit_log.record(endpoint, model.version, model.engine.feature_names, features, probabilities, predictions)
+        return probabilities, predictions
+    return score
+
+@app.post("/predict_stream")
+@app.post("/models/{version}/predict_stream")
+async def predict_stream(request: Request, version: str | None = None, x_model_version: str | None = Header(None)):
+    # One JSON object per input line in, one JSON result per line out; rows
+    # that fail validation get an {"line": n, "error": ...} record instead
+    model = select_model(version or x_model_version)
+    scorer = model.ndjson_scorer
+    if audit_log is not None:
+        # Each chunk is logged before its results are sent; with the audit queue full
+        # the stream stops there, so no score leaves unlogged
+        scorer = NDJSONScorer(model.engine, audited_score(model, '/predict_stream'), config.STREAM_CHUNK_SIZE)
+    lines = aiter_lines(request.stream())
+    return NDJSONStreamingResponse(ascore_lines(scorer, lines, run_in_threadpool),
+                                   headers={'X-Model-Version': model.version})
+
+class ModelLoadRequest(BaseModel):
+    path: str
+    version: str | None = None
+    activate: bool = False
+
+def check_admin(token):
+    # Fails closed: loading a .joblib artifact runs arbitrary code, so without ADMIN_TOKEN nothing is allowed
+    if config.ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if token is None or not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/models")
+def list_models():
+    return registry.describe()
+
+@app.post("/admin/models")
+async def load_model_version(request: ModelLoadRequest, x_admin_token: str | None = Header(None)):
+    # Loading runs in a worker thread so in-flight requests keep being served
+    check_admin(x_admin_token)
+    try:
+        model = await run_in_threadpool(registry.load, request.path, request.version, request.activate)
+    except FileNotFoundError as fe:
+        raise HTTPException(status_code=404, detail=str(fe))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not load model: {e}")
+    await registry.close_retired()
+    return {'loaded': model.describe(), **registry.describe()}
+
+@app.post("/admin/models/{version}/activate")
+def activate_model_version(version: str, x_admin_token: str | None = Header(None)):
+    check_admin(x_admin_token)
+    try:
+        registry.activate(version)
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=ke.args[0])
+    return registry.describe()
+
+@app.delete("/admin/models/{version}")
+async def remove_model_version(version: str, x_admin_token: str | None = Header(None)):
+    check_admin(x_admin_token)
+    try:
+        model = registry.remove(version)
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=ke.args[0])
+    except ValueError as ve:
+        raise HTTPException(status_code=409, detail=str(ve))
+    await model.close()
+    if shadow is not None and shadow.candidate is model:
+        await run_in_threadpool(set_shadow(None).close)
+    return registry.describe()
+
+@app.post("/admin/shadow/{version}")
+async def start_shadow(version: str, x_admin_token: str | None = Header(None)):
+    # Compare a loaded (typically not yet activated) version with production traffic; stats restart from zero
+    check_admin(x_admin_token)
+    try:
+        candidate = registry.get(version)
+    except KeyError as ke:
+        raise HTTPException(status_code=404, detail=ke.args[0])
+    previous = set_shadow(candidate)
+    if previous is not None:
+        await run_in_threadpool(previous.close)
+    return shadow.stats()
+
+@app.delete("/admin/shadow")
+async def stop_shadow(x_admin_token: str | None = Header(None)):
+    check_admin(x_admin_token)
+    previous = set_shadow(None)
+    if previous is None:
+        return {'enabled': False}
+    await run_in_threadpool(previous.close)
+    # Final comparison of the stopped candidate
+    return {'enabled': False, **previous.stats()}
+
+@app.get("/stats/batcher")
+def batcher_stats(version: str | None = None):
+    model = select_model(version)
+    if model.batcher is None:
+        return {'enabled': False, 'model_version': model.version}
+    return {'enabled': True, 'model_version': model.version, **model.batcher.stats()}
+
+@app.get("/stats/cache")
+def cache_stats(version: str | None = None):
+    model = select_model(version)
+    if model.cache is None:
+        return {'enabled': False, 'model_version': model.version}
+    return {'enabled': True, **model.cache.stats()}
+
+@app.get("/stats/drift")
+async def drift_stats(version: str | None = None):
+    model = select_model(version)
+    if model.drift is None:
+        return {'enabled': False, 'model_version': model.version}
+    # Include whatever the background task has not drained yet
+    await run_in_threadpool(model.drift.drain)
+    return {'enabled': True, 'model_version': model.version, **await run_in_threadpool(model.drift.stats)}
+
+@app.get("/stats/audit")
+def audit_stats():
+    if audit_log is None:
+        return {'enabled': False}
+    return {'enabled': True, **audit_log.stats()}
+
+@app.get("/stats/shadow")
+def shadow_stats():
+    scorer = shadow
+    if scorer is None:
+        return {'enabled': False}
+    return {'enabled': True, **scorer.stats()}
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.get("/")
 def home():
     return {
@@ -284,6 +640,22 @@ def home():
         'description': 'API for predicting company bankruptcy based on financial indicators',
         'endpoints': {
             '/predict': 'Make prediction for a single company',
-            '/predict_batch': 'Make predictions for multiple companies'
+            '/predict_batch': 'Make predictions for multiple companies',
+            '/explain_batch': 'Predictions for multiple companies with the features that drove each score',
+            '/predict_columnar': 'Make bulk predictions from columnar JSON, raw float64, .npy or Arrow payloads',
+            '/predict_stream': 'Stream NDJSON predictions for an NDJSON body of companies',
+            '/models': 'List loaded model versions; /models/{version}/predict* scores with a specific one',
+            '/admin/models': 'Load a model version, activate it or remove it without downtime',
+            '/admin/shadow': 'Shadow-score production traffic with a loaded candidate version, or stop',
+            '/stats/batcher': 'Micro-batching queue-time and batch-size metrics',
+            '/stats/cache': 'Prediction cache hit, miss and eviction counters',
+            '/stats/drift': 'Streaming feature statistics and PSI of the scored traffic against the training data',
+            '/stats/audit': 'Audit log queue depth and rows written or refused',
+            '/stats/shadow': 'Agreement of the shadow candidate model with production: label disagreements, probability deltas, latency',
+            '/metrics': 'Prometheus metrics: per-stage latency histograms, batch sizes, in-flight requests and errors'
         }
     }
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
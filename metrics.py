@@ -0,0 +1,289 @@
+"""Low-overhead Prometheus instrumentation for the inference API.
+
+Counters, gauges and fixed-bucket histograms are plain Python objects guarded
+by a lock, so recording a value costs about a microsecond; the text
+exposition format is only built when ``/metrics`` is scraped. The
+``MetricsMiddleware`` counts requests and errors per route and the requests
+in flight, and endpoints time their own stages (decode, queue, compute,
+encode).
+
+``SlowRequestProfiler`` is an opt-in sampling profiler (``PROFILE_SLOW_MS``):
+a background thread samples every thread's stack at a fixed interval, and
+when a request takes longer than the threshold the samples taken while it
+ran are written as collapsed stacks (``flamegraph.pl`` / speedscope input).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = tuple(2 ** i for i in range(17))
+
+
+def _format_labels(labelnames, labelvalues, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+    suffix = '_total'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        # `collect` returns {labelvalues: value} at scrape time, for values
+        # another component already tracks, instead of values recorded here
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        values = self._collect() if self._collect is not None else dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            yield f'{self.name}{self.suffix}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+    suffix = ''
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram:
+    kind = 'histogram'
+    suffix = ''
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def count(self, *labelvalues):
+        series = self._series.get(labelvalues)
+        return sum(series[0]) if series is not None else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labelvalues, list(counts), total) for labelvalues, (counts, total) in sorted(self._series.items())]
+        for labelvalues, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labelvalues)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labelvalues)} {cumulative}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        lines = []
+        for metric in self.metrics:
+            # The family name, as the samples spell it (counters end in _total)
+            lines.append(f'# HELP {metric.name}{metric.suffix} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name}{metric.suffix} {metric.kind}')
+            lines.extend(metric.samples())
+        return ('\n'.join(lines) + '\n').encode()
+
+
+# Metrics of this service, shared by every module that records them
+REGISTRY = MetricsRegistry()
+REQUESTS = REGISTRY.register(Counter(
+    'bankruptcy_api_requests', 'HTTP requests handled, by route.', ('endpoint',)))
+ERRORS = REGISTRY.register(Counter(
+    'bankruptcy_api_errors', 'HTTP requests answered with a 4xx/5xx status, by route and status.', ('endpoint', 'status')))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'bankruptcy_api_requests_in_flight', 'HTTP requests currently being handled.'))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'bankruptcy_api_request_duration_seconds', 'End-to-end request latency, by route.', ('endpoint',)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'bankruptcy_api_stage_duration_seconds',
+    'Time spent per request stage: decode (body to feature matrix), queue (micro-batch wait), '
+    'compute (model forward pass, per call) and encode (response body).', ('stage',)))
+MODEL_BATCH_ROWS = REGISTRY.register(Histogram(
+    'bankruptcy_api_model_batch_rows', 'Rows scored per model forward pass.', buckets=ROW_BUCKETS))
+
+
+class Timer:
+    # Usage: `with Timer(STAGE_SECONDS, 'decode'):`
+    __slots__ = ('histogram', 'labelvalues', 'started')
+
+    def __init__(self, histogram, *labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+class MetricsMiddleware:
+    # Pure ASGI middleware: no request/response wrappers, a couple of microseconds per request
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            # The route template, so /models/{version}/... does not create a series per version
+            route = scope.get('route')
+            endpoint = route.path if route is not None else 'unmatched'
+            REQUESTS.inc(endpoint)
+            REQUEST_SECONDS.observe(elapsed, endpoint)
+            if status >= 400:
+                ERRORS.inc(endpoint, str(status))
+        if self.profiler is not None and elapsed * 1000 >= self.profiler.threshold_ms:
+            await self.profiler.dump(endpoint, status, started, elapsed)
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, interval_ms=5.0, output_dir='profiles', history_seconds=30.0, min_dump_interval=1.0):
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self.min_dump_interval = min_dump_interval
+        # (perf_counter timestamp, collapsed stack) for every non-idle thread sample
+        self._samples = deque(maxlen=max(int(history_seconds / self.interval), 1) * 8)
+        self._frame_names = {}
+        self._last_dump = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self.dumps = 0
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _idle(frame):
+                    continue
+                self._samples.append((now, self._collapse(names.get(ident, str(ident)), frame)))
+
+    def _collapse(self, thread_name, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            name = self._frame_names.get(code)
+            if name is None:
+                name = self._frame_names[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            stack.append(name)
+            frame = frame.f_back
+        stack.append(thread_name)
+        return ';'.join(reversed(stack))
+
+    async def dump(self, endpoint, status, started, elapsed):
+        if started - self._last_dump < self.min_dump_interval:
+            return
+        self._last_dump = started
+        # Samples from every thread while the request ran (the event loop also
+        # serves other requests, so they show up too)
+        counts = {}
+        for timestamp, stack in list(self._samples):
+            if started <= timestamp <= started + elapsed:
+                counts[stack] = counts.get(stack, 0) + 1
+        if not counts:
+            return
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint.strip('/').replace('/', '_') or 'root'}-{status}-{elapsed * 1000:.0f}ms.folded"
+        await asyncio.get_running_loop().run_in_executor(None, self._write, os.path.join(self.output_dir, name), counts)
+        self.dumps += 1
+
+    def _write(self, path, counts):
+        with open(path, 'w') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in counts.items())
+
+
+# Innermost Python frames of threads with nothing to do: a condition or
+# event wait, an idle executor worker, or the event loop polling its selector
+IDLE_FRAMES = {('threading.py', 'wait'), ('thread.py', '_worker'), ('selectors.py', 'select')}
+
+
+def _idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
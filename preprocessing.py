@@ -0,0 +1,115 @@
+"""Fitted preprocessing steps shared by training and serving.
+
+``Winsorizer`` learns per-feature percentile bounds in a single vectorized
+pass over the feature matrix and clips with one ``np.clip``. Because it is a
+step of the exported pipeline, the bounds fitted on the training data are
+applied unchanged to every request.
+
+``ChunkedSMOTE`` is a drop-in for imblearn's ``SMOTE`` for large training
+sets. It searches the minority class neighbours in float32 (a KD-tree in
+low dimensions, blocked brute force otherwise, as ``NearestNeighbors``
+picks) and writes the synthetic rows chunk by chunk straight into the
+preallocated output, instead of building the interpolation terms, the new
+rows and their stacked copy in full. It draws the same random numbers as
+``SMOTE``, so with the same neighbours it returns the same rows. As a
+pipeline step it resamples only the data the pipeline is fitted on.
+"""
+import numbers
+
+import numpy as np
+from imblearn.over_sampling import SMOTE
+from imblearn.over_sampling.base import BaseOverSampler
+from scipy import sparse
+from sklearn.base import BaseEstimator, OneToOneFeatureMixin, TransformerMixin
+from sklearn.neighbors import NearestNeighbors
+from sklearn.utils import check_random_state
+from sklearn.utils._param_validation import Interval, StrOptions
+from sklearn.utils.validation import check_is_fitted
+
+try:
+    from sklearn.utils.validation import validate_data
+except ImportError:
+    # scikit-learn < 1.6
+    def validate_data(estimator, X, **kwargs):
+        return estimator._validate_data(X, **kwargs)
+
+
+class Winsorizer(OneToOneFeatureMixin, TransformerMixin, BaseEstimator):
+    # Clips each feature to its [lower_quantile, upper_quantile] range on the
+    # training data; same bounds as pandas' Series.quantile (linear interpolation)
+    def __init__(self, lower_quantile=0.01, upper_quantile=0.99):
+        self.lower_quantile = lower_quantile
+        self.upper_quantile = upper_quantile
+
+    def fit(self, X, y=None):
+        if not 0 <= self.lower_quantile <= self.upper_quantile <= 1:
+            raise ValueError(f"Invalid quantiles: {self.lower_quantile}, {self.upper_quantile}")
+        X = validate_data(self, X, reset=True, dtype=np.float64)
+        self.lower_, self.upper_ = np.quantile(X, [self.lower_quantile, self.upper_quantile], axis=0)
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self, ('lower_', 'upper_'))
+        X = validate_data(self, X, reset=False, dtype=np.float64)
+        return np.clip(X, self.lower_, self.upper_)
+
+
+class ChunkedSMOTE(BaseOverSampler):
+    # SMOTE with float32 neighbour search and chunked generation; sparse input
+    # falls back to imblearn's SMOTE. Classes with fewer than k_neighbors + 1
+    # samples use all of their neighbours (a single sample is repeated) where
+    # SMOTE would raise, so small CV subsamples can be resampled too
+    _parameter_constraints = {
+        **BaseOverSampler._parameter_constraints,
+        'random_state': ['random_state'],
+        'k_neighbors': [Interval(numbers.Integral, 1, None, closed='left')],
+        'algorithm': [StrOptions({'auto', 'kd_tree', 'ball_tree', 'brute'})],
+        'chunk_size': [Interval(numbers.Integral, 1, None, closed='left')],
+    }
+
+    def __init__(self, sampling_strategy='auto', random_state=None, k_neighbors=5, algorithm='auto', chunk_size=4096):
+        super().__init__(sampling_strategy=sampling_strategy)
+        self.random_state = random_state
+        self.k_neighbors = k_neighbors
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+
+    def _neighbours(self, X_class):
+        # Indices of each sample's k nearest other samples of its class
+        k = min(self.k_neighbors, len(X_class) - 1)
+        if k == 0:
+            return np.zeros((len(X_class), 1), dtype=np.intp)
+        nn = NearestNeighbors(n_neighbors=k, algorithm=self.algorithm).fit(X_class.astype(np.float32))
+        return nn.kneighbors(return_distance=False)
+
+    def _fit_resample(self, X, y):
+        if sparse.issparse(X):
+            return SMOTE(sampling_strategy=self.sampling_strategy, random_state=self.random_state,
+                         k_neighbors=self.k_neighbors).fit_resample(X, y)
+
+        n_new = sum(self.sampling_strategy_.values())
+        X_resampled = np.empty((len(X) + n_new, X.shape[1]), dtype=X.dtype)
+        y_resampled = np.empty(len(y) + n_new, dtype=y.dtype)
+        X_resampled[:len(X)], y_resampled[:len(y)] = X, y
+        offset = len(X)
+        for class_sample, n_samples in self.sampling_strategy_.items():
+            if n_samples == 0:
+                continue
+            X_class = X[y == class_sample]
+            nns = self._neighbours(X_class)
+            # Same draws, in the same order, as SMOTE._make_samples
+            random_state = check_random_state(self.random_state)
+            samples_indices = random_state.randint(low=0, high=nns.size, size=n_samples)
+            steps = random_state.uniform(size=n_samples)[:, np.newaxis]
+            rows, cols = np.divmod(samples_indices, nns.shape[1])
+            for start in range(0, n_samples, self.chunk_size):
+                stop = min(start + self.chunk_size, n_samples)
+                base = X_class[rows[start:stop]]
+                out = X_resampled[offset + start:offset + stop]
+                # base + step * (neighbour - base), evaluated like SMOTE but in place
+                np.subtract(X_class[nns[rows[start:stop], cols[start:stop]]], base, out=out)
+                out *= steps[start:stop]
+                out += base
+            y_resampled[offset:offset + n_samples] = class_sample
+            offset += n_samples
+        return X_resampled, y_resampled
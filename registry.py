@@ -0,0 +1,271 @@
+"""Versioned model registry with atomic hot swaps.
+
+A ``ServedModel`` bundles one loaded artifact with everything the API derives
+from it (inference engine, result cache, request and payload decoders,
+micro-batcher). The ``ModelRegistry`` keeps several of them side by side and
+switches the active one with a single reference assignment: requests resolve
+their model once and finish on it, so a swap never mixes two models inside a
+request and never blocks in-flight traffic. Loading is the caller's job to
+schedule off the request path (a worker thread); the registry itself only
+does the swap.
+"""
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+
+import config
+from batching import MicroBatcher
+from cache import PredictionCache
+from columnar import ColumnarDecoder
+from compiled import REFERENCE_ROWS, agreement, reduce_precision
+from drift import DriftMonitor
+from explain import Explainer
+from inference import InferenceEngine
+from metrics import MODEL_BATCH_ROWS, STAGE_SECONDS, Timer
+from serialization import RequestDecoder
+from streaming import NDJSONScorer
+
+
+def load_artifact(path):
+    if path.endswith('.npz'):
+        # Compiled NumPy artifact (see compiled.py): no sklearn runtime needed
+        from compiled import load_compiled
+        return load_compiled(path)
+    # joblib pulls in the sklearn/imblearn stack needed to unpickle the
+    # pipeline; importing it here keeps `import main` itself cheap
+    from joblib import load
+    return load(path, mmap_mode='r' if config.MODEL_MMAP else None)
+
+
+def file_version(path):
+    # Short content hash identifying an artifact
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def metadata_path(path):
+    # Sidecar written next to the artifact by train.py
+    return f'{path}.meta.json'
+
+
+def read_metadata(path):
+    try:
+        with open(metadata_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def reference_batch(metadata, engine):
+    # Rows the load-time precision check re-scores: the holdout sample stored by
+    # train.py, else the check batch of a compiled export, else rows drawn
+    # around the fitted scaler
+    stored = (metadata or {}).get('reference_batch')
+    if stored:
+        index = [stored['feature_names'].index(name) for name in engine.feature_names]
+        return np.asarray(stored['rows'], dtype=np.float64)[:, index]
+    reference = getattr(engine.pipeline, 'reference', None)
+    if reference is not None:
+        return reference
+    if engine._scaler is not None:
+        mean, scale = engine._scaler
+        return np.random.default_rng(0).normal(mean, scale, size=(REFERENCE_ROWS, engine.n_features))
+    return None
+
+
+def select_precision(engine, metadata, feature_name_mapping):
+    # (engine to serve, report): `engine` reduced to config.INFERENCE_PRECISION when it
+    # agrees with `engine` on the reference batch within the configured tolerances
+    current = getattr(engine.pipeline, 'precision', 'float64')
+    report = {'requested': config.INFERENCE_PRECISION, 'mode': current}
+    if config.INFERENCE_PRECISION in (None, current):
+        return engine, report
+    features = reference_batch(metadata, engine)
+    try:
+        if features is None:
+            raise ValueError("no reference batch to check it against")
+        candidate = InferenceEngine(reduce_precision(engine.pipeline, config.INFERENCE_PRECISION), feature_name_mapping)
+    except ValueError as ve:
+        report['fallback'] = str(ve)
+        return engine, report
+    report['check'] = check = agreement(engine, candidate, features, config.DECISION_THRESHOLD)
+    if check['max_delta'] > config.PRECISION_MAX_DELTA or check['flip_rate'] > config.PRECISION_MAX_FLIP_RATE:
+        report['fallback'] = (f"max |dp| {check['max_delta']:.2e} (limit {config.PRECISION_MAX_DELTA:.0e}), "
+                              f"labels changed {check['flip_rate']:.2%} (limit {config.PRECISION_MAX_FLIP_RATE:.2%})")
+        return engine, report
+    report['mode'] = config.INFERENCE_PRECISION
+    return candidate, report
+
+
+class ServedModel:
+    def __init__(self, version, path, pipeline, feature_name_mapping, input_model):
+        self.version = version
+        self.path = path
+        self.pipeline = pipeline
+        self.loaded_at = time.time()
+        # Training metadata, when the artifact comes from train.py
+        self.metadata = read_metadata(path)
+
+        # Precompute the field-to-column ordering once for the array-based inference path
+        engine = InferenceEngine(pipeline, feature_name_mapping)
+
+        # Reduced-precision scoring, kept only if it passes the check against the artifact's own precision
+        self.engine, self.precision = select_precision(engine, self.metadata, feature_name_mapping)
+        if 'fallback' in self.precision:
+            print(f"Model {version}: serving {self.precision['mode']} instead of {config.INFERENCE_PRECISION}: "
+                  f"{self.precision['fallback']}", flush=True)
+
+        # Results of previously scored feature vectors for this model
+        self.cache = PredictionCache(config.CACHE_MAX_ENTRIES, config.CACHE_TTL_SECONDS) if config.CACHE_MAX_ENTRIES > 0 else None
+
+        # JSON request bodies are parsed straight into pipeline column order
+        self.request_decoder = RequestDecoder(input_model, self.engine.fields)
+
+        # Bulk payloads are decoded column-wise, in feature_name_mapping order
+        self.columnar_decoder = ColumnarDecoder(feature_name_mapping, self.engine.fields)
+
+        # NDJSON bodies are scored chunk by chunk as they arrive
+        self.ndjson_scorer = NDJSONScorer(self.engine, self.score, config.STREAM_CHUNK_SIZE)
+
+        # Concurrent /predict calls are coalesced into one vectorized predict_proba
+        self.batcher = MicroBatcher(
+            self.score_cached,
+            max_wait_ms=config.BATCH_MAX_WAIT_MS,
+            max_batch_size=config.BATCH_MAX_SIZE,
+            max_queue_depth=config.BATCH_MAX_QUEUE,
+        ) if config.BATCHING_ENABLED else None
+
+        # Attributions from the network weights, for /explain_batch
+        try:
+            self.explainer, self.explainer_error = Explainer(engine), None
+        except ValueError as ve:
+            self.explainer, self.explainer_error = None, str(ve)
+
+        # Scored traffic is compared with the training distribution off the request path
+        self.drift = DriftMonitor(
+            self.engine.feature_names,
+            reference=(self.metadata or {}).get('drift_reference'),
+            scaler=engine._scaler,
+            max_pending=config.DRIFT_MAX_PENDING,
+        ) if config.DRIFT_ENABLED else None
+
+    def score(self, features):
+        MODEL_BATCH_ROWS.observe(len(features))
+        with Timer(STAGE_SECONDS, 'compute'):
+            return self.engine.score(features, config.DECISION_THRESHOLD)
+
+    def score_cached(self, features):
+        # Used by /predict and /predict_batch, where repeated companies are common;
+        # bulk columnar and streaming scoring bypass the cache (and the drift monitor)
+        if self.cache is None:
+            probabilities, predictions = self.score(features)
+        else:
+            # Only the rows that miss the cache go through the model
+            keys = self.cache.keys(features)
+            probabilities, predictions, missing = self.cache.get_many(keys, self.version, self.engine.classifier.classes_.dtype)
+            if missing.any():
+                missed = np.flatnonzero(missing)
+                scored_probabilities, scored_predictions = self.score(features[missed])
+                probabilities[missed] = scored_probabilities
+                predictions[missed] = scored_predictions
+                self.cache.put_many([keys[i] for i in missed], self.version, scored_probabilities, scored_predictions)
+        # Only rows that were actually scored count as traffic; a request that fails leaves no trace
+        if self.drift is not None:
+            self.drift.observe(features)
+        return probabilities, predictions
+
+    def score_one(self, input_data):
+        # Pack the validated input straight into the pipeline's column order; a fresh
+        # row rather than the thread's buffer, since the drift monitor keeps it
+        features = self.engine.pack_row(input_data)[None, :]
+        probabilities, predictions = self.score_cached(features)
+        return probabilities[0], predictions[0]
+
+    async def close(self):
+        if self.batcher is not None:
+            await self.batcher.close()
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'path': self.path,
+            'loaded_at': self.loaded_at,
+            'artifact': type(self.pipeline).__name__,
+            'precision': self.precision,
+            'trained': None if self.metadata is None else {
+                key: self.metadata.get(key) for key in ('created_at', 'artifact_sha256', 'holdout_metrics', 'library_versions')
+            },
+        }
+
+
+class ModelRegistry:
+    def __init__(self, feature_name_mapping, input_model):
+        self.feature_name_mapping = feature_name_mapping
+        self.input_model = input_model
+        self.models = {}
+        self.active = None
+        self.activations = 0
+        # Models replaced by a reload of the same version, awaiting close()
+        self.retired = []
+        self._lock = threading.Lock()
+
+    def load(self, path, version=None, activate=False):
+        # Heavy: unpickles the artifact. Run it in a worker thread, never on the event loop.
+        pipeline = load_artifact(path)
+        model = ServedModel(version or file_version(path), path, pipeline, self.feature_name_mapping, self.input_model)
+        with self._lock:
+            replaced = self.models.get(model.version)
+            self.models[model.version] = model
+            if replaced is not None:
+                self.retired.append(replaced)
+            if activate or self.active is None or self.active is replaced:
+                self._activate(model)
+        return model
+
+    def activate(self, version):
+        with self._lock:
+            self._activate(self.get(version))
+
+    def _activate(self, model):
+        self.active = model
+        self.activations += 1
+
+    def remove(self, version):
+        with self._lock:
+            model = self.get(version)
+            if model is self.active:
+                raise ValueError(f"Model version {version} is active and cannot be removed")
+            del self.models[version]
+        return model
+
+    async def close_retired(self):
+        with self._lock:
+            retired, self.retired = self.retired, []
+        for model in retired:
+            await model.close()
+
+    def get(self, version=None):
+        # Resolve once per request and keep using the returned model
+        if version is None:
+            model = self.active
+            if model is None:
+                raise KeyError("No model loaded")
+            return model
+        try:
+            return self.models[version]
+        except KeyError:
+            raise KeyError(f"Unknown model version: {version}")
+
+    def describe(self):
+        active = self.active
+        return {
+            'active': active.version if active is not None else None,
+            'activations': self.activations,
+            'models': [model.describe() for model in self.models.values()],
+        }
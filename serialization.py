@@ -0,0 +1,194 @@
+"""Schema-aware JSON decoding and encoding for the scoring endpoints.
+
+``RequestDecoder`` parses a ``BankruptcyInput`` body (or a list of them)
+straight into the float64 feature vector in pipeline column order, without
+building pydantic models. Bodies the fast path cannot take as-is (missing or
+non-numeric fields, numeric strings, invalid JSON, a non-JSON content type)
+are re-validated with pydantic, so accepted inputs and the 422 error details
+are the same as FastAPI's own body validation. NaN and infinite values
+(which the JSON parser accepts) are rejected with a 422 as well, like the
+columnar and NDJSON decoders do. An empty list is a 400, as in the original
+endpoint. Responses are encoded with
+orjson, which serializes the NumPy result arrays directly; without orjson
+both directions fall back to the standard ``json`` module.
+"""
+import json
+from operator import attrgetter, itemgetter
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NUMBER_TYPES = frozenset((float, int))
+# Non-finite values listed in a 422 before the rest are left out
+MAX_FINITE_ERRORS = 20
+LABELS = ('Not Bankrupt', 'Bankrupt')
+
+
+def is_json(content_type):
+    # Same rule as FastAPI: application/json or application/*+json, nothing else
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    maintype, _, subtype = media_type.partition('/')
+    return maintype == 'application' and (subtype == 'json' or subtype.endswith('+json'))
+
+
+class RequestDecoder:
+    def __init__(self, input_model, fields):
+        # `fields` is the column order the pipeline expects
+        self.fields = list(fields)
+        self.n_features = len(fields)
+        self._item_getter = itemgetter(*fields)
+        self._attr_getter = attrgetter(*fields)
+        self._one = TypeAdapter(input_model)
+        self._many = TypeAdapter(list[input_model])
+
+    def decode_one(self, body, content_type):
+        # Returns a fresh 1-D float64 row
+        value = self._load(body, content_type)
+        row = self._fast_row(value)
+        if row is None:
+            row = self._attr_getter(self._validate(self._one, value))
+        row = np.array(row, dtype=np.float64)
+        self._check_finite(row[None, :], value, many=False)
+        return row
+
+    def decode_many(self, body, content_type):
+        # Returns a 2-D float64 feature matrix, one row per list item (at least one)
+        value = self._load(body, content_type)
+        if value == []:
+            # 400 like the original endpoint, before either scoring path (cached or not) sees zero rows
+            raise HTTPException(status_code=400, detail="Batch contains no companies")
+        if isinstance(value, list):
+            features = np.empty((len(value), self.n_features), dtype=np.float64)
+            for i, item in enumerate(value):
+                row = self._fast_row(item)
+                if row is None:
+                    break
+                features[i] = row
+            else:
+                self._check_finite(features, value, many=True)
+                return features
+        inputs = self._validate(self._many, value)
+        features = np.empty((len(inputs), self.n_features), dtype=np.float64)
+        for i, input_data in enumerate(inputs):
+            features[i] = self._attr_getter(input_data)
+        self._check_finite(features, value, many=True)
+        return features
+
+    def _check_finite(self, features, value, many):
+        # NaN/Infinity would reach the model (a 500, or a null probability from a
+        # compiled artifact); same 422 as a pydantic float with allow_inf_nan=False
+        finite = np.isfinite(features)
+        if finite.all():
+            return
+        errors = []
+        for i, j in zip(*np.nonzero(~finite)):
+            if len(errors) == MAX_FINITE_ERRORS:
+                break
+            field = self.fields[j]
+            errors.append({
+                'type': 'finite_number',
+                'loc': ('body', int(i), field) if many else ('body', field),
+                'msg': 'Input should be a finite number',
+                # As written in the body; the response itself must stay valid JSON
+                'input': json.dumps(float(features[i, j])),
+            })
+        raise RequestValidationError(errors, body=value)
+
+    def _fast_row(self, value):
+        # Values in column order, or None when pydantic has to look at them
+        try:
+            row = self._item_getter(value)
+        except (KeyError, TypeError):
+            return None
+        return row if NUMBER_TYPES.issuperset(map(type, row)) else None
+
+    def _load(self, body, content_type):
+        if not body:
+            raise RequestValidationError([{'type': 'missing', 'loc': ('body',), 'msg': 'Field required', 'input': None}])
+        if not is_json(content_type):
+            # FastAPI validates the raw bytes, which fails with the usual type error
+            return body
+        if orjson is not None:
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                # The stdlib parser also takes NaN/Infinity (rejected once decoded,
+                # by _check_finite), and its error messages are the ones clients already see
+                pass
+        try:
+            return json.loads(body)
+        except json.JSONDecodeError as e:
+            raise RequestValidationError([{
+                'type': 'json_invalid',
+                'loc': ('body', e.pos),
+                'msg': 'JSON decode error',
+                'input': {},
+                'ctx': {'error': e.msg},
+            }], body=e.doc)
+
+    def _validate(self, adapter, value):
+        try:
+            return adapter.validate_python(value, from_attributes=True)
+        except ValidationError as ve:
+            errors = [{**error, 'loc': ('body', *error['loc'])} for error in ve.errors(include_url=False)]
+            raise RequestValidationError(errors, body=value)
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(',', ':'), default=_to_builtin).encode()
+
+
+def _to_builtin(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _array(values):
+    # orjson writes contiguous numeric arrays directly; anything else goes through lists
+    if orjson is not None and values.dtype.kind in 'biuf':
+        return np.ascontiguousarray(values)
+    return values.tolist()
+
+
+def encode_prediction(probability, prediction):
+    prediction = int(prediction)
+    return dumps({
+        'probability_of_bankruptcy': float(probability),
+        'prediction': prediction,  # 0 = Not Bankrupt, 1 = Bankrupt
+        'prediction_label': LABELS[prediction == 1]
+    })
+
+
+def encode_batch(probabilities, predictions):
+    return dumps({
+        'probabilities': _array(probabilities),
+        'predictions': _array(predictions),
+        'prediction_labels': [LABELS[positive] for positive in (predictions == 1).tolist()]
+    })
+
+
+def encode_explanations(probabilities, predictions, fields, features, attributions, index, method, baseline_probability):
+    # encode_batch plus, per row, the features at `index` (most influential first)
+    # with their raw values and attributions in log-odds
+    rows = np.arange(len(index))[:, None]
+    names = np.asarray(fields, dtype=object)[index].tolist()
+    values = features[rows, index].tolist()
+    weights = attributions[rows, index].tolist()
+    return dumps({
+        'probabilities': _array(probabilities),
+        'predictions': _array(predictions),
+        'prediction_labels': [LABELS[positive] for positive in (predictions == 1).tolist()],
+        'method': method,
+        'baseline_probability': baseline_probability,
+        'explanations': [{'features': n, 'values': v, 'attributions': w} for n, v, w in zip(names, values, weights)],
+    })
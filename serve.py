@@ -0,0 +1,109 @@
+"""Production launcher: pre-fork uvicorn workers around one pre-loaded model.
+
+The parent binds the listening socket and imports ``main`` (which loads the
+pipeline) before forking, so the network weights are shared copy-on-write by
+every worker instead of being unpickled once per process::
+
+    python serve.py --workers 4 --port 8000
+
+With ``MODEL_MMAP=1`` the arrays are memory-mapped from the artifact instead,
+which keeps them shared even after a worker touches the Python objects.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, log_level):
+    import uvicorn
+
+    config = uvicorn.Config(app, log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(app, sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        # Child: drop the parent's signal handlers, uvicorn installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        try:
+            run_worker(app, sock, log_level)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the bankruptcy API with pre-forked workers.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args(argv)
+
+    sock = bind_socket(args.host, args.port)
+
+    # Load the model once in the parent, then move every object allocated so
+    # far into the permanent GC generation so collections in the workers do
+    # not write to (and un-share) the pages holding it
+    import main as service
+    service.load_model()
+    gc.collect()
+    gc.freeze()
+
+    workers = {spawn(service.app, sock, args.log_level) for _ in range(args.workers)}
+    print(f"Serving on {args.host}:{args.port} with {len(workers)} workers (pids {sorted(workers)})", flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload(signum, frame):
+        # Each worker re-reads MODEL_PATH and swaps it in without dropping traffic
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, reload)
+
+    # Reap workers, replacing any that die while the server is running
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, restarting", flush=True)
+            workers.add(spawn(service.app, sock, args.log_level))
+    sock.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
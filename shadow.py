@@ -0,0 +1,235 @@
+"""Shadow scoring of /predict and /predict_batch traffic with a candidate model.
+
+``ShadowScorer.submit`` is the only call on the request path: it hands the
+feature matrix a production model just scored, with that model's results
+and scoring time, to a bounded queue and returns. The matrix is shared, not
+copied; like the drift monitor and the audit log, this relies on the request
+path never modifying decoded features. If ``max_pending`` requests are
+already waiting, the request is counted as dropped and never queued, so a
+slow candidate costs production nothing beyond the ``put_nowait``.
+
+``workers`` background threads score each queued matrix with the
+candidate's engine directly, with no cache, batcher, drift monitor or
+request metrics. They fold the comparison into fixed-size statistics per
+production version:
+
+- label agreement counts (production label x candidate label);
+- the mean, maximum and a log-bucketed histogram of |probability delta|;
+- per-request latency histograms of production (the time to its answer,
+  micro-batch wait and cache hits included) and of the candidate (compute
+  only, on the same rows).
+
+Memory stays constant however much traffic is compared.
+"""
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from metrics import LATENCY_BUCKETS
+
+# Upper bounds of the |probability delta| histogram; the last bucket is everything above 0.1
+DELTA_BUCKETS = (1e-9, 1e-8, 1e-7, 1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 0.1)
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def _quantile(counts, bounds, q, overflow=None):
+    # Upper bound of the bucket holding the q-quantile (`overflow` past the last bound)
+    total = sum(counts)
+    if total == 0:
+        return None
+    i = int(np.searchsorted(np.cumsum(counts), q * total))
+    return bounds[i] if i < len(bounds) else overflow
+
+
+class _Comparison:
+    # Running agreement statistics against one production version
+    def __init__(self, classes):
+        self.classes = list(classes)
+        self.requests = 0
+        self.rows = 0
+        self.labels = np.zeros((len(self.classes), len(self.classes)), dtype=np.int64)
+        self.delta_sum = 0.0
+        self.delta_signed_sum = 0.0
+        self.delta_max = 0.0
+        self.delta_counts = np.zeros(len(DELTA_BUCKETS) + 1, dtype=np.int64)
+        self.production_seconds = np.zeros(len(LATENCY_BUCKETS) + 1, dtype=np.int64)
+        self.shadow_seconds = np.zeros(len(LATENCY_BUCKETS) + 1, dtype=np.int64)
+        self.production_total = 0.0
+        self.shadow_total = 0.0
+
+    def update(self, probabilities, predictions, shadow_probabilities, shadow_predictions, production_s, shadow_s):
+        delta = shadow_probabilities - probabilities
+        magnitude = np.abs(delta)
+        self.requests += 1
+        self.rows += len(delta)
+        production_index = np.searchsorted(self.classes, predictions)
+        shadow_index = np.searchsorted(self.classes, shadow_predictions)
+        np.add.at(self.labels, (production_index, shadow_index), 1)
+        self.delta_sum += float(magnitude.sum())
+        self.delta_signed_sum += float(delta.sum())
+        self.delta_max = max(self.delta_max, float(magnitude.max(initial=0.0)))
+        self.delta_counts += np.bincount(np.searchsorted(DELTA_BUCKETS, magnitude), minlength=len(self.delta_counts))
+        self.production_seconds[np.searchsorted(LATENCY_BUCKETS, production_s)] += 1
+        self.shadow_seconds[np.searchsorted(LATENCY_BUCKETS, shadow_s)] += 1
+        self.production_total += production_s
+        self.shadow_total += shadow_s
+
+    def _latency(self, counts, total):
+        return {'mean_ms': total / self.requests * 1000 if self.requests else None,
+                'p50_ms_at_most': _ms(_quantile(counts, LATENCY_BUCKETS, 0.5)),
+                'p99_ms_at_most': _ms(_quantile(counts, LATENCY_BUCKETS, 0.99))}
+
+    def stats(self):
+        disagreements = int(self.labels.sum() - np.trace(self.labels))
+        return {
+            'requests': self.requests,
+            'rows': self.rows,
+            'label_disagreements': disagreements,
+            'label_disagreement_rate': disagreements / self.rows if self.rows else None,
+            'labels': {f'{p}->{s}': int(self.labels[i, j]) for i, p in enumerate(self.classes) for j, s in enumerate(self.classes)},
+            'probability_delta': {
+                'mean_abs': self.delta_sum / self.rows if self.rows else None,
+                'mean_signed': self.delta_signed_sum / self.rows if self.rows else None,
+                'max_abs': self.delta_max,
+                'p50_abs_at_most': _quantile(self.delta_counts, DELTA_BUCKETS, 0.5, self.delta_max),
+                'p99_abs_at_most': _quantile(self.delta_counts, DELTA_BUCKETS, 0.99, self.delta_max),
+                'histogram': {f'<={bound:g}': int(count) for bound, count in zip(DELTA_BUCKETS, self.delta_counts)}
+                | {f'>{DELTA_BUCKETS[-1]:g}': int(self.delta_counts[-1])},
+            },
+            'latency': {
+                'production': self._latency(self.production_seconds, self.production_total),
+                'shadow': self._latency(self.shadow_seconds, self.shadow_total),
+            },
+        }
+
+
+class ShadowScorer:
+    def __init__(self, candidate, threshold=0.5, workers=1, max_pending=64):
+        # `candidate` is a registry ServedModel
+        self.candidate = candidate
+        self.threshold = threshold
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = []
+        self._closing = False
+        self._lock = threading.Lock()
+        # Only guards the counters below; the request path never waits on a comparison
+        self._count_lock = threading.Lock()
+        # production version -> _Comparison, and its column order in the candidate's (None: same order)
+        self._comparisons = {}
+        self._columns = {}
+        self.started_at = None
+
+        # Metrics
+        self.submitted = 0
+        self.dropped = 0
+        self.dropped_rows = 0
+        self.failures = 0
+        self.last_error = None
+
+    def submit(self, production, features, probabilities, predictions, seconds):
+        # Request path: O(1), never blocks. The arrays must not be modified afterwards.
+        if self._closing or production is self.candidate:
+            return False
+        try:
+            self._queue.put_nowait((production, features, probabilities, predictions, seconds))
+        except queue.Full:
+            with self._count_lock:
+                self.dropped += 1
+                self.dropped_rows += len(features)
+            return False
+        with self._count_lock:
+            self.submitted += 1
+        return True
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if not self._threads:
+            self._closing = False
+            self.started_at = time.time()
+            self._threads = [threading.Thread(target=self._run, name=f'shadow-{i}', daemon=True) for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def close(self):
+        # Stops the workers; whatever is still queued is discarded
+        self._closing = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        # Lowest CPU priority for this thread (Linux schedules threads individually), so that
+        # production requests win the CPU whenever both are runnable
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._compare(*item)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+
+    def _candidate_features(self, production, features):
+        if production.version not in self._columns:
+            names = self.candidate.engine.feature_names
+            served = list(production.engine.feature_names)
+            missing = [name for name in names if name not in served]
+            if missing:
+                raise ValueError(f"Model {production.version} does not score {missing[:3]} used by the candidate")
+            index = [served.index(name) for name in names]
+            self._columns[production.version] = None if index == list(range(len(served))) else np.array(index)
+        index = self._columns[production.version]
+        return features if index is None else features[:, index]
+
+    def _compare(self, production, features, probabilities, predictions, seconds):
+        inputs = self._candidate_features(production, features)
+        start = time.perf_counter()
+        shadow_probabilities, shadow_predictions = self.candidate.engine.score(inputs, self.threshold)
+        shadow_seconds = time.perf_counter() - start
+        with self._lock:
+            comparison = self._comparisons.get(production.version)
+            if comparison is None:
+                classes = np.union1d(production.engine.classifier.classes_, self.candidate.engine.classifier.classes_)
+                comparison = self._comparisons[production.version] = _Comparison(classes)
+            comparison.update(np.asarray(probabilities, dtype=np.float64), np.asarray(predictions),
+                              shadow_probabilities, shadow_predictions, seconds, shadow_seconds)
+
+    def stats(self):
+        with self._lock:
+            compared = {version: comparison.stats() for version, comparison in self._comparisons.items()}
+        return {
+            'candidate_version': self.candidate.version,
+            'started_at': self.started_at,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'dropped_rows': self.dropped_rows,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'production': compared,
+        }
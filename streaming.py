@@ -0,0 +1,142 @@
+"""Bounded-memory NDJSON scoring.
+
+Input is one JSON object per line with the ``BankruptcyInput`` fields. Lines
+are read incrementally, scored in fixed-size chunks and written back as one
+JSON result per line, so memory stays flat regardless of input size. The same
+code backs the ``/predict_stream`` endpoint and the offline CLI::
+
+    python streaming.py companies.jsonl -o scores.jsonl
+"""
+import argparse
+import json
+import math
+import sys
+
+import numpy as np
+
+
+class NDJSONScorer:
+    def __init__(self, engine, score, chunk_size=1024):
+        # score(features) -> (probabilities, predictions) for a 2-D feature matrix
+        self.fields = engine.fields
+        self.n_features = engine.n_features
+        self._score = score
+        self.chunk_size = chunk_size
+
+    def score_chunk(self, numbered_lines):
+        # Returns the NDJSON output for one chunk of (line number, raw line) pairs
+        features = np.empty((len(numbered_lines), self.n_features), dtype=np.float64)
+        records = [None] * len(numbered_lines)
+        valid = []
+        for i, (line_no, line) in enumerate(numbered_lines):
+            try:
+                features[len(valid)] = self._parse(line)
+            except ValueError as e:
+                records[i] = {'line': line_no, 'error': str(e)}
+                continue
+            valid.append(i)
+
+        if valid:
+            probabilities, predictions = self._score(features[:len(valid)])
+            for j, i in enumerate(valid):
+                prediction = int(predictions[j])
+                records[i] = {
+                    'line': numbered_lines[i][0],
+                    'probability_of_bankruptcy': float(probabilities[j]),
+                    'prediction': prediction,
+                    'prediction_label': 'Bankrupt' if prediction == 1 else 'Not Bankrupt'
+                }
+        return ''.join(json.dumps(record) + '\n' for record in records).encode()
+
+    def _parse(self, line):
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            raise ValueError("Invalid JSON")
+        if not isinstance(obj, dict):
+            raise ValueError("Expected a JSON object")
+        missing_cols = set(self.fields) - set(obj)
+        if missing_cols:
+            raise ValueError(f"Missing columns: {missing_cols}")
+        try:
+            row = [float(obj[field]) for field in self.fields]
+        except (TypeError, ValueError):
+            raise ValueError("Non-numeric feature values")
+        if not all(map(math.isfinite, row)):
+            raise ValueError("Non-finite feature values")
+        return row
+
+    def iter_chunks(self, lines):
+        # Groups non-blank lines into numbered chunks of at most chunk_size
+        chunk = []
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            chunk.append((line_no, line))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def score_lines(self, lines):
+        for chunk in self.iter_chunks(lines):
+            yield self.score_chunk(chunk)
+
+
+async def aiter_lines(byte_chunks):
+    # Splits an async stream of byte chunks into lines, holding at most one partial line
+    pending = b''
+    async for data in byte_chunks:
+        pending += data
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def ascore_lines(scorer, lines, run_sync):
+    # Async counterpart of NDJSONScorer.score_lines; run_sync offloads each chunk
+    chunk = []
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        chunk.append((line_no, line))
+        if len(chunk) >= scorer.chunk_size:
+            yield await run_sync(scorer.score_chunk, chunk)
+            chunk = []
+    if chunk:
+        yield await run_sync(scorer.score_chunk, chunk)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score an NDJSON file of companies in bounded memory.")
+    parser.add_argument('input', help="NDJSON input file, '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="NDJSON output file, '-' for stdout")
+    parser.add_argument('--chunk-size', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    import config
+    import main as service
+    service.load_model()
+    model = service.registry.active
+
+    scorer = NDJSONScorer(model.engine, model.score, args.chunk_size or config.STREAM_CHUNK_SIZE)
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    sink = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for output in scorer.score_lines(source):
+            sink.write(output)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if sink is not sys.stdout.buffer:
+            sink.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Non-interactive training of the served pipeline.
+
+Fits the pipeline ``main.py`` serves (winsorizer, StandardScaler, SMOTE,
+MLP) on the training CSV, scores it on a stratified holdout, refits it on
+all rows and writes the artifact together with a metadata sidecar
+(``<artifact>.meta.json``): feature order, library versions, holdout
+metrics (with bootstrap intervals and the F1-maximizing threshold), the
+training distribution of every feature (for drift monitoring),
+a sample of holdout rows (for the reduced-precision check) and hashes of
+the data and the artifact. It then loads the new artifact the way the API
+does and reports its load time, single-row latency and batch throughput,
+checking that the array engine reproduces the pipeline's probabilities::
+
+    python train.py --data data.csv --output bankruptcy_pipeline.joblib
+
+Both files are written to temporary names and renamed into place, so a
+running server reloading the artifact never reads a partial file.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from registry import metadata_path
+
+TARGET = 'Bankrupt?'
+PARITY_TOLERANCE = 1e-9
+# Holdout rows kept in the metadata for the API's load-time precision check
+REFERENCE_BATCH_ROWS = 256
+# Bootstrap replicates for the holdout metrics' confidence intervals
+HOLDOUT_BOOTSTRAP = 1000
+
+
+def build_pipeline(feature_names, random_state=42):
+    # The preprocessing + model pipeline of the training script, as served by the API
+    from imblearn.pipeline import Pipeline
+    from sklearn.compose import ColumnTransformer
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.preprocessing import StandardScaler
+    from preprocessing import ChunkedSMOTE, Winsorizer
+
+    return Pipeline([
+        ('winsorizer', Winsorizer(lower_quantile=0.01, upper_quantile=0.99).set_output(transform='pandas')),
+        ('preprocessor', ColumnTransformer([('num', StandardScaler(), list(feature_names))])),
+        ('smote', ChunkedSMOTE(random_state=random_state)),
+        ('classifier', MLPClassifier(random_state=random_state, max_iter=1000)),
+    ])
+
+
+def library_versions():
+    import imblearn
+    import joblib
+    import pandas
+    import sklearn
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pandas.__version__,
+            'scikit-learn': sklearn.__version__, 'imbalanced-learn': imblearn.__version__, 'joblib': joblib.__version__}
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def write_atomic(path, write):
+    # write(tmp_path) creates the file; it replaces `path` only once complete. The
+    # temporary name keeps the extension, which np.savez would otherwise append
+    root, ext = os.path.splitext(path)
+    tmp = f'{root}.tmp-{os.getpid()}{ext}'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _percentiles_us(samples):
+    p50, p99 = np.percentile(samples, [50, 99]) * 1e6
+    return {'p50_us': float(p50), 'p99_us': float(p99)}
+
+
+def benchmark_artifact(path, rows, iterations=2000, batch_sizes=(64, 1024)):
+    # Serving cost of the artifact at `path`, loaded and scored as the API does
+    # (registry.load_artifact + InferenceEngine), on the given raw feature rows
+    from inference import InferenceEngine
+    from registry import load_artifact
+
+    start = time.perf_counter()
+    pipeline = load_artifact(path)
+    names = pipeline.feature_names if not hasattr(pipeline, 'named_steps') else pipeline.feature_names_in_
+    engine = InferenceEngine(pipeline, {name: name for name in names})
+    report = {'artifact_bytes': os.path.getsize(path), 'load_s': time.perf_counter() - start}
+
+    features = np.ascontiguousarray(rows, dtype=np.float64)
+    for _ in range(50):
+        engine.score(features[:1])
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        row = features[i % len(features)][None, :]
+        start = time.perf_counter()
+        engine.score(row)
+        samples[i] = time.perf_counter() - start
+    report['single_row'] = _percentiles_us(samples)
+
+    report['throughput_rows_s'] = {}
+    for batch_size in batch_sizes:
+        batch = features[np.arange(batch_size) % len(features)]
+        repeats = max(3, 20000 // batch_size)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            engine.score(batch)
+        report['throughput_rows_s'][str(batch_size)] = batch_size * repeats / (time.perf_counter() - start)
+    return report, engine
+
+
+def train(data_path, output, test_size=0.2, refit=True, random_state=42, compile_path=None,
+          bench=True, bench_iterations=2000):
+    import pandas as pd
+    from joblib import dump
+    from sklearn.model_selection import train_test_split
+    from data import DataCache, file_sha256
+    from drift import reference_profile
+    from evaluation import Evaluator
+
+    started = time.perf_counter()
+    # float64 like the requests the API scores, so the fitted bounds and scaler are exact
+    cache = DataCache(data_path, float_dtype=np.float64)
+    frame = cache.load()
+    X, y = frame.drop(columns=TARGET), frame[TARGET].to_numpy()
+    feature_names = list(X.columns)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state, stratify=y)
+
+    # Holdout metrics come from a pipeline that has not seen the test rows
+    fit_start = time.perf_counter()
+    pipeline = build_pipeline(feature_names, random_state).fit(X_train, y_train)
+    holdout_fit_s = time.perf_counter() - fit_start
+    evaluator = Evaluator(y_test)
+    evaluator.add('holdout', pipeline.predict_proba(X_test)[:, 1])
+    metrics = evaluator.metrics('holdout')
+    intervals = evaluator.intervals(n_boot=HOLDOUT_BOOTSTRAP, n_jobs=1, random_state=random_state)['holdout']
+    operating_point = evaluator.best_threshold('holdout')
+    print(f"holdout ({len(y_test)} rows): " + ', '.join(f'{k} {v:.4f}' for k, v in metrics.items())
+          + f"; best F1 {operating_point['F1 Score']:.4f} at threshold {operating_point['threshold']:.4f}", file=sys.stderr)
+
+    refit_s = None
+    if refit:
+        fit_start = time.perf_counter()
+        pipeline = build_pipeline(feature_names, random_state).fit(X, y)
+        refit_s = time.perf_counter() - fit_start
+    write_atomic(output, lambda tmp: dump(pipeline, tmp))
+
+    classifier = pipeline.named_steps['classifier']
+    metadata = {
+        'artifact': os.path.basename(output),
+        'artifact_sha256': file_sha256(output),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'code_commit': git_commit(),
+        'data': {
+            'path': os.path.abspath(data_path), 'sha256': cache.manifest['sha256'], 'rows': len(frame),
+            'class_counts': {str(k): int(v) for k, v in pd.Series(y).value_counts().sort_index().items()},
+        },
+        'feature_names': feature_names,
+        'target': TARGET,
+        'classes': classifier.classes_.tolist(),
+        'decision_threshold': 0.5,
+        'steps': [name for name, _ in pipeline.steps],
+        'classifier': {'type': type(classifier).__name__, 'params': {k: repr(v) for k, v in classifier.get_params().items()},
+                       'n_iter': int(getattr(classifier, 'n_iter_', 0))},
+        'library_versions': library_versions(),
+        'training': {'test_size': test_size, 'random_state': random_state, 'refit_on_all_rows': refit,
+                     'holdout_fit_s': holdout_fit_s, 'refit_s': refit_s},
+        'holdout_metrics': metrics,
+        # 95% bootstrap intervals of the holdout metrics at 0.5, and the threshold maximizing
+        # holdout F1 (a candidate DECISION_THRESHOLD, not applied automatically)
+        'holdout_intervals': {name: list(bounds) for name, bounds in intervals.items()},
+        'holdout_operating_point': operating_point,
+        # Distribution of the rows the shipped model was fitted on, for the API's drift monitor
+        'drift_reference': reference_profile(X if refit else X_train, feature_names),
+    }
+    # Rows a reduced-precision serving mode must agree on with this artifact
+    reference = X_test.sample(min(REFERENCE_BATCH_ROWS, len(X_test)), random_state=random_state).to_numpy()
+    metadata['reference_batch'] = {'feature_names': feature_names, 'rows': reference.tolist()}
+
+    status = 0
+    if bench:
+        rows = X_test.to_numpy()
+        report, engine = benchmark_artifact(output, rows, bench_iterations)
+        delta = float(np.max(np.abs(engine.predict_proba(rows)[:, 1] - pipeline.predict_proba(X_test)[:, 1])))
+        report['engine_max_abs_diff'] = delta
+        metadata['benchmark'] = {'joblib': report}
+        if delta > PARITY_TOLERANCE:
+            print(f'engine and pipeline disagree by {delta:.2e}', file=sys.stderr)
+            status = 1
+    if compile_path:
+        from compiled import export_pipeline
+        write_atomic(compile_path, lambda tmp: export_pipeline(pipeline, tmp, reference=reference))
+        metadata['compiled'] = {'artifact': os.path.basename(compile_path), 'sha256': file_sha256(compile_path)}
+        if bench:
+            metadata['benchmark']['npz'], _ = benchmark_artifact(compile_path, X_test.to_numpy(), bench_iterations)
+
+    metadata['training']['total_s'] = time.perf_counter() - started
+    write_atomic(metadata_path(output), lambda tmp: _write_json(tmp, metadata))
+    return metadata, status
+
+
+def _write_json(path, obj):
+    with open(path, 'w') as f:
+        json.dump(obj, f, indent=2)
+
+
+def print_benchmark(benchmark):
+    for kind, report in benchmark.items():
+        throughput = ', '.join(f'b={b}: {r:,.0f} rows/s' for b, r in report['throughput_rows_s'].items())
+        print(f"{kind}: {report['artifact_bytes'] / 1024:.0f} KiB, load {report['load_s'] * 1000:.0f} ms, "
+              f"single row p50 {report['single_row']['p50_us']:.0f} us / p99 {report['single_row']['p99_us']:.0f} us, "
+              f"{throughput}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data.csv', help="training CSV with a 'Bankrupt?' column")
+    parser.add_argument('--output', default='bankruptcy_pipeline.joblib')
+    parser.add_argument('--test-size', type=float, default=0.2, help='stratified holdout fraction for the metrics')
+    parser.add_argument('--no-refit', action='store_true', help='ship the holdout model instead of refitting on all rows')
+    parser.add_argument('--compile', metavar='NPZ', help='also export a compiled .npz artifact (see compiled.py)')
+    parser.add_argument('--no-bench', action='store_true', help='skip the serving benchmark')
+    parser.add_argument('--bench-iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    metadata, status = train(args.data, args.output, args.test_size, not args.no_refit, compile_path=args.compile,
+                             bench=not args.no_bench, bench_iterations=args.bench_iterations)
+    print(f"wrote {args.output} ({metadata['artifact_sha256'][:12]}) and {metadata_path(args.output)} "
+          f"in {metadata['training']['total_s']:.1f} s")
+    if 'benchmark' in metadata:
+        print_benchmark(metadata['benchmark'])
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
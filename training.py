@@ -0,0 +1,249 @@
+"""Parallel training and evaluation of the candidate models, and a headless CLI.
+
+``run_models`` schedules each model's fit and evaluation as one task on a
+process pool sized from a CPU budget (``--cpus`` / ``TRAIN_CPUS``, default:
+the CPUs available to the process). The budget left per worker is passed
+down as the models' own ``n_jobs`` and as the BLAS/OpenMP thread limit, so
+nested parallelism never oversubscribes the machine. Each model's
+``predict_proba`` runs once over the test set, in its worker, and every
+metric, threshold sweep and bootstrap interval is derived from those cached
+probabilities by ``evaluation.Evaluator``.
+
+The CLI runs the training script's modelling steps without plots or
+notebook paths, for CI and batch retraining::
+
+    python -m training --data data.csv --cpus 4 --output comparison.csv --min-f1 0.9
+
+It exits with status 1 if the best model misses ``--min-f1`` or ``--min-auc``.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.metrics import f1_score, precision_score, recall_score, roc_auc_score
+
+TARGET = 'Bankrupt?'
+METRICS = ('ROC AUC', 'F1 Score', 'Precision', 'Recall')
+# Fitted first so the slowest fits do not end up alone at the tail of the pool
+SLOW_MODELS = ('Support Vector Machine', 'Neural Network')
+# Same grids as get_tuned_models in the training script
+PARAM_GRIDS = {
+    'lr': {'C': [0.001, 0.01, 0.1, 1.0, 10.0], 'penalty': ['l2'], 'solver': ['lbfgs', 'liblinear']},
+    'rf': {'n_estimators': [100, 200], 'max_depth': [10, 20, None], 'min_samples_split': [2, 5], 'min_samples_leaf': [1, 2]},
+    'gb': {'n_estimators': [100, 200], 'learning_rate': [0.01, 0.1], 'max_depth': [3, 5], 'min_samples_split': [2, 5]},
+}
+
+
+def cpu_budget(requested=None):
+    if requested is None and os.getenv('TRAIN_CPUS'):
+        requested = int(os.environ['TRAIN_CPUS'])
+    available = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    if requested is None or requested <= 0:
+        return available
+    return min(requested, available)
+
+
+def metrics_from_proba(y_true, proba, threshold=0.5):
+    # The four metrics of the training script from one probability vector; for
+    # predict_proba-based classifiers proba > 0.5 is exactly what predict returns
+    y_pred = (proba > threshold).astype(int)
+    return {
+        'ROC AUC': roc_auc_score(y_true, proba),
+        'F1 Score': f1_score(y_true, y_pred),
+        'Precision': precision_score(y_true, y_pred, zero_division=0),
+        'Recall': recall_score(y_true, y_pred),
+    }
+
+
+def _limit_n_jobs(model, n_jobs):
+    # Replace "all cores" (None or negative) n_jobs, including nested ones, with the per-worker share
+    params = {key: n_jobs for key, value in model.get_params().items()
+              if key.split('__')[-1] == 'n_jobs' and (value is None or value < 0)}
+    return model.set_params(**params) if params else model
+
+
+def _fit_and_score(name, model, fit, X_train, y_train, X_test, n_jobs):
+    fit_seconds = 0.0
+    if fit:
+        start = time.perf_counter()
+        model = _limit_n_jobs(model, n_jobs).fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    proba = model.predict_proba(X_test)[:, 1]
+    return name, model, proba, fit_seconds, time.perf_counter() - start
+
+
+def run_models(models, X_train, y_train, X_test, y_test, cpus=None, prefit=(), evaluator=None):
+    # Fits (unless named in `prefit`) and scores every model in parallel, caching its
+    # test probabilities in `evaluator` (an evaluation.Evaluator on y_test).
+    # Returns {name: (fitted model, metrics)} in the order of `models`.
+    from evaluation import Evaluator
+
+    evaluator = Evaluator(y_test) if evaluator is None else evaluator
+    cpus = cpu_budget(cpus)
+    order = sorted(models, key=lambda name: (name not in SLOW_MODELS, name in prefit))
+    workers = max(1, min(cpus, len(order)))
+    inner = max(1, cpus // workers)
+    with parallel_config(backend='loky', inner_max_num_threads=inner):
+        done = Parallel(n_jobs=workers)(
+            delayed(_fit_and_score)(name, models[name], name not in prefit, X_train, y_train, X_test, inner)
+            for name in order)
+    results = {}
+    for name, model, proba, fit_seconds, score_seconds in done:
+        evaluator.add(name, proba)
+        start = time.perf_counter()
+        metrics = evaluator.metrics(name)
+        results[name] = (model, {**metrics, 'fit_s': fit_seconds, 'eval_s': score_seconds + time.perf_counter() - start})
+    return {name: results[name] for name in models}
+
+
+def comparison_table(results, intervals=None, operating_points=None):
+    # Metrics per model, best F1 first, as in the training script's final comparison;
+    # optionally with bootstrap intervals ({name: {metric: (low, high)}}) and the
+    # F1-maximizing threshold of each model ({name: Evaluator.best_threshold()})
+    import pandas as pd
+    table = pd.DataFrame({name: metrics for name, (_, metrics) in results.items()}).T
+    columns = list(METRICS)
+    if intervals:
+        for metric in METRICS:
+            table[f'{metric} low'] = [intervals[name][metric][0] for name in table.index]
+            table[f'{metric} high'] = [intervals[name][metric][1] for name in table.index]
+        columns += [f'{metric} {end}' for metric in ('ROC AUC', 'F1 Score') for end in ('low', 'high')]
+    if operating_points:
+        table['best threshold'] = [operating_points[name]['threshold'] for name in table.index]
+        table['best F1'] = [operating_points[name]['F1 Score'] for name in table.index]
+        columns += ['best threshold', 'best F1']
+    return table[[*columns, 'fit_s', 'eval_s']].sort_values(by='F1 Score', ascending=False)
+
+
+def prepare_data(frame, target=TARGET):
+    # Winsorization, the stratified 80/20 split and scaling fitted on the training rows,
+    # as in the training script; SMOTE (see resampler) is left to the training folds
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    from preprocessing import Winsorizer
+
+    X = Winsorizer().set_output(transform='pandas').fit_transform(frame.drop(columns=target))
+    X_train, X_test, y_train, y_test = train_test_split(X.to_numpy(), frame[target].to_numpy(), test_size=0.2,
+                                                        random_state=42, stratify=frame[target])
+    scaler = StandardScaler().fit(X_train)
+    return scaler.transform(X_train), scaler.transform(X_test), y_train, y_test
+
+
+def resampler():
+    # Balances each training set the models are fitted on
+    from preprocessing import ChunkedSMOTE
+    return ChunkedSMOTE(random_state=42)
+
+
+def base_models():
+    # Models tuned by get_tuned_models in the training script
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    return {
+        'lr': ('Logistic Regression', LogisticRegression(random_state=42, max_iter=1000)),
+        'rf': ('Random Forest', RandomForestClassifier(random_state=42)),
+        'gb': ('Gradient Boosting', GradientBoostingClassifier(random_state=42)),
+    }
+
+
+def untuned_models():
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.svm import SVC
+    from sklearn.tree import DecisionTreeClassifier
+    return {
+        'Support Vector Machine': SVC(probability=True, random_state=42),
+        'K-Nearest Neighbors': KNeighborsClassifier(),
+        'Neural Network': MLPClassifier(random_state=42, max_iter=1000),
+        'Decision Tree': DecisionTreeClassifier(random_state=42),
+    }
+
+
+def tune(X_train, y_train, param_grids, cpus, mode='halving'):
+    # get_tuned_models of the training script; returns the fold cache, tuned models, best params and report
+    from tuning import FoldCache, HalvingSearch, grid_search, search_report
+
+    folds = FoldCache(X_train, y_train, n_splits=5, random_state=42, n_jobs=cpus, sampler=resampler())
+    tuned, params, report = {}, {}, []
+    for key, (name, estimator) in base_models().items():
+        start = time.perf_counter()
+        if mode == 'halving':
+            search = HalvingSearch(key, estimator, param_grids[key], folds).fit()
+            n_fits = search.n_fits_ + 1
+        else:
+            search = grid_search(estimator, param_grids[key], folds, cpus)
+            n_fits = len(search.cv_results_['params']) * len(folds.splits) + 1
+        report.append(search_report(name, mode, search, time.perf_counter() - start, n_fits))
+        tuned[key], params[key] = search.best_estimator_, search.best_params_
+    return folds, tuned, params, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data.csv', help="training CSV with a 'Bankrupt?' column")
+    parser.add_argument('--cpus', type=int, help='CPU budget (default: TRAIN_CPUS or all available)')
+    parser.add_argument('--search', choices=['halving', 'grid'], default='halving')
+    parser.add_argument('--output', help='write the comparison table to this .csv or .json file')
+    parser.add_argument('--min-f1', type=float, help='fail if the best F1 Score is lower')
+    parser.add_argument('--min-auc', type=float, help='fail if the best ROC AUC is lower')
+    parser.add_argument('--bootstrap', type=int, default=1000, help='bootstrap replicates for the confidence intervals (0: none)')
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    from sklearn.linear_model import LogisticRegression
+    from data import DataCache
+    from evaluation import Evaluator
+    from tuning import SoftVotingEnsemble, StackedEnsemble
+
+    cpus = cpu_budget(args.cpus)
+    started = time.perf_counter()
+    X_train, X_test, y_train, y_test = prepare_data(DataCache(args.data).load())
+    print(f'{len(X_train)} training rows, {len(X_test)} test rows, {cpus} CPUs', file=sys.stderr)
+
+    folds, tuned, params, report = tune(X_train, y_train, PARAM_GRIDS, cpus, args.search)
+    for row in report:
+        print(f"tuned {row['model']}: {row['seconds']:.1f} s, {row['fits']} fits, "
+              f"CV ROC AUC {row['best_cv_auc']:.4f}, {row['best_params']}", file=sys.stderr)
+
+    estimators = [(key, tuned[key]) for key in ('lr', 'rf', 'gb')]
+    models = {name: tuned[key] for key, (name, _) in base_models().items()}
+    models.update(untuned_models())
+    models['Clasificador por Votación'] = SoftVotingEnsemble(estimators)
+    models['Clasificador por Apilamiento'] = StackedEnsemble(estimators, LogisticRegression(random_state=42), folds, params)
+    prefit = [name for name in models if name not in untuned_models()]
+    # The untuned models are fitted on the SMOTE-balanced training rows, like the tuned refits
+    X_fit, y_fit = folds.fit_data()
+    evaluator = Evaluator(y_test)
+    results = run_models(models, X_fit, y_fit, X_test, y_test, cpus=cpus, prefit=prefit, evaluator=evaluator)
+
+    # Intervals and operating points come from the cached probabilities, without more inference
+    intervals = evaluator.intervals(n_boot=args.bootstrap, n_jobs=cpus) if args.bootstrap > 0 else None
+    operating_points = {name: evaluator.best_threshold(name) for name in models}
+    table = comparison_table(results, intervals, operating_points)
+    print(table.to_string(float_format=lambda v: f'{v:.4f}'))
+    print(f'total: {time.perf_counter() - started:.1f} s', file=sys.stderr)
+    if args.output:
+        if args.output.endswith('.json'):
+            with open(args.output, 'w') as f:
+                json.dump({'models': table.reset_index(names='model').to_dict(orient='records'), 'tuning': report}, f, indent=2, default=str)
+        else:
+            table.to_csv(args.output, index_label='model')
+
+    best = table.iloc[0]
+    failed = ((args.min_f1 is not None and best['F1 Score'] < args.min_f1)
+              or (args.min_auc is not None and table['ROC AUC'].max() < args.min_auc))
+    if failed:
+        print(f"best model {table.index[0]} misses the threshold (F1 {best['F1 Score']:.4f}, "
+              f"ROC AUC {table['ROC AUC'].max():.4f})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""Successive-halving hyperparameter search over shared, memoized CV folds.
+
+``FoldCache`` computes the stratified CV splits once for the training matrix
+and memoizes the out-of-fold probabilities of every (model, parameters, fold,
+training size) it fits, so no base model is fitted twice on the same fold.
+Candidates of a forest or boosting model that differ only in ``n_estimators``
+share one fit with the largest value: the smaller ones are its first trees
+(or boosting stages), exactly as if they had been fitted on their own.
+``HalvingSearch`` scores the whole grid on small subsamples of each fold and
+keeps the best ``1 / factor`` of the candidates for the next round, with the
+last round on the full folds; only that round's survivors see all the data.
+With a ``sampler`` (e.g. ``preprocessing.ChunkedSMOTE``) every fit,
+subsampled or not, resamples only its own training rows, so the validation
+folds keep the real class balance and no synthetic row is built from them.
+
+The ensembles reuse the same folds instead of refitting the base models:
+``SoftVotingEnsemble`` averages the already tuned models, and
+``StackedEnsemble`` trains its meta-classifier on the memoized out-of-fold
+probabilities, which is what ``StackingClassifier(cv=5)`` refits five more
+times per base model to obtain.
+"""
+import itertools
+import math
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+
+def _params_key(params):
+    return tuple(sorted(params.items()))
+
+
+def _shares_stages(estimator):
+    # Fitting n trees/stages reproduces the first n of a larger fit with the same random_state
+    return isinstance(estimator, (RandomForestClassifier, ExtraTreesClassifier)) or hasattr(estimator, 'staged_predict_proba')
+
+
+def _group_key(estimator, params):
+    if _shares_stages(estimator):
+        params = {k: v for k, v in params.items() if k != 'n_estimators'}
+    return _params_key(params)
+
+
+def _proba(model, X, n_estimators):
+    if n_estimators is None or n_estimators == model.n_estimators:
+        return model.predict_proba(X)[:, 1]
+    if hasattr(model, 'staged_predict_proba'):
+        return next(itertools.islice(model.staged_predict_proba(X), n_estimators - 1, None))[:, 1]
+    return np.mean([tree.predict_proba(X)[:, 1] for tree in model.estimators_[:n_estimators]], axis=0)
+
+
+def _resample(sampler, X, y):
+    return (X, y) if sampler is None else clone(sampler).fit_resample(X, y)
+
+
+def _fit_fold(estimator, group, X, y, train, test, sampler=None):
+    # One fit for a group of candidates that differ at most in n_estimators, using the largest
+    params = max(group, key=lambda p: p.get('n_estimators', 0))
+    model = clone(estimator).set_params(**params).fit(*_resample(sampler, X[train], y[train]))
+    return [_proba(model, X[test], p.get('n_estimators')) for p in group]
+
+
+class FoldCache:
+    # Stratified splits of (X, y) and out-of-fold probabilities keyed by
+    # (name, params, fold, n_samples); n_samples None means the full fold.
+    # `sampler` resamples the training rows of every fit
+    def __init__(self, X, y, n_splits=5, random_state=42, n_jobs=-1, sampler=None):
+        self.X = np.asarray(X)
+        self.y = np.asarray(y)
+        self.n_jobs = n_jobs
+        self.sampler = sampler
+        self.splits = list(StratifiedKFold(n_splits, shuffle=True, random_state=random_state).split(self.X, self.y))
+        # Nested subsamples: a fold's first n shuffled training rows, for every n,
+        # with the classes interleaved so every prefix keeps the fold's class balance
+        rng = np.random.default_rng(random_state)
+        self._order = [self._stratified_order(rng.permutation(train)) for train, _ in self.splits]
+        self._proba = {}
+        self._fit_data = None
+        self.n_fits = 0
+
+    def _stratified_order(self, order):
+        rank = np.empty(len(order))
+        for label in np.unique(self.y[order]):
+            members = self.y[order] == label
+            rank[members] = (np.arange(members.sum()) + 0.5) / members.sum()
+        return order[np.argsort(rank, kind='stable')]
+
+    @property
+    def fold_size(self):
+        return min(len(train) for train, _ in self.splits)
+
+    def fit_data(self):
+        # (X, y) for refitting on all rows, resampled once by the sampler
+        if self._fit_data is None:
+            self._fit_data = _resample(self.sampler, self.X, self.y)
+        return self._fit_data
+
+    def proba(self, name, estimator, candidates, n_samples=None):
+        # Out-of-fold probabilities of each candidate on each fold, fitting only the missing ones
+        groups = {}
+        for params in candidates:
+            for fold in range(len(self.splits)):
+                if (name, _params_key(params), fold, n_samples) not in self._proba:
+                    groups.setdefault((_group_key(estimator, params), fold), []).append(params)
+        fitted = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_fold)(estimator, group, self.X, self.y,
+                               self._order[fold][:n_samples] if n_samples else self.splits[fold][0], self.splits[fold][1],
+                               self.sampler)
+            for (_, fold), group in groups.items())
+        for ((_, fold), group), probas in zip(groups.items(), fitted):
+            for params, proba in zip(group, probas):
+                self._proba[(name, _params_key(params), fold, n_samples)] = proba
+        self.n_fits += len(groups)
+        return [[self._proba[(name, _params_key(params), fold, n_samples)] for fold in range(len(self.splits))]
+                for params in candidates]
+
+    def scores(self, name, estimator, candidates, n_samples=None):
+        # Mean ROC AUC over the folds, per candidate
+        return [np.mean([roc_auc_score(self.y[test], proba) for (_, test), proba in zip(self.splits, folds)])
+                for folds in self.proba(name, estimator, candidates, n_samples)]
+
+    def oof_proba(self, name, estimator, params=None):
+        # Out-of-fold probability of every row, from the full-fold fits
+        oof = np.empty(len(self.y))
+        for (_, test), proba in zip(self.splits, self.proba(name, estimator, [params or {}])[0]):
+            oof[test] = proba
+        return oof
+
+
+class HalvingSearch:
+    # Successive halving over a parameter grid, scored by mean CV ROC AUC.
+    # Exposes best_params_, best_score_ and best_estimator_ (refit on all of
+    # folds.fit_data()) like GridSearchCV, plus the rounds it ran in `rounds_`
+    def __init__(self, name, estimator, param_grid, folds, factor=3, min_resources=200):
+        self.name = name
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.folds = folds
+        self.factor = factor
+        self.min_resources = min_resources
+
+    def fit(self):
+        start = time.perf_counter()
+        fits_before = self.folds.n_fits
+        candidates = list(ParameterGrid(self.param_grid))
+        full = self.folds.fold_size
+        # Enough rounds to leave at most `factor` candidates for the last one; on small
+        # folds the early rounds all use min_resources rows rather than dropping rounds
+        n_rounds = max(1, math.ceil(math.log(len(candidates), self.factor))) if len(candidates) > 1 else 1
+
+        self.rounds_ = []
+        for i in range(n_rounds):
+            last = i == n_rounds - 1
+            n_samples = None if last else min(full, max(self.min_resources, full // self.factor ** (n_rounds - 1 - i)))
+            scores = self.folds.scores(self.name, self.estimator, candidates, n_samples)
+            self.rounds_.append({'n_candidates': len(candidates), 'n_samples': n_samples or full,
+                                 'best_score': float(max(scores))})
+            # Best first; ties keep grid order, as GridSearchCV's ranking does
+            ranked = np.argsort(-np.asarray(scores), kind='stable')
+            if last:
+                self.best_params_ = candidates[ranked[0]]
+                self.best_score_ = float(scores[ranked[0]])
+            else:
+                candidates = [candidates[j] for j in ranked[:max(1, math.ceil(len(candidates) / self.factor))]]
+
+        self.n_fits_ = self.folds.n_fits - fits_before
+        self.search_seconds_ = time.perf_counter() - start
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(*self.folds.fit_data())
+        self.refit_seconds_ = time.perf_counter() - start - self.search_seconds_
+        return self
+
+
+class SoftVotingEnsemble:
+    # Same predictions as a fitted VotingClassifier(voting='soft') over the same
+    # estimators, built from models that are already fitted
+    def __init__(self, estimators):
+        self.estimators = estimators
+        self.classes_ = estimators[0][1].classes_
+
+    def predict_proba(self, X):
+        return np.mean([model.predict_proba(X) for _, model in self.estimators], axis=0)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class StackedEnsemble:
+    # StackingClassifier(stack_method='predict_proba') whose meta-classifier is
+    # trained on the FoldCache's out-of-fold probabilities of the fitted base models
+    def __init__(self, estimators, final_estimator, folds, params=None):
+        self.estimators = estimators
+        self.classes_ = estimators[0][1].classes_
+        params = params or {}
+        oof = np.column_stack([folds.oof_proba(name, model, params.get(name)) for name, model in estimators])
+        self.final_estimator_ = clone(final_estimator).fit(oof, folds.y)
+
+    def _stack(self, X):
+        return np.column_stack([model.predict_proba(X)[:, 1] for _, model in self.estimators])
+
+    def predict_proba(self, X):
+        return self.final_estimator_.predict_proba(self._stack(X))
+
+    def predict(self, X):
+        return self.final_estimator_.predict(self._stack(X))
+
+
+def grid_search(estimator, param_grid, folds, n_jobs=None):
+    # Exhaustive GridSearchCV on the folds' splits, the reference for HalvingSearch. A
+    # sampler runs on each training fold through an imblearn Pipeline, and the search
+    # reports the parameters and refitted model of the estimator itself
+    from sklearn.model_selection import GridSearchCV
+    if folds.sampler is None:
+        return GridSearchCV(estimator, param_grid, cv=folds.splits, scoring='roc_auc', n_jobs=n_jobs).fit(folds.X, folds.y)
+    from imblearn.pipeline import Pipeline
+    pipeline = Pipeline([('sampler', folds.sampler), ('model', estimator)])
+    grid = {f'model__{key}': values for key, values in param_grid.items()}
+    search = GridSearchCV(pipeline, grid, cv=folds.splits, scoring='roc_auc', n_jobs=n_jobs).fit(folds.X, folds.y)
+    search.best_params_ = {key.removeprefix('model__'): value for key, value in search.best_params_.items()}
+    search.best_estimator_ = search.best_estimator_.named_steps['model']
+    return search
+
+
+def search_report(name, mode, search, seconds, n_fits):
+    # One row of the tuning report, for a HalvingSearch or a GridSearchCV alike
+    return {'model': name, 'mode': mode, 'fits': n_fits, 'seconds': seconds,
+            'best_cv_auc': search.best_score_, 'best_params': search.best_params_}